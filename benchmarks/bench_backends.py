@@ -0,0 +1,112 @@
+"""Compare installer backends on the same offline wheelhouse.
+
+Each backend installs the same requirements into a fresh temporary target
+with --no-index --find-links, so only resolution and installation are
+timed, never the network. The in-process backend installs the wheels pip
+resolved to, so it is timed without a resolver.
+
+    PYTHONPATH=src python benchmarks/bench_backends.py ~/wheels flask requests
+    PYTHONPATH=src python benchmarks/bench_backends.py ~/wheels -r requirements.txt --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from py_trkpac.backends import BACKENDS, InProcessBackend, PipBackend
+from py_trkpac.db import init_db
+from py_trkpac.utils import normalize_name
+from py_trkpac.wheel import parse_wheel_filename, supported_tags
+
+
+def locate_wheels(wheelhouse: Path, resolved: list[dict]) -> list[Path] | None:
+    """The wheelhouse file for every resolved (name, version), or None if one is missing."""
+    wanted = {(normalize_name(m["name"]), m["version"]) for m in resolved}
+    found = {}
+    for path in wheelhouse.glob("*.whl"):
+        parsed = parse_wheel_filename(path.name)
+        if parsed is None or not (parsed[2] & supported_tags()):
+            continue
+        key = (normalize_name(parsed[0]), parsed[1])
+        if key in wanted:
+            found[key] = path
+    missing = wanted - found.keys()
+    if missing:
+        print(f"No compatible wheel for: {', '.join(f'{n}=={v}' for n, v in sorted(missing))}")
+        return None
+    return list(found.values())
+
+
+def run_once(name: str, requirements: list[str], wheels: list[Path], extra_args: list[str]) -> float:
+    """Seconds one backend takes to install into an empty target."""
+    with tempfile.TemporaryDirectory(prefix="py-trkpac-bench-") as tmp:
+        target = Path(tmp) / "target"
+        db = init_db(target, Path(tmp) / "bashrc")
+        try:
+            if name == "in-process":
+                backend = InProcessBackend(db)
+                packages = [str(w) for w in wheels]
+            else:
+                backend = BACKENDS[name](extra_args)
+                packages = requirements
+            start = time.perf_counter()
+            result = backend.install(packages, target)
+            elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+    if not result.ok:
+        raise SystemExit(f"{name} failed")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("wheelhouse", type=Path, help="Directory of wheels (--find-links)")
+    parser.add_argument("requirements", nargs="*", help="Requirements to install")
+    parser.add_argument("-r", "--requirement", type=Path, help="Requirements file")
+    parser.add_argument("--backends", default="pip,uv,in-process",
+                        help="Comma-separated backends (default: pip,uv,in-process)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per backend (default: 1)")
+    args = parser.parse_args()
+
+    requirements = list(args.requirements)
+    if args.requirement:
+        requirements += [
+            line.split("#", 1)[0].strip() for line in args.requirement.read_text().splitlines()
+            if line.split("#", 1)[0].strip()
+        ]
+    if not requirements:
+        parser.error("no requirements given")
+    extra_args = ["--no-index", f"--find-links={args.wheelhouse}"]
+
+    with tempfile.TemporaryDirectory(prefix="py-trkpac-bench-") as tmp:
+        resolved = PipBackend(extra_args).resolve(requirements, Path(tmp))
+    if resolved is None:
+        raise SystemExit("pip could not resolve the requirements from the wheelhouse")
+    wheels = locate_wheels(args.wheelhouse, resolved) or []
+    print(f"{len(resolved)} packages resolved\n")
+
+    results = {}
+    for name in args.backends.split(","):
+        if name == "in-process":
+            if not wheels:
+                print("in-process: skipped (wheels missing)")
+                continue
+        elif name not in BACKENDS or not BACKENDS[name].available():
+            print(f"{name}: skipped (not available)")
+            continue
+        results[name] = [run_once(name, requirements, wheels, extra_args)
+                         for _ in range(args.repeat)]
+
+    print(f"\n{'backend':<12} {'median':>8} {'min':>8}")
+    for name, times in results.items():
+        print(f"{name:<12} {statistics.median(times):>7.2f}s {min(times):>7.2f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
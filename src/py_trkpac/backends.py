@@ -0,0 +1,381 @@
+"""Installer backends: pip, uv and the in-process wheel installer behind one interface."""
+
+from __future__ import annotations
+
+import abc
+import importlib.metadata
+import json
+import os
+import posixpath
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from py_trkpac.db import OPTIONAL_CONFIG, Database
+from py_trkpac.utils import error, info, normalize_name
+from py_trkpac.versions import parse_requirement
+from py_trkpac.wheel import WheelError, install_wheels, select_installable
+
+
+class InstallResult:
+    """Outcome of Backend.install.
+
+    ok: the installer succeeded.
+    installed: [{name, version, requires_dist, requested, source_path}] as
+    reported by the installer, or None if it can't report (the caller then
+    diffs .dist-info snapshots). In-process installs also set dist_info and
+    record.
+    """
+
+    __slots__ = ("ok", "installed")
+
+    def __init__(self, ok: bool, installed: list[dict] | None = None) -> None:
+        self.ok = ok
+        self.installed = installed
+
+
+class Backend(abc.ABC):
+    """Resolves and installs requirements into a directory.
+
+    extra_args are passed to the installer on every call (e.g. --no-index
+    and --find-links for offline installs).
+    """
+
+    name = ""
+    # install() returns the installed set (otherwise the caller diffs snapshots)
+    reports = False
+    # resolve() works, so install plans can be shown
+    can_resolve = False
+
+    def __init__(self, extra_args: list[str] | None = None) -> None:
+        self.extra_args = list(extra_args or [])
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    @abc.abstractmethod
+    def resolve(
+        self, packages: list[str], target_path: Path, quiet: bool = False
+    ) -> list[dict] | None:
+        """The install set for packages, without touching target_path; None on failure.
+
+        quiet suppresses the installer's output, for probes expected to fail.
+        """
+
+    @abc.abstractmethod
+    def install(self, packages: list[str], target_path: Path) -> InstallResult:
+        """Install packages into target_path."""
+
+
+# -- pip --
+
+def pip_supports_report() -> bool:
+    """True if the pip that sys.executable runs supports --report (pip >= 22.2)."""
+    try:
+        version = importlib.metadata.version("pip")
+    except importlib.metadata.PackageNotFoundError:
+        return False
+    match = re.match(r"(\d+)\.(\d+)", version)
+    return bool(match) and (int(match.group(1)), int(match.group(2))) >= (22, 2)
+
+
+def pip_install(
+    packages: list[str],
+    target_path: Path,
+    report_path: Path | None = None,
+    extra_args: list[str] | None = None,
+) -> subprocess.CompletedProcess:
+    """Run pip install --target for the given packages.
+
+    If report_path is given, pip writes its JSON installation report there.
+    """
+    cmd = [
+        sys.executable, "-m", "pip", "install",
+        "--no-user", "--upgrade",
+        f"--target={target_path}",
+        *(extra_args or []),
+    ]
+    if report_path is not None:
+        cmd.append(f"--report={report_path}")
+    cmd += packages
+    info(f"Running: {' '.join(cmd)}\n")
+    return subprocess.run(cmd, capture_output=False)
+
+
+def parse_install_report(report_path: Path) -> list[dict] | None:
+    """Parse a pip installation report.
+
+    Returns a list of {name, version, requires_dist, requested, source_path},
+    one per package pip installed, or None if the report is missing or invalid.
+    source_path is set for packages installed from a local directory.
+    """
+    try:
+        report = json.loads(report_path.read_text())
+    except (OSError, ValueError):
+        return None
+
+    installed = []
+    for item in report.get("install", []):
+        meta = item.get("metadata", {})
+        if not meta.get("name") or not meta.get("version"):
+            continue
+        source_path = None
+        download = item.get("download_info", {})
+        url = download.get("url", "")
+        if "dir_info" in download and url.startswith("file://"):
+            source_path = unquote(urlparse(url).path)
+        installed.append({
+            "name": meta["name"],
+            "version": meta["version"],
+            "requires_dist": meta.get("requires_dist", []),
+            "requested": bool(item.get("requested")),
+            "source_path": source_path,
+        })
+    return installed
+
+
+def pip_resolve(
+    packages: list[str],
+    target_path: Path,
+    extra_args: list[str] | None = None,
+    quiet: bool = False,
+) -> list[dict] | None:
+    """Resolve packages with pip --dry-run and return the report's install set.
+
+    Nothing in target_path is touched. Returns None if resolution failed.
+    quiet also hides pip's errors.
+    """
+    cmd = [
+        sys.executable, "-m", "pip", "install",
+        "--no-user", "--upgrade", "--dry-run", "--quiet",
+        f"--target={target_path}",
+        *(extra_args or []),
+    ]
+    with tempfile.TemporaryDirectory(prefix="py-trkpac-") as tmp:
+        report_path = Path(tmp) / "report.json"
+        cmd += [f"--report={report_path}", *packages]
+        if not quiet:
+            info("Resolving with pip (dry run)...")
+        result = subprocess.run(cmd, capture_output=quiet)
+        if result.returncode != 0:
+            return None
+        return parse_install_report(report_path)
+
+
+class PipBackend(Backend):
+    """pip install --target --upgrade in a subprocess of this interpreter."""
+
+    name = "pip"
+
+    def __init__(self, extra_args: list[str] | None = None) -> None:
+        super().__init__(extra_args)
+        self.reports = self.can_resolve = pip_supports_report()
+
+    def resolve(
+        self, packages: list[str], target_path: Path, quiet: bool = False
+    ) -> list[dict] | None:
+        return pip_resolve(packages, target_path, self.extra_args, quiet)
+
+    def install(self, packages: list[str], target_path: Path) -> InstallResult:
+        if not self.reports:
+            result = pip_install(packages, target_path, extra_args=self.extra_args)
+            return InstallResult(result.returncode == 0)
+        with tempfile.TemporaryDirectory(prefix="py-trkpac-") as tmp:
+            report_path = Path(tmp) / "report.json"
+            result = pip_install(packages, target_path, report_path, self.extra_args)
+            if result.returncode != 0:
+                return InstallResult(False)
+            return InstallResult(True, parse_install_report(report_path))
+
+
+# -- uv --
+
+_UV_PLAN_LINE = re.compile(r"^\s*\+\s*([A-Za-z0-9][A-Za-z0-9._-]*)==(\S+)")
+
+
+class UvBackend(Backend):
+    """uv pip install --target, for this interpreter.
+
+    uv resolves and installs in parallel but writes no installation
+    report, so what changed is found by diffing .dist-info snapshots.
+    Install plans come from its --dry-run output.
+    """
+
+    name = "uv"
+    can_resolve = True
+
+    @classmethod
+    def available(cls) -> bool:
+        return shutil.which("uv") is not None
+
+    def _command(self, target_path: Path) -> list[str]:
+        return [
+            shutil.which("uv") or "uv", "pip", "install",
+            "--python", sys.executable, "--upgrade",
+            "--target", str(target_path),
+            *self.extra_args,
+        ]
+
+    def resolve(
+        self, packages: list[str], target_path: Path, quiet: bool = False
+    ) -> list[dict] | None:
+        if not quiet:
+            info("Resolving with uv (dry run)...")
+        result = subprocess.run(
+            [*self._command(target_path), "--dry-run", *packages],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            if not quiet:
+                sys.stderr.write(result.stderr)
+            return None
+        requested = set()
+        for pkg in packages:
+            req = parse_requirement(pkg)
+            if req is not None:
+                requested.add(normalize_name(req.name))
+        resolved = []
+        for line in (result.stdout + result.stderr).splitlines():
+            match = _UV_PLAN_LINE.match(line)
+            if match:
+                resolved.append({
+                    "name": match.group(1),
+                    "version": match.group(2),
+                    "requires_dist": [],
+                    "requested": normalize_name(match.group(1)) in requested,
+                    "source_path": None,
+                })
+        return resolved
+
+    def install(self, packages: list[str], target_path: Path) -> InstallResult:
+        cmd = [*self._command(target_path), *packages]
+        info(f"Running: {' '.join(cmd)}\n")
+        return InstallResult(subprocess.run(cmd, capture_output=False).returncode == 0)
+
+
+# -- In-process --
+
+class InProcessBackend(Backend):
+    """Local wheel files installed by this process (see wheel.install_wheels).
+
+    Only handles wheels whose dependencies are already met by the batch or
+    the database; split() picks those out of a request list.
+    """
+
+    name = "in-process"
+    reports = True
+    can_resolve = True
+
+    def __init__(self, db: Database, extra_args: list[str] | None = None) -> None:
+        super().__init__(extra_args)
+        self.db = db
+
+    def split(self, packages: list[str]) -> tuple[list[str], list[str]]:
+        """(requests this backend can install, requests for another backend)."""
+        paths = {
+            arg: Path(arg).expanduser().resolve() for arg in packages if arg.endswith(".whl")
+        }
+        paths = {arg: path for arg, path in paths.items() if path.is_file()}
+        if not paths:
+            return [], packages
+        wheels, _ = select_installable(self.db, list(paths.values()))
+        accepted = {w.path for w in wheels}
+        mine = [arg for arg in packages if paths.get(arg) in accepted]
+        return mine, [arg for arg in packages if paths.get(arg) not in accepted]
+
+    def resolve(
+        self, packages: list[str], target_path: Path, quiet: bool = False
+    ) -> list[dict] | None:
+        wheels, rejected = select_installable(
+            self.db, [Path(p).expanduser().resolve() for p in packages]
+        )
+        if rejected:
+            return None
+        return [{
+            "name": w.name,
+            "version": w.version,
+            "requires_dist": w.requires_dist,
+            "requested": True,
+            "source_path": None,
+        } for w in wheels]
+
+    def install(self, packages: list[str], target_path: Path) -> InstallResult:
+        """Install the wheels, then delete files only the versions they replaced had."""
+        wheels, rejected = select_installable(
+            self.db, [Path(p).expanduser().resolve() for p in packages]
+        )
+        if rejected:
+            error(f"Can't install {', '.join(p.name for p in rejected)} without an index.")
+            return InstallResult(False)
+        previous = {}
+        for wheel in wheels:
+            existing = self.db.get_package(wheel.name)
+            if existing is not None:
+                previous[normalize_name(wheel.name)] = existing
+        info(f"Installing {len(wheels)} local wheel(s) in-process...")
+        try:
+            installed = install_wheels(
+                target_path, wheels, {normalize_name(w.name) for w in wheels}
+            )
+        except (WheelError, OSError) as e:
+            error(f"Could not install wheels: {e}")
+            return InstallResult(False)
+
+        still_owned = self.db.get_shared_files([p["id"] for p in previous.values()])
+        for meta in installed:
+            existing = previous.get(normalize_name(meta["name"]))
+            if existing is not None:
+                current = {path for path, _, _ in meta["record"]}
+                _delete_stale(target_path, [
+                    p for p in self.db.get_package_files(existing["id"])
+                    if p not in current and p not in still_owned
+                ])
+        return InstallResult(True, installed)
+
+
+def _delete_stale(target_path: Path, stale: list[str]) -> None:
+    """Unlink files a replaced version left behind, and the directories they emptied."""
+    emptied = set()
+    for path in stale:
+        try:
+            os.unlink(target_path / path)
+        except (FileNotFoundError, IsADirectoryError):
+            pass
+        parent = posixpath.dirname(path)
+        while parent and parent not in emptied:
+            emptied.add(parent)
+            parent = posixpath.dirname(parent)
+    for d in sorted(emptied, key=lambda d: d.count("/"), reverse=True):
+        try:
+            os.rmdir(target_path / d)
+        except OSError:
+            pass  # still holds files of the new version
+
+
+# -- Selection --
+
+BACKENDS: dict[str, type[Backend]] = {"pip": PipBackend, "uv": UvBackend}
+
+
+def get_backend(db: Database, extra_args: list[str] | None = None) -> Backend | None:
+    """The backend chosen by config installer_backend (pip, uv or auto).
+
+    auto picks uv when it is on PATH, pip otherwise. Returns None (after
+    printing an error) if the configured backend isn't available.
+    """
+    choice = db.get_config("installer_backend") or OPTIONAL_CONFIG["installer_backend"]
+    if choice == "auto":
+        choice = "uv" if UvBackend.available() else "pip"
+    backend = BACKENDS.get(choice)
+    if backend is None:
+        error(f"Unknown installer_backend {choice!r} (expected pip, uv or auto).")
+        return None
+    if not backend.available():
+        error(f"installer_backend is {choice}, but {choice} was not found on PATH.")
+        return None
+    return backend(extra_args)
@@ -0,0 +1,253 @@
+"""Wheels built from local projects, reused while the source tree is unchanged."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from py_trkpac.db import OPTIONAL_CONFIG, Database
+from py_trkpac.store import interpreter_abi
+from py_trkpac.utils import error, info
+
+BUILDS_DIRNAME = ".py-trkpac-builds"
+
+# Never part of a build's input, whatever .gitignore says; build/ and
+# *.egg-info are written into the tree by the build itself. Directories a
+# package might also use as a module name are only excluded at the top.
+DEFAULT_EXCLUDES = [
+    ".git/", ".hg/", ".svn/", "__pycache__/", "*.py[cod]", "*.egg-info/", ".eggs/",
+    "/build/", "/dist/", "/.tox/", "/.nox/", "/.venv/", "/venv/",
+    ".mypy_cache/", ".pytest_cache/", ".ruff_cache/",
+]
+
+IgnoreRule = tuple[re.Pattern, bool, bool]  # (regex, negated, directories only)
+
+
+def _glob_to_regex(pattern: str) -> str:
+    """Translate one gitignore glob: * and ? stop at "/", ** crosses directories."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+            i = end
+        elif c == "\\" and i + 1 < len(pattern):
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def parse_ignore_rules(lines: list[str]) -> list[IgnoreRule]:
+    """Compile .gitignore lines into rules matched against paths relative to its directory.
+
+    A pattern with a "/" other than a trailing one is anchored to the
+    directory; others match at any depth. "!" re-includes, a trailing "/"
+    only matches directories.
+    """
+    rules = []
+    for line in lines:
+        line = line.rstrip("\n").rstrip(" ")
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        regex = _glob_to_regex(line.lstrip("/"))
+        if "/" not in line:
+            regex = "(?:.*/)?" + regex
+        rules.append((re.compile(regex + r"\Z"), negated, dir_only))
+    return rules
+
+
+_DEFAULT_RULES = parse_ignore_rules(DEFAULT_EXCLUDES)
+
+
+def _ignored(rel: str, is_dir: bool, rulesets: list[tuple[str, list[IgnoreRule]]]) -> bool:
+    """The last matching rule wins, deeper .gitignore files after shallower ones."""
+    ignored = False
+    for base, rules in rulesets:
+        sub = rel[len(base):]
+        for regex, negated, dir_only in rules:
+            if (is_dir or not dir_only) and regex.match(sub):
+                ignored = not negated
+    return ignored
+
+
+def walk_source_tree(root: Path) -> list[tuple[str, os.stat_result]]:
+    """Every file of a source tree that isn't excluded, as (relative path, stat).
+
+    Honors .gitignore files in the tree. Symlinked directories are not
+    followed; an excluded directory is not entered, so nothing under it can
+    be re-included (as in git).
+    """
+    files = []
+    stack: list[tuple[str, list[tuple[str, list[IgnoreRule]]]]] = [("", [("", _DEFAULT_RULES)])]
+    while stack:
+        rel_dir, rulesets = stack.pop()
+        directory = root / rel_dir
+        try:
+            lines = (directory / ".gitignore").read_text(errors="replace").splitlines()
+        except OSError:
+            lines = []
+        if lines:
+            rulesets = [*rulesets, (rel_dir, parse_ignore_rules(lines))]
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            rel = f"{rel_dir}{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                if not _ignored(rel, True, rulesets):
+                    stack.append((rel + "/", rulesets))
+            elif entry.is_file() and not _ignored(rel, False, rulesets):
+                files.append((rel, entry.stat()))
+    return files
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_fingerprint(db: Database, source_path: Path) -> str:
+    """Hash of a source tree's file names, contents and modes, for this interpreter.
+
+    File hashes are cached in the database by (mtime, size), so only files
+    that changed since the last fingerprint are read.
+    """
+    root = str(source_path)
+    cached = db.get_source_files(root)
+    files = walk_source_tree(source_path)
+    changed = [
+        (rel, st) for rel, st in files
+        if cached.get(rel, (None, None))[:2] != (st.st_mtime_ns, st.st_size)
+    ]
+    with ThreadPoolExecutor() as pool:
+        hashes = dict(zip(
+            [rel for rel, _ in changed],
+            pool.map(_sha256_file, [source_path / rel for rel, _ in changed]),
+        ))
+    entries = [
+        (rel, st.st_mtime_ns, st.st_size, hashes[rel] if rel in hashes else cached[rel][2])
+        for rel, st in files
+    ]
+    if changed or len(entries) != len(cached):
+        db.replace_source_files(root, entries)
+
+    modes = {rel: st.st_mode & 0o111 for rel, st in files}
+    h = hashlib.sha256(interpreter_abi().encode())
+    for rel, _, _, sha256 in sorted(entries):
+        h.update(f"{rel}\0{sha256}\0{modes[rel]:o}\n".encode())
+    return h.hexdigest()
+
+
+def _build_wheel(source_path: str, wheel_dir: str) -> tuple[bool, str]:
+    """pip wheel one project without its dependencies. Returns (ok, pip's output)."""
+    result = subprocess.run(
+        [sys.executable, "-m", "pip", "wheel", "--no-deps", f"--wheel-dir={wheel_dir}",
+         source_path],
+        capture_output=True, text=True,
+    )
+    return result.returncode == 0, result.stdout + result.stderr
+
+
+def build_local_wheels(
+    db: Database,
+    target_path: Path,
+    packages: list[str],
+    local_packages: dict[str, str],
+) -> list[str] | None:
+    """Replace local project directories in packages with wheels built from them.
+
+    A project whose source fingerprint matches its last build reuses that
+    wheel; the others are built in parallel (config build_workers), each
+    into <target>/.py-trkpac-builds/<fingerprint>/. Returns None (after
+    printing pip's output) if a build failed.
+    """
+    if db.get_config("build_cache") == "off":
+        return packages
+    sources = [arg for arg in packages if arg in local_packages.values()]
+    if not sources:
+        return packages
+
+    wheels: dict[str, str] = {}
+    stale: dict[str, str] = {}
+    for source in sources:
+        fingerprint = source_fingerprint(db, Path(source))
+        row = db.get_local_build(source)
+        if row is not None and row["fingerprint"] == fingerprint and Path(row["wheel"]).is_file():
+            wheels[source] = row["wheel"]
+            info(f"Reusing {Path(row['wheel']).name} (source unchanged).")
+        else:
+            stale[source] = fingerprint
+    if not stale:
+        return [wheels.get(arg, arg) for arg in packages]
+
+    builds = target_path / BUILDS_DIRNAME
+    builds.mkdir(exist_ok=True)
+    workers = int(db.get_config("build_workers") or OPTIONAL_CONFIG["build_workers"])
+    info(f"Building {len(stale)} local project(s)...")
+    with tempfile.TemporaryDirectory(prefix="py-trkpac-build-", dir=builds) as tmp:
+        out_dirs = {source: Path(tmp) / str(i) for i, source in enumerate(stale)}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            results = dict(zip(stale, pool.map(
+                _build_wheel, stale, [str(d) for d in out_dirs.values()]
+            )))
+
+        failed = False
+        for source, (ok, output) in results.items():
+            built = sorted(out_dirs[source].glob("*.whl"))
+            if not ok or len(built) != 1:
+                sys.stderr.write(output)
+                error(f"Building {source} failed.")
+                failed = True
+                continue
+            dest = builds / stale[source]
+            dest.mkdir(exist_ok=True)
+            wheel = dest / built[0].name
+            os.replace(built[0], wheel)
+            previous = db.get_local_build(source)
+            db.set_local_build(source, stale[source], str(wheel))
+            old_dir = Path(previous["wheel"]).parent if previous is not None else None
+            if old_dir is not None and old_dir != dest and not db.is_build_dir_used(str(old_dir)):
+                shutil.rmtree(old_dir, ignore_errors=True)
+            wheels[source] = str(wheel)
+            info(f"Built {wheel.name}.")
+    if failed:
+        return None
+    return [wheels.get(arg, arg) for arg in packages]
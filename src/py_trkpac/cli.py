@@ -6,10 +6,15 @@ import argparse
 import sys
 from pathlib import Path
 
-from py_trkpac import __version__
-from py_trkpac.db import open_db, init_db, find_db
-from py_trkpac.installer import do_install, do_remove, do_update
+from py_trkpac import __version__, generations, wheelhouse
+from py_trkpac.db import OPTIONAL_CONFIG, open_db, init_db, find_db
+from py_trkpac.graph import DependencyGraph
+from py_trkpac.installer import (
+    do_install, do_install_editable, do_reconcile, do_remove, do_update, do_watch,
+)
+from py_trkpac.lock import target_lock
 from py_trkpac.shell import add_to_shell, update_shell
+from py_trkpac.store import open_store
 from py_trkpac.utils import info, error, print_table, confirm
 
 
@@ -63,14 +68,31 @@ def cmd_init(args: argparse.Namespace) -> int:
 
 def cmd_install(args: argparse.Namespace) -> int:
     """Install one or more packages."""
-    if not args.packages:
+    if not args.packages and not args.editable:
         error("No packages specified.")
         return 1
+    if args.plan and args.editable:
+        error("--plan does not apply to --editable installs.")
+        return 1
 
     db = open_db()
     target_path = Path(db.get_config("target_path"))
 
-    success = do_install(db, args.packages, target_path)
+    # --plan only reads, so it can run alongside other planners
+    with target_lock(target_path, exclusive=not args.plan):
+        if not args.plan:
+            generations.sync_workdir(db, target_path)
+        success = True
+        for source in args.editable:
+            success = do_install_editable(db, source, target_path) and success
+        if args.packages:
+            success = do_install(
+                db, args.packages, target_path, plan_only=args.plan,
+                staged=True if args.staged else None, offline=args.offline,
+            ) and success
+        if success and not args.plan:
+            command = [*(f"--editable {e}" for e in args.editable), *args.packages]
+            generations.publish(db, target_path, f"install {' '.join(command)}")
     db.close()
     return 0 if success else 1
 
@@ -84,14 +106,18 @@ def cmd_remove(args: argparse.Namespace) -> int:
     db = open_db()
     target_path = Path(db.get_config("target_path"))
 
-    success = do_remove(db, args.packages, target_path)
+    with target_lock(target_path):
+        generations.sync_workdir(db, target_path)
+        success = do_remove(db, args.packages, target_path)
+        if success:
+            generations.publish(db, target_path, f"remove {' '.join(args.packages)}")
     db.close()
     return 0 if success else 1
 
 
 def cmd_list(args: argparse.Namespace) -> int:
     """List installed packages."""
-    db = open_db()
+    db = open_db(read_only=True)
     packages = db.get_all_packages()
 
     if not packages:
@@ -101,7 +127,9 @@ def cmd_list(args: argparse.Namespace) -> int:
 
     rows = []
     for p in packages:
-        if p["is_local"]:
+        if p["is_editable"]:
+            kind = "editable"
+        elif p["is_local"]:
             kind = "local"
         elif p["is_explicit"]:
             kind = "explicit"
@@ -128,38 +156,120 @@ def cmd_list(args: argparse.Namespace) -> int:
     return 0
 
 
+def _load_graph_node(name: str) -> tuple[DependencyGraph, int] | None:
+    """Load the dependency graph and look up a package, reporting if it's missing."""
+    db = open_db(read_only=True)
+    graph = DependencyGraph.load(db)
+    db.close()
+    node = graph.find(name)
+    if node is None:
+        error(f"{name} is not installed.")
+        return None
+    return graph, node
+
+
 def cmd_list_deps(args: argparse.Namespace) -> int:
     """List dependencies for a package."""
-    db = open_db()
-    pkg = db.get_package(args.package)
-    if not pkg:
-        error(f"{args.package} is not installed.")
-        db.close()
+    loaded = _load_graph_node(args.package)
+    if loaded is None:
         return 1
+    graph, node = loaded
+    pkg = graph.nodes[node]
 
     # Direct dependencies
-    deps = db.get_dependencies(pkg["id"])
-    header = f"\n{pkg['display_name']}=={pkg['version']}"
-    if pkg["is_local"]:
-        header += f" (local: {pkg['source_path']})"
+    header = f"\n{pkg.label()}"
+    if pkg.is_local:
+        header += f" ({'editable' if pkg.is_editable else 'local'}: {pkg.source_path})"
     header += " depends on:"
     info(header)
+    deps = graph.dependencies(node)
     if deps:
         for d in deps:
-            info(f"  {d['display_name']}=={d['version']}")
+            info(f"  {graph.nodes[d].label()}")
     else:
         info("  (none)")
 
     # Reverse: what requires this package
-    dependents = db.get_dependents(pkg["id"])
+    dependents = graph.dependents(node)
     info(f"\nRequired by:")
     if dependents:
         for d in dependents:
-            info(f"  {d['display_name']}=={d['version']}")
+            info(f"  {graph.nodes[d].label()}")
+    else:
+        info("  (none)")
+
+    return 0
+
+
+def cmd_tree(args: argparse.Namespace) -> int:
+    """Show the transitive dependency tree of a package."""
+    loaded = _load_graph_node(args.package)
+    if loaded is None:
+        return 1
+    graph, node = loaded
+    for depth, i, repeated in graph.tree(node):
+        suffix = " (*)" if repeated and graph.dependencies(i) else ""
+        info(f"{'  ' * depth}{graph.nodes[i].label()}{suffix}")
+    info("(* = dependencies shown above)")
+    return 0
+
+
+def cmd_why(args: argparse.Namespace) -> int:
+    """Show why a package is installed: shortest paths from explicit packages."""
+    loaded = _load_graph_node(args.package)
+    if loaded is None:
+        return 1
+    graph, node = loaded
+    paths = graph.why(node)
+    if not paths:
+        info(f"{graph.nodes[node].label()} is not required by any explicit package.")
+        return 0
+    for path in paths:
+        if len(path) == 1:
+            info(f"{graph.nodes[node].label()} (installed explicitly)")
+        else:
+            info(" -> ".join(graph.nodes[i].label() for i in path))
+    return 0
+
+
+def cmd_rdeps(args: argparse.Namespace) -> int:
+    """List packages that depend on a package, optionally transitively."""
+    loaded = _load_graph_node(args.package)
+    if loaded is None:
+        return 1
+    graph, node = loaded
+    if args.recursive:
+        found = sorted(graph.closure(node, reverse=True), key=lambda i: graph.nodes[i].name)
+    else:
+        found = graph.dependents(node)
+    info(f"{graph.nodes[node].label()} is required by:")
+    if found:
+        for i in found:
+            info(f"  {graph.nodes[i].label()}")
     else:
         info("  (none)")
+    return 0
+
+
+def cmd_owns(args: argparse.Namespace) -> int:
+    """Show which package owns a file in the target."""
+    db = open_db(read_only=True)
+    target_path = Path(db.get_config("target_path"))
 
+    # Accept absolute paths, paths relative to cwd, or paths relative to target
+    candidate = Path(args.path).expanduser()
+    try:
+        rel = candidate.resolve().relative_to(target_path.resolve()).as_posix()
+    except ValueError:
+        rel = candidate.as_posix()
+
+    owners = db.get_file_owners(rel)
     db.close()
+    if not owners:
+        info(f"No package owns {rel}.")
+        return 1
+    for o in owners:
+        info(f"{rel} is owned by {o['display_name']}=={o['version']}")
     return 0
 
 
@@ -169,11 +279,153 @@ def cmd_update(args: argparse.Namespace) -> int:
     target_path = Path(db.get_config("target_path"))
 
     packages = args.packages if args.packages else None
-    success = do_update(db, packages, target_path)
+    with target_lock(target_path):
+        generations.sync_workdir(db, target_path)
+        success = do_update(db, packages, target_path)
+        if success:
+            generations.publish(db, target_path, f"update {' '.join(packages or [])}".rstrip())
+    db.close()
+    return 0 if success else 1
+
+
+def cmd_reconcile(args: argparse.Namespace) -> int:
+    """Rebuild the database from the packages actually present in the target."""
+    db = open_db()
+    target_path = Path(db.get_config("target_path"))
+
+    with target_lock(target_path):
+        generations.sync_workdir(db, target_path)
+        success = do_reconcile(db, target_path, workers=args.workers)
+        if success:
+            generations.publish(db, target_path, "reconcile")
     db.close()
     return 0 if success else 1
 
 
+def cmd_watch(args: argparse.Namespace) -> int:
+    """Keep the database in sync with out-of-band changes to the target."""
+    db = open_db()
+    target_path = Path(db.get_config("target_path"))
+
+    success = do_watch(db, target_path, debounce=args.debounce)
+    db.close()
+    return 0 if success else 1
+
+
+def cmd_generations(args: argparse.Namespace) -> int:
+    """List, enable, disable or prune generations of the target."""
+    db = open_db()
+    target_path = Path(db.get_config("target_path"))
+    shell_config = Path(db.get_config("shell_config"))
+
+    if args.action == "enable":
+        with target_lock(target_path):
+            live = generations.enable(db, target_path)
+        update_shell(str(live), shell_config)
+        info(f"Updated {shell_config}: PYTHONPATH and PATH now point at {live}.")
+        info("Open a new terminal for the change to take effect.")
+    elif args.action == "disable":
+        with target_lock(target_path):
+            generations.disable(db, target_path)
+        update_shell(str(target_path), shell_config)
+        info(f"Generations are off; {shell_config} points at {target_path} again.")
+    elif args.action == "prune":
+        with target_lock(target_path):
+            pruned = generations.prune(db, target_path, keep=args.keep)
+        info(f"Pruned {pruned} generation(s).")
+    else:
+        gens = db.get_generations()
+        if not gens:
+            info("No generations. Enable them with 'py-trkpac generations enable'.")
+        else:
+            current = generations.current_generation(target_path)
+            rows = [
+                [
+                    f"{g['id']}{' *' if g['id'] == current else ''}",
+                    g["created_at"][:19].replace("T", " "),
+                    str(g["package_count"]),
+                    g["command"],
+                ]
+                for g in gens
+            ]
+            print_table(["Generation", "Created", "Packages", "Command"], rows)
+            info("\n(* = current)")
+    db.close()
+    return 0
+
+
+def cmd_rollback(args: argparse.Namespace) -> int:
+    """Switch to an earlier generation of the target."""
+    db = open_db()
+    target_path = Path(db.get_config("target_path"))
+
+    with target_lock(target_path):
+        success = generations.rollback(db, target_path, args.generation)
+    db.close()
+    return 0 if success else 1
+
+
+def cmd_store(args: argparse.Namespace) -> int:
+    """Show the content-addressed store, or garbage-collect it."""
+    db = open_db()
+    store = open_store(db)
+    db.close()
+    if store is None:
+        error("No store configured. Set one with 'py-trkpac config set store_path <dir>'.")
+        return 1
+
+    if args.action == "gc":
+        deleted, freed = store.gc()
+        info(f"Deleted {deleted} unreferenced object(s), freed {freed / 1e6:.1f} MB.")
+    else:
+        stats = store.stats()
+        info(f"Store: {store.path}")
+        info(f"  objects:  {stats['objects']} ({stats['bytes'] / 1e6:.1f} MB)")
+        info(f"  links:    {stats['refs']} in {stats['targets']} target(s)")
+        info(f"  packages: {stats['dists']} linkable without pip")
+    store.close()
+    return 0
+
+
+def cmd_wheelhouse(args: argparse.Namespace) -> int:
+    """List, add to or trim the wheelhouse."""
+    db = open_db()
+    target_path = Path(db.get_config("target_path"))
+
+    if args.action == "add":
+        if not args.paths:
+            error("No wheels specified.")
+            db.close()
+            return 1
+        paths = []
+        for arg in args.paths:
+            path = Path(arg).expanduser()
+            paths += sorted(path.glob("*.whl")) if path.is_dir() else [path]
+        with target_lock(target_path):
+            stored = wheelhouse.add_wheels(db, target_path, paths)
+            evicted, _ = wheelhouse.evict(db, target_path)
+        info(f"Stored {len(stored)} wheel(s)" + (f", evicted {evicted}." if evicted else "."))
+    elif args.action == "evict":
+        with target_lock(target_path):
+            evicted, freed = wheelhouse.evict(db, target_path)
+        info(f"Evicted {evicted} wheel(s), freed {freed / 1e6:.1f} MB.")
+    else:
+        wheels = db.get_wheels()
+        print_table(
+            ["Wheel", "Size", "Last used"],
+            [
+                [w["filename"], f"{w['size'] / 1e6:.1f} MB", w["last_used"][:16].replace("T", " ")]
+                for w in wheels
+            ],
+        )
+        total = sum(w["size"] for w in wheels)
+        info(f"\n{len(wheels)} wheel(s), {total / 1e6:.1f} MB "
+             f"(limit {db.get_config('wheelhouse_max_mb') or OPTIONAL_CONFIG['wheelhouse_max_mb']} MB)"
+             f" in {wheelhouse.wheelhouse_path(target_path)}")
+    db.close()
+    return 0
+
+
 def cmd_config(args: argparse.Namespace) -> int:
     """Show or modify configuration."""
     db = open_db()
@@ -186,14 +438,21 @@ def cmd_config(args: argparse.Namespace) -> int:
         # If target_path changed, update shell config
         if args.key == "target_path":
             shell_config = Path(db.get_config("shell_config"))
-            update_shell(args.value, shell_config)
+            live = args.value
+            if generations.enabled(db):
+                live = str(generations.current_path(Path(args.value)))
+            update_shell(live, shell_config)
             info(f"Updated {shell_config}.")
     else:
         # Show all config
         info("py-trkpac configuration:")
-        info(f"  target_path:  {db.get_config('target_path')}")
-        info(f"  shell_config: {db.get_config('shell_config')}")
-        info(f"  database:     {db.db_path}")
+        info(f"  target_path:       {db.get_config('target_path')}")
+        info(f"  shell_config:      {db.get_config('shell_config')}")
+        info(f"  database:          {db.db_path}")
+        for key, default in OPTIONAL_CONFIG.items():
+            value = db.get_config(key)
+            info(f"  {key + ':':<18} {value if value is not None else default}"
+                 + ("" if value is not None else " (default)"))
 
     db.close()
     return 0
@@ -218,7 +477,23 @@ def main() -> None:
 
     # install
     p_install = subparsers.add_parser("install", help="Install packages")
-    p_install.add_argument("packages", nargs="+", help="Package names to install")
+    p_install.add_argument("packages", nargs="*", help="Package names to install")
+    p_install.add_argument(
+        "-e", "--editable", action="append", default=[], metavar="PATH",
+        help="Link a local project into the target instead of copying it (repeatable)",
+    )
+    p_install.add_argument(
+        "--plan", action="store_true",
+        help="Show what would be installed, upgraded or downgraded, then exit",
+    )
+    p_install.add_argument(
+        "--staged", action="store_true",
+        help="Install into a staging directory and swap the result into the target",
+    )
+    p_install.add_argument(
+        "--offline", action="store_true",
+        help="Install only from wheels in the wheelhouse, without an index",
+    )
 
     # remove
     p_remove = subparsers.add_parser("remove", help="Remove packages")
@@ -231,10 +506,78 @@ def main() -> None:
     p_list_deps = subparsers.add_parser("list-deps", help="List dependencies for a package")
     p_list_deps.add_argument("package", help="Package name")
 
+    # tree
+    p_tree = subparsers.add_parser("tree", help="Show the transitive dependency tree")
+    p_tree.add_argument("package", help="Package name")
+
+    # why
+    p_why = subparsers.add_parser("why", help="Show which explicit packages pull in a package")
+    p_why.add_argument("package", help="Package name")
+
+    # rdeps
+    p_rdeps = subparsers.add_parser("rdeps", help="List packages that depend on a package")
+    p_rdeps.add_argument("package", help="Package name")
+    p_rdeps.add_argument(
+        "--recursive", "-r", action="store_true", help="Include indirect dependents"
+    )
+
+    # owns
+    p_owns = subparsers.add_parser("owns", help="Show which package owns a file")
+    p_owns.add_argument("path", help="File path (absolute, or relative to the target)")
+
     # update
     p_update = subparsers.add_parser("update", help="Update packages")
     p_update.add_argument("packages", nargs="*", help="Package names (omit for all explicit)")
 
+    # reconcile
+    p_reconcile = subparsers.add_parser(
+        "reconcile", help="Resync the database with what is on disk in the target"
+    )
+    p_reconcile.add_argument(
+        "--workers", type=int, default=None, help="Parser threads (default: CPU-based)"
+    )
+
+    # watch
+    p_watch = subparsers.add_parser(
+        "watch", help="Track changes other tools make to the target until interrupted"
+    )
+    p_watch.add_argument(
+        "--debounce", type=float, default=2.0,
+        help="Seconds of quiet before a burst of changes is applied (default: 2)",
+    )
+
+    # generations
+    p_generations = subparsers.add_parser(
+        "generations", help="List or manage generations of the target"
+    )
+    p_generations.add_argument(
+        "action", nargs="?", choices=["list", "enable", "disable", "prune"], default="list",
+    )
+    p_generations.add_argument(
+        "--keep", type=int, default=5, help="Generations kept by prune (default: 5)"
+    )
+
+    # rollback
+    p_rollback = subparsers.add_parser(
+        "rollback", help="Switch back to an earlier generation"
+    )
+    p_rollback.add_argument(
+        "generation", nargs="?", type=int, help="Generation number (default: the previous one)"
+    )
+
+    # store
+    p_store = subparsers.add_parser("store", help="Show or garbage-collect the file store")
+    p_store.add_argument("action", nargs="?", choices=["show", "gc"], default="show")
+
+    # wheelhouse
+    p_wheelhouse = subparsers.add_parser(
+        "wheelhouse", help="List, add to or trim the local wheelhouse"
+    )
+    p_wheelhouse.add_argument(
+        "action", nargs="?", choices=["list", "add", "evict"], default="list"
+    )
+    p_wheelhouse.add_argument("paths", nargs="*", help="Wheel files or directories (for add)")
+
     # config
     p_config = subparsers.add_parser("config", help="Show or modify configuration")
     p_config.add_argument("action", nargs="?", help="'set' to modify a config value")
@@ -253,7 +596,17 @@ def main() -> None:
         "remove": cmd_remove,
         "list": cmd_list,
         "list-deps": cmd_list_deps,
+        "tree": cmd_tree,
+        "why": cmd_why,
+        "rdeps": cmd_rdeps,
+        "owns": cmd_owns,
         "update": cmd_update,
+        "reconcile": cmd_reconcile,
+        "watch": cmd_watch,
+        "generations": cmd_generations,
+        "rollback": cmd_rollback,
+        "store": cmd_store,
+        "wheelhouse": cmd_wheelhouse,
         "config": cmd_config,
     }
 
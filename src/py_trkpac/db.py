@@ -2,7 +2,10 @@
 
 from __future__ import annotations
 
+import json
 import sqlite3
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -10,6 +13,33 @@ from py_trkpac.utils import normalize_name
 
 DB_FILENAME = ".py-trkpac.db"
 
+# Optional config keys and their defaults (shown by `py-trkpac config`)
+OPTIONAL_CONFIG = {
+    "inotify": "on",  # watch the target with inotify during installs (Linux)
+    "purge_workers": "4",  # threads deleting trashed files in the background
+    "staged_install": "off",  # install into a staging dir, then swap into the target
+    "generations": "off",  # publish each operation as a generation (see `generations`)
+    "clone_method": "auto",  # how generations copy files: auto, reflink or hardlink
+    "store_path": "",  # content-addressed store shared with other targets (off if empty)
+    "installer_backend": "pip",  # pip, uv, or auto (uv when it is on PATH)
+    "wheelhouse": "off",  # keep installed wheels under the target; install offline-first
+    "wheelhouse_max_mb": "2048",  # evict least recently used wheels beyond this size
+    "build_cache": "on",  # reuse wheels built from unchanged local source trees
+    "build_workers": "4",  # local projects built in parallel
+}
+
+# Seconds a connection waits for another process's write lock
+BUSY_TIMEOUT = 30.0
+
+# Max bound parameters per IN (...) query, below SQLite's historical limit
+_SQL_CHUNK = 500
+
+# Package columns saved with each generation, in this order
+_PACKAGE_STATE_COLUMNS = (
+    "name, display_name, version, is_explicit, is_local, source_path, "
+    "install_date, updated_date, is_editable"
+)
+
 SCHEMA_SQL = """
 PRAGMA foreign_keys = ON;
 
@@ -25,6 +55,7 @@ CREATE TABLE IF NOT EXISTS packages (
     version      TEXT NOT NULL,
     is_explicit  INTEGER NOT NULL DEFAULT 0,
     is_local     INTEGER NOT NULL DEFAULT 0,
+    is_editable  INTEGER NOT NULL DEFAULT 0,
     source_path  TEXT,
     install_date TEXT NOT NULL,
     updated_date TEXT
@@ -37,6 +68,91 @@ CREATE TABLE IF NOT EXISTS package_dependencies (
     dependency_id INTEGER NOT NULL REFERENCES packages(id) ON DELETE CASCADE,
     PRIMARY KEY (package_id, dependency_id)
 );
+
+CREATE TABLE IF NOT EXISTS package_files (
+    package_id INTEGER NOT NULL REFERENCES packages(id) ON DELETE CASCADE,
+    path       TEXT NOT NULL,
+    hash       TEXT,
+    size       INTEGER,
+    PRIMARY KEY (package_id, path)
+);
+
+CREATE INDEX IF NOT EXISTS idx_package_files_path ON package_files(path);
+
+CREATE TABLE IF NOT EXISTS metadata_cache (
+    path          TEXT PRIMARY KEY,
+    mtime_ns      INTEGER NOT NULL,
+    size          INTEGER NOT NULL,
+    name          TEXT,
+    version       TEXT,
+    requires_dist TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS target_snapshot (
+    dist_info   TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS state (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS dist_info_index (
+    name      TEXT PRIMARY KEY,
+    dist_info TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS shadow_roots (
+    root        TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS shadow_packages (
+    root         TEXT NOT NULL REFERENCES shadow_roots(root) ON DELETE CASCADE,
+    name         TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    version      TEXT NOT NULL,
+    PRIMARY KEY (root, name)
+);
+
+CREATE TABLE IF NOT EXISTS generations (
+    id           INTEGER PRIMARY KEY,
+    created_at   TEXT NOT NULL,
+    command      TEXT NOT NULL,
+    packages     TEXT NOT NULL,
+    dependencies TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS wheels (
+    sha256    TEXT PRIMARY KEY,
+    filename  TEXT NOT NULL UNIQUE,
+    name      TEXT NOT NULL,
+    version   TEXT NOT NULL,
+    tags      TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    added_at  TEXT NOT NULL,
+    last_used TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_wheels_name ON wheels(name, version);
+CREATE INDEX IF NOT EXISTS idx_wheels_last_used ON wheels(last_used);
+
+CREATE TABLE IF NOT EXISTS source_files (
+    root     TEXT NOT NULL,
+    path     TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size     INTEGER NOT NULL,
+    sha256   TEXT NOT NULL,
+    PRIMARY KEY (root, path)
+);
+
+CREATE TABLE IF NOT EXISTS local_builds (
+    source_path TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    wheel       TEXT NOT NULL,
+    built_at    TEXT NOT NULL
+);
 """
 
 
@@ -45,37 +161,121 @@ def _now() -> str:
 
 
 def _migrate_schema(conn: sqlite3.Connection) -> None:
-    """Apply schema migrations for new columns. Idempotent."""
+    """Apply schema migrations for new columns and tables. Idempotent.
+
+    PRAGMA user_version records how many migrations have been applied, so an
+    up-to-date database (the common case, and every read-only command) skips
+    them without taking a write lock. New migrations are appended to the list.
+    """
     migrations = [
         "ALTER TABLE packages ADD COLUMN is_local INTEGER NOT NULL DEFAULT 0",
         "ALTER TABLE packages ADD COLUMN source_path TEXT",
+        "CREATE TABLE IF NOT EXISTS state ("
+        "key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS dist_info_index ("
+        "name TEXT PRIMARY KEY, dist_info TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS shadow_roots ("
+        "root TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS shadow_packages ("
+        "root TEXT NOT NULL REFERENCES shadow_roots(root) ON DELETE CASCADE, "
+        "name TEXT NOT NULL, display_name TEXT NOT NULL, version TEXT NOT NULL, "
+        "PRIMARY KEY (root, name))",
+        "CREATE TABLE IF NOT EXISTS package_files ("
+        "package_id INTEGER NOT NULL REFERENCES packages(id) ON DELETE CASCADE, "
+        "path TEXT NOT NULL, hash TEXT, size INTEGER, "
+        "PRIMARY KEY (package_id, path))",
+        "CREATE INDEX IF NOT EXISTS idx_package_files_path ON package_files(path)",
+        "CREATE TABLE IF NOT EXISTS metadata_cache ("
+        "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, "
+        "name TEXT, version TEXT, requires_dist TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS target_snapshot ("
+        "dist_info TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS generations ("
+        "id INTEGER PRIMARY KEY, created_at TEXT NOT NULL, command TEXT NOT NULL, "
+        "packages TEXT NOT NULL, dependencies TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS wheels ("
+        "sha256 TEXT PRIMARY KEY, filename TEXT NOT NULL UNIQUE, name TEXT NOT NULL, "
+        "version TEXT NOT NULL, tags TEXT NOT NULL, size INTEGER NOT NULL, "
+        "added_at TEXT NOT NULL, last_used TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_wheels_name ON wheels(name, version)",
+        "CREATE INDEX IF NOT EXISTS idx_wheels_last_used ON wheels(last_used)",
+        "CREATE TABLE IF NOT EXISTS source_files ("
+        "root TEXT NOT NULL, path TEXT NOT NULL, mtime_ns INTEGER NOT NULL, "
+        "size INTEGER NOT NULL, sha256 TEXT NOT NULL, PRIMARY KEY (root, path))",
+        "CREATE TABLE IF NOT EXISTS local_builds ("
+        "source_path TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+        "wheel TEXT NOT NULL, built_at TEXT NOT NULL)",
+        "ALTER TABLE packages ADD COLUMN is_editable INTEGER NOT NULL DEFAULT 0",
     ]
-    for sql in migrations:
+    applied = conn.execute("PRAGMA user_version").fetchone()[0]
+    if applied >= len(migrations):
+        return
+    for sql in migrations[applied:]:
         try:
             conn.execute(sql)
         except sqlite3.OperationalError:
-            pass  # Column already exists
+            pass  # Column already exists, or packages table not created yet
+    conn.execute(f"PRAGMA user_version = {len(migrations)}")
     conn.commit()
 
 
 class Database:
     """Wrapper around the py-trkpac SQLite database."""
 
-    def __init__(self, db_path: Path) -> None:
+    def __init__(self, db_path: Path, read_only: bool = False) -> None:
         self.db_path = db_path
-        self.conn = sqlite3.connect(str(db_path))
+        self.conn = sqlite3.connect(str(db_path), timeout=BUSY_TIMEOUT)
+        # WAL lets readers (list, list-deps) run while an install is writing
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}")
         self.conn.execute("PRAGMA foreign_keys = ON")
         self.conn.row_factory = sqlite3.Row
+        self._tx_depth = 0
         _migrate_schema(self.conn)
+        if read_only:
+            # Readers never take the write lock: a write raises instead of
+            # waiting out busy_timeout behind an install or remove
+            self.conn.execute("PRAGMA query_only = ON")
 
     def close(self) -> None:
         self.conn.close()
 
+    # -- Transactions --
+
+    @contextmanager
+    def transaction(self) -> Iterator[Database]:
+        """Group writes into one atomic commit.
+
+        Methods called inside the block skip their own commit; the outermost
+        block commits on success and rolls everything back on an exception.
+        Blocks may be nested.
+        """
+        if self._tx_depth == 0 and not self.conn.in_transaction:
+            # IMMEDIATE takes the write lock up front, so a concurrent writer
+            # waits on busy_timeout instead of failing on a lock upgrade
+            self.conn.execute("BEGIN IMMEDIATE")
+        self._tx_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._tx_depth -= 1
+            if self._tx_depth == 0:
+                self.conn.rollback()
+            raise
+        self._tx_depth -= 1
+        if self._tx_depth == 0:
+            self.conn.commit()
+
+    def _commit(self) -> None:
+        """Commit unless inside transaction(), which commits once at the end."""
+        if self._tx_depth == 0:
+            self.conn.commit()
+
     # -- Schema --
 
     def init_schema(self) -> None:
         self.conn.executescript(SCHEMA_SQL)
-        self.conn.commit()
+        self._commit()
 
     # -- Config --
 
@@ -91,7 +291,23 @@ class Database:
             "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
             (key, value),
         )
-        self.conn.commit()
+        self._commit()
+
+    # -- Internal state (cache fingerprints, not user-facing config) --
+
+    def get_state(self, key: str) -> str | None:
+        row = self.conn.execute(
+            "SELECT value FROM state WHERE key = ?", (key,)
+        ).fetchone()
+        return row["value"] if row else None
+
+    def set_state(self, key: str, value: str) -> None:
+        self.conn.execute(
+            "INSERT INTO state (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+        self._commit()
 
     # -- Packages --
 
@@ -141,7 +357,7 @@ class Database:
                 (version, display_name, new_explicit, new_local, new_source,
                  _now(), existing["id"]),
             )
-            self.conn.commit()
+            self._commit()
             return existing["id"]
         else:
             cur = self.conn.execute(
@@ -151,16 +367,70 @@ class Database:
                 (norm, display_name, version, int(is_explicit),
                  int(is_local), source_path, _now()),
             )
-            self.conn.commit()
+            self._commit()
             return cur.lastrowid
 
+    def upsert_packages(self, packages: list[dict]) -> dict[str, int]:
+        """Bulk version of upsert_package with the same promotion rules.
+
+        packages: list of {name, display_name, version, is_explicit,
+        is_local, is_editable, source_path}. Returns {normalized name: package
+        id}. is_editable describes how this install was made, so it is
+        replaced rather than promoted.
+        """
+        now = _now()
+        rows = [
+            (normalize_name(p["name"]), p["display_name"], p["version"],
+             int(p["is_explicit"]), int(p.get("is_local", False)),
+             int(p.get("is_editable", False)), p.get("source_path"), now)
+            for p in packages
+        ]
+        self.conn.executemany(
+            "INSERT INTO packages (name, display_name, version, is_explicit, "
+            "is_local, is_editable, source_path, install_date) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET "
+            "version = excluded.version, display_name = excluded.display_name, "
+            "is_explicit = MAX(is_explicit, excluded.is_explicit), "
+            "is_local = MAX(is_local, excluded.is_local), "
+            "is_editable = excluded.is_editable, "
+            "source_path = CASE WHEN excluded.is_local THEN excluded.source_path "
+            "ELSE source_path END, "
+            "updated_date = excluded.install_date",
+            rows,
+        )
+        ids = self.get_package_ids([r[0] for r in rows])
+        self._commit()
+        return ids
+
+    def get_package_ids(self, names: list[str]) -> dict[str, int]:
+        """Return {normalized name: id} for the given names that exist."""
+        norms = [normalize_name(n) for n in names]
+        ids: dict[str, int] = {}
+        for i in range(0, len(norms), _SQL_CHUNK):
+            chunk = norms[i : i + _SQL_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in self.conn.execute(
+                f"SELECT id, name FROM packages WHERE name IN ({placeholders})", chunk
+            ):
+                ids[row["name"]] = row["id"]
+        return ids
+
     def remove_package(self, name: str) -> bool:
         """Remove a package by name. Returns True if it existed."""
         norm = normalize_name(name)
         cur = self.conn.execute("DELETE FROM packages WHERE name = ?", (norm,))
-        self.conn.commit()
+        self._commit()
         return cur.rowcount > 0
 
+    def remove_packages(self, names: list[str]) -> None:
+        """Remove several packages by name (CASCADE deletes their edges)."""
+        self.conn.executemany(
+            "DELETE FROM packages WHERE name = ?",
+            [(normalize_name(n),) for n in names],
+        )
+        self._commit()
+
     # -- Dependencies --
 
     def set_dependencies(self, package_id: int, dependency_ids: list[int]) -> None:
@@ -176,7 +446,28 @@ class Database:
                 "VALUES (?, ?)",
                 (package_id, dep_id),
             )
-        self.conn.commit()
+        self._commit()
+
+    def set_dependency_edges(self, edges: dict[int, list[int]]) -> None:
+        """Replace the dependencies of several packages at once.
+
+        edges: {package_id: [dependency_id, ...]}. Self-references are dropped.
+        """
+        self.conn.executemany(
+            "DELETE FROM package_dependencies WHERE package_id = ?",
+            [(pkg_id,) for pkg_id in edges],
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO package_dependencies (package_id, dependency_id) "
+            "VALUES (?, ?)",
+            [
+                (pkg_id, dep_id)
+                for pkg_id, dep_ids in edges.items()
+                for dep_id in dep_ids
+                if dep_id != pkg_id
+            ],
+        )
+        self._commit()
 
     def get_dependencies(self, package_id: int) -> list[sqlite3.Row]:
         """Get packages that this package depends on."""
@@ -196,6 +487,220 @@ class Database:
             (package_id,),
         ).fetchall()
 
+    # -- File manifests --
+
+    def set_package_files(
+        self, manifests: dict[int, list[tuple[str, str | None, int | None]]]
+    ) -> None:
+        """Replace the file manifest of several packages.
+
+        manifests: {package_id: [(path relative to target, hash, size), ...]}.
+        """
+        self.conn.executemany(
+            "DELETE FROM package_files WHERE package_id = ?",
+            [(pkg_id,) for pkg_id in manifests],
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO package_files (package_id, path, hash, size) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (pkg_id, path, file_hash, size)
+                for pkg_id, entries in manifests.items()
+                for path, file_hash, size in entries
+            ],
+        )
+        self._commit()
+
+    def get_package_files(self, package_id: int) -> list[str]:
+        """Paths (relative to target) recorded for a package."""
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        return [
+            row[0] for row in cur.execute(
+                "SELECT path FROM package_files WHERE package_id = ?", (package_id,)
+            )
+        ]
+
+    def get_file_owners(self, path: str) -> list[sqlite3.Row]:
+        """Packages whose manifest contains path (relative to target)."""
+        return self.conn.execute(
+            "SELECT p.*, pf.hash, pf.size FROM packages p "
+            "JOIN package_files pf ON p.id = pf.package_id "
+            "WHERE pf.path = ? ORDER BY p.name",
+            (path,),
+        ).fetchall()
+
+    def get_file_collisions(self, package_ids: list[int]) -> list[sqlite3.Row]:
+        """Files of the given packages that another package's manifest also claims.
+
+        One indexed join: the given manifests are read by primary key and each
+        path is probed in idx_package_files_path, so cost scales with the new
+        packages' file count, not the size of the target.
+        """
+        return self.conn.execute(
+            "SELECT pf.path, p.display_name AS owner, o.display_name AS other, "
+            "pf.hash, pf2.hash AS other_hash "
+            "FROM package_files pf "
+            "JOIN package_files pf2 ON pf2.path = pf.path AND pf2.package_id != pf.package_id "
+            "JOIN packages p ON p.id = pf.package_id "
+            "JOIN packages o ON o.id = pf2.package_id "
+            "WHERE pf.package_id IN (SELECT value FROM json_each(?)) "
+            "ORDER BY pf.path, o.name",
+            (json.dumps(package_ids),),
+        ).fetchall()
+
+    def get_shared_files(self, package_ids: list[int]) -> set[str]:
+        """Paths in the given packages' manifests that some other package also owns."""
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        return {
+            row[0] for row in cur.execute(
+                "SELECT pf.path FROM package_files pf "
+                "WHERE pf.package_id IN (SELECT value FROM json_each(?1)) "
+                "AND EXISTS (SELECT 1 FROM package_files o WHERE o.path = pf.path "
+                "AND o.package_id NOT IN (SELECT value FROM json_each(?1)))",
+                (json.dumps(package_ids),),
+            )
+        }
+
+    def get_files_under(self, entries: list[str], exclude_ids: list[int]) -> list[str]:
+        """Paths owned by packages outside exclude_ids at or below the given entries.
+
+        entries are paths relative to the target ("bin", "google"). Each is
+        two index lookups on idx_package_files_path (the entry itself and the
+        "entry/" range), so this is cheap even when the target is large.
+        """
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        return [
+            row[0] for row in cur.execute(
+                "SELECT pf.path FROM json_each(?1) t JOIN package_files pf "
+                "ON pf.path >= t.value || '/' AND pf.path < t.value || '0' "
+                "WHERE pf.package_id NOT IN (SELECT value FROM json_each(?2)) "
+                "UNION "
+                "SELECT pf.path FROM json_each(?1) t JOIN package_files pf "
+                "ON pf.path = t.value "
+                "WHERE pf.package_id NOT IN (SELECT value FROM json_each(?2))",
+                (json.dumps(entries), json.dumps(exclude_ids)),
+            )
+        ]
+
+    def get_packages_without_files(self) -> list[sqlite3.Row]:
+        """Packages with no manifest (recorded before manifests existed)."""
+        return self.conn.execute(
+            "SELECT p.* FROM packages p WHERE NOT EXISTS "
+            "(SELECT 1 FROM package_files pf WHERE pf.package_id = p.id)"
+        ).fetchall()
+
+    def get_unowned_dist_infos(self) -> list[str]:
+        """Dist-infos in the target snapshot that no package with a manifest owns.
+
+        Their files are invisible to get_files_under. A stale dist-info pip
+        left behind on upgrade counts as owned when a package of the same
+        name has a manifest: the files it lists are that package's, or
+        leftovers of it. Needs a valid snapshot and dist-info index.
+        """
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        candidates = [
+            row[0] for row in cur.execute(
+                "SELECT ts.dist_info FROM target_snapshot ts WHERE NOT EXISTS ("
+                "SELECT 1 FROM dist_info_index di JOIN packages p ON p.name = di.name "
+                "WHERE di.dist_info = ts.dist_info "
+                "AND EXISTS (SELECT 1 FROM package_files pf WHERE pf.package_id = p.id))"
+            )
+        ]
+        if not candidates:
+            return []
+        names = {
+            d: normalize_name(d[: -len(".dist-info")].rsplit("-", 1)[0]) for d in candidates
+        }
+        owned = {
+            row[0] for row in cur.execute(
+                "SELECT p.name FROM packages p "
+                "WHERE p.name IN (SELECT value FROM json_each(?)) "
+                "AND EXISTS (SELECT 1 FROM package_files pf WHERE pf.package_id = p.id)",
+                (json.dumps(sorted(set(names.values()))),),
+            )
+        }
+        return [d for d in candidates if names[d] not in owned]
+
+    # -- Metadata cache (keyed by dist-info path + METADATA stat) --
+
+    def get_cached_metadata(
+        self, keys: list[tuple[str, int, int]]
+    ) -> dict[tuple[str, int, int], dict]:
+        """Return {(path, mtime_ns, size): metadata} for keys with a fresh entry."""
+        wanted = {k[0]: k for k in keys}
+        paths = list(wanted)
+        found = {}
+        for i in range(0, len(paths), _SQL_CHUNK):
+            chunk = paths[i : i + _SQL_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in self.conn.execute(
+                f"SELECT * FROM metadata_cache WHERE path IN ({placeholders})", chunk
+            ):
+                key = (row["path"], row["mtime_ns"], row["size"])
+                if wanted[row["path"]] == key:
+                    found[key] = {
+                        "name": row["name"],
+                        "version": row["version"],
+                        "requires_dist": json.loads(row["requires_dist"]),
+                    }
+        return found
+
+    def cache_metadata(self, entries: list[tuple[tuple[str, int, int], dict]]) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO metadata_cache "
+            "(path, mtime_ns, size, name, version, requires_dist) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (*key, meta["name"], meta["version"], json.dumps(meta["requires_dist"]))
+                for key, meta in entries
+            ],
+        )
+        self._commit()
+
+    def remove_cached_metadata(self, paths: list[str]) -> None:
+        self.conn.executemany(
+            "DELETE FROM metadata_cache WHERE path = ?", [(p,) for p in paths]
+        )
+        self._commit()
+
+    def get_requirements_naming(self, names: list[str]) -> list[str]:
+        """Requires-Dist strings in the metadata cache that may name one of names.
+
+        names are normalized, so they match as LIKE prefixes: LIKE ignores
+        case, and "_" stands for any one character, i.e. any separator.
+        Callers confirm each string with parse_dependency_name.
+        """
+        if not names:
+            return []
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        return [
+            row[0] for row in cur.execute(
+                "SELECT j.value FROM metadata_cache m, json_each(m.requires_dist) j "
+                "WHERE EXISTS (SELECT 1 FROM json_each(?) p WHERE j.value LIKE p.value)",
+                (json.dumps([f"{n}%" for n in names]),),
+            )
+        ]
+
+    def iter_package_nodes(self) -> sqlite3.Cursor:
+        """Plain tuples of graph.Node's fields, in order."""
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        return cur.execute(
+            "SELECT id, name, display_name, version, is_explicit, is_local, source_path, "
+            "is_editable FROM packages"
+        )
+
+    def iter_dependency_edges(self) -> sqlite3.Cursor:
+        """Plain tuples (package_id, dependency_id)."""
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        return cur.execute("SELECT package_id, dependency_id FROM package_dependencies")
+
     def get_orphaned_dependencies(self) -> list[sqlite3.Row]:
         """Find packages that are not explicit AND nothing depends on them."""
         return self.conn.execute(
@@ -206,6 +711,316 @@ class Database:
             ")"
         ).fetchall()
 
+    # -- .dist-info index (normalized name -> dist-info dir name) --
+
+    def get_dist_info_name(self, name: str) -> str | None:
+        row = self.conn.execute(
+            "SELECT dist_info FROM dist_info_index WHERE name = ?",
+            (normalize_name(name),),
+        ).fetchone()
+        return row["dist_info"] if row else None
+
+    def replace_dist_info_index(self, entries: dict[str, str]) -> None:
+        """Replace the whole index with {normalized name: dist-info dir name}."""
+        self.conn.execute("DELETE FROM dist_info_index")
+        self.conn.executemany(
+            "INSERT INTO dist_info_index (name, dist_info) VALUES (?, ?)",
+            entries.items(),
+        )
+        self._commit()
+
+    def set_dist_info_names(self, entries: dict[str, str]) -> None:
+        """Insert or update index entries for the given normalized names."""
+        self.conn.executemany(
+            "INSERT INTO dist_info_index (name, dist_info) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET dist_info = excluded.dist_info",
+            entries.items(),
+        )
+        self._commit()
+
+    def remove_dist_info_names(self, names: list[str]) -> None:
+        self.conn.executemany(
+            "DELETE FROM dist_info_index WHERE name = ?",
+            [(normalize_name(n),) for n in names],
+        )
+        self._commit()
+
+    # -- Persisted .dist-info snapshot of the target --
+
+    def get_snapshot_dist_infos(self, names: list[str]) -> list[str]:
+        """Snapshot dist-infos that may belong to one of names (normalized).
+
+        A LIKE match as in get_requirements_naming; callers confirm the name.
+        """
+        if not names:
+            return []
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        return [
+            row[0] for row in cur.execute(
+                "SELECT ts.dist_info FROM target_snapshot ts "
+                "WHERE EXISTS (SELECT 1 FROM json_each(?) p WHERE ts.dist_info LIKE p.value)",
+                (json.dumps([f"{n}-%.dist-info" for n in names]),),
+            )
+        ]
+
+    def get_target_snapshot(self) -> dict[str, str]:
+        cur = self.conn.cursor()
+        cur.row_factory = None
+        return dict(cur.execute("SELECT dist_info, fingerprint FROM target_snapshot"))
+
+    def replace_target_snapshot(self, snapshot: dict[str, str]) -> None:
+        self.conn.execute("DELETE FROM target_snapshot")
+        self.update_target_snapshot(snapshot, [])
+
+    def update_target_snapshot(self, added: dict[str, str], removed: list[str]) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO target_snapshot (dist_info, fingerprint) VALUES (?, ?)",
+            added.items(),
+        )
+        self.conn.executemany(
+            "DELETE FROM target_snapshot WHERE dist_info = ?", [(d,) for d in removed]
+        )
+        self._commit()
+
+    # -- Shadow index (dist-infos on the interpreter's other sys.path roots) --
+
+    def get_shadow_roots(self) -> dict[str, str]:
+        """Return {root: fingerprint} for every indexed root."""
+        rows = self.conn.execute("SELECT root, fingerprint FROM shadow_roots").fetchall()
+        return {r["root"]: r["fingerprint"] for r in rows}
+
+    def replace_shadow_root(
+        self, root: str, fingerprint: str, entries: list[tuple[str, str, str]]
+    ) -> None:
+        """Replace the indexed contents of one root.
+
+        entries: list of (normalized name, display name, version).
+        """
+        self.conn.execute("DELETE FROM shadow_roots WHERE root = ?", (root,))
+        self.conn.execute(
+            "INSERT INTO shadow_roots (root, fingerprint) VALUES (?, ?)",
+            (root, fingerprint),
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO shadow_packages (root, name, display_name, version) "
+            "VALUES (?, ?, ?, ?)",
+            [(root, *e) for e in entries],
+        )
+        self._commit()
+
+    def remove_shadow_roots(self, roots: list[str]) -> None:
+        self.conn.executemany(
+            "DELETE FROM shadow_roots WHERE root = ?", [(r,) for r in roots]
+        )
+        self._commit()
+
+    def get_shadow_packages(self) -> list[sqlite3.Row]:
+        return self.conn.execute(
+            "SELECT * FROM shadow_packages ORDER BY root"
+        ).fetchall()
+
+    # -- Generations (package state recorded with each published target) --
+
+    def _package_state(self) -> tuple[str, str]:
+        """JSON of every package row and every dependency edge (by name)."""
+        packages = self.conn.execute(
+            f"SELECT {_PACKAGE_STATE_COLUMNS} FROM packages ORDER BY name"
+        ).fetchall()
+        edges = self.conn.execute(
+            "SELECT p.name, d.name FROM package_dependencies pd "
+            "JOIN packages p ON p.id = pd.package_id "
+            "JOIN packages d ON d.id = pd.dependency_id ORDER BY p.name, d.name"
+        ).fetchall()
+        return json.dumps([list(r) for r in packages]), json.dumps([list(r) for r in edges])
+
+    def package_state_changed(self, generation_id: int | None) -> bool:
+        """True if packages or dependencies differ from those of a generation."""
+        row = self.conn.execute(
+            "SELECT packages, dependencies FROM generations WHERE id = ?", (generation_id,)
+        ).fetchone()
+        return row is None or (row["packages"], row["dependencies"]) != self._package_state()
+
+    def add_generation(self, generation_id: int, command: str) -> None:
+        """Record the current package state as generation generation_id."""
+        packages, dependencies = self._package_state()
+        self.conn.execute(
+            "INSERT INTO generations (id, created_at, command, packages, dependencies) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (generation_id, _now(), command, packages, dependencies),
+        )
+        self._commit()
+
+    def get_generations(self) -> list[sqlite3.Row]:
+        return self.conn.execute(
+            "SELECT id, created_at, command, json_array_length(packages) AS package_count "
+            "FROM generations ORDER BY id"
+        ).fetchall()
+
+    def get_generation(self, generation_id: int) -> sqlite3.Row | None:
+        return self.conn.execute(
+            "SELECT * FROM generations WHERE id = ?", (generation_id,)
+        ).fetchone()
+
+    def remove_generations(self, generation_ids: list[int]) -> None:
+        self.conn.executemany(
+            "DELETE FROM generations WHERE id = ?", [(i,) for i in generation_ids]
+        )
+        self._commit()
+
+    def restore_generation(self, generation_id: int) -> list[str]:
+        """Make packages and dependencies match a generation exactly.
+
+        Rows for packages whose version is unchanged keep their id, and so
+        their file manifest. Returns the names of packages that are new or
+        changed version; their manifests are cleared for the caller to refill.
+        """
+        gen = self.get_generation(generation_id)
+        # Generations saved before a column existed have shorter rows
+        width = _PACKAGE_STATE_COLUMNS.count(",") + 1
+        packages = [p + [0] * (width - len(p)) for p in json.loads(gen["packages"])]
+        current = {row["name"]: row["version"] for row in self.get_all_packages()}
+
+        self.conn.executemany(
+            f"INSERT INTO packages ({_PACKAGE_STATE_COLUMNS}) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET "
+            "display_name = excluded.display_name, version = excluded.version, "
+            "is_explicit = excluded.is_explicit, is_local = excluded.is_local, "
+            "is_editable = excluded.is_editable, "
+            "source_path = excluded.source_path, install_date = excluded.install_date, "
+            "updated_date = excluded.updated_date",
+            packages,
+        )
+        names = [p[0] for p in packages]
+        self.conn.execute(
+            "DELETE FROM packages WHERE name NOT IN (SELECT value FROM json_each(?))",
+            (json.dumps(names),),
+        )
+        ids = self.get_package_ids(names)
+        edges: dict[int, list[int]] = {pkg_id: [] for pkg_id in ids.values()}
+        for name, dep in json.loads(gen["dependencies"]):
+            edges[ids[name]].append(ids[dep])
+        self.set_dependency_edges(edges)
+
+        changed = [p[0] for p in packages if current.get(p[0]) != p[2]]
+        self.set_package_files({ids[name]: [] for name in changed})
+        self._commit()
+        return changed
+
+    # -- Wheelhouse (wheels kept under the target for offline installs) --
+
+    def add_wheel(
+        self, sha256: str, filename: str, name: str, version: str, tags: str, size: int
+    ) -> bool:
+        """Index a stored wheel. Returns False if its hash or file name is already known."""
+        now = _now()
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO wheels "
+            "(sha256, filename, name, version, tags, size, added_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (sha256, filename, normalize_name(name), version, tags, size, now, now),
+        )
+        self._commit()
+        return cursor.rowcount > 0
+
+    def get_wheels(self) -> list[sqlite3.Row]:
+        return self.conn.execute(
+            "SELECT * FROM wheels ORDER BY name, version"
+        ).fetchall()
+
+    def touch_wheels(self, packages: list[tuple[str, str]]) -> None:
+        """Mark the wheels of (name, version) pairs as just used, for LRU eviction."""
+        self.conn.executemany(
+            "UPDATE wheels SET last_used = ? WHERE name = ? AND version = ?",
+            [(_now(), normalize_name(name), version) for name, version in packages],
+        )
+        self._commit()
+
+    def get_eviction_candidates(self, max_bytes: int) -> list[sqlite3.Row]:
+        """Least recently used wheels to drop so the total fits in max_bytes."""
+        return self.conn.execute(
+            "SELECT sha256, filename, size FROM ("
+            "  SELECT sha256, filename, size, last_used, "
+            "  SUM(size) OVER (ORDER BY last_used DESC, added_at DESC "
+            "                  ROWS UNBOUNDED PRECEDING) AS running "
+            "  FROM wheels"
+            ") WHERE running > ? ORDER BY last_used",
+            (max_bytes,),
+        ).fetchall()
+
+    def remove_wheels(self, sha256s: list[str]) -> None:
+        self.conn.executemany("DELETE FROM wheels WHERE sha256 = ?", [(h,) for h in sha256s])
+        self._commit()
+
+    # -- Local build cache (source-tree fingerprints and the wheels built from them) --
+
+    def get_source_files(self, root: str) -> dict[str, tuple[int, int, str]]:
+        """Return {path: (mtime_ns, size, sha256)} hashed for one source tree."""
+        rows = self.conn.execute(
+            "SELECT path, mtime_ns, size, sha256 FROM source_files WHERE root = ?", (root,)
+        ).fetchall()
+        return {r["path"]: (r["mtime_ns"], r["size"], r["sha256"]) for r in rows}
+
+    def replace_source_files(
+        self, root: str, entries: list[tuple[str, int, int, str]]
+    ) -> None:
+        """Replace one source tree's hashes. entries: [(path, mtime_ns, size, sha256)]."""
+        self.conn.execute("DELETE FROM source_files WHERE root = ?", (root,))
+        self.conn.executemany(
+            "INSERT INTO source_files (root, path, mtime_ns, size, sha256) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(root, *e) for e in entries],
+        )
+        self._commit()
+
+    def get_local_build(self, source_path: str) -> sqlite3.Row | None:
+        return self.conn.execute(
+            "SELECT * FROM local_builds WHERE source_path = ?", (source_path,)
+        ).fetchone()
+
+    def set_local_build(self, source_path: str, fingerprint: str, wheel: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO local_builds (source_path, fingerprint, wheel, built_at) "
+            "VALUES (?, ?, ?, ?)",
+            (source_path, fingerprint, wheel, _now()),
+        )
+        self._commit()
+
+    def is_build_dir_used(self, directory: str) -> bool:
+        """True if a local_builds row's wheel is inside directory (sources can share one)."""
+        return self.conn.execute(
+            "SELECT 1 FROM local_builds WHERE wheel >= ?1 || '/' AND wheel < ?1 || '0' LIMIT 1",
+            (directory,),
+        ).fetchone() is not None
+
+    def get_orphan_closure(self, removed_ids: list[int]) -> list[sqlite3.Row]:
+        """Packages left unreachable once removed_ids are gone, in one query.
+
+        A package is kept if it is explicit, or reachable through dependency
+        edges from a kept explicit package, without passing through a removed
+        one. Everything else except the removed packages themselves is an
+        orphan. Unlike peeling off get_orphaned_dependencies() layer by
+        layer, this also catches dependency cycles.
+        """
+        return self.conn.execute(
+            "WITH RECURSIVE "
+            "removed(id) AS (SELECT value FROM json_each(?)), "
+            "kept(id) AS ("
+            "  SELECT id FROM packages "
+            "  WHERE is_explicit = 1 AND id NOT IN (SELECT id FROM removed) "
+            "  UNION "
+            "  SELECT pd.dependency_id FROM package_dependencies pd "
+            "  JOIN kept k ON pd.package_id = k.id "
+            "  WHERE pd.dependency_id NOT IN (SELECT id FROM removed)"
+            ") "
+            "SELECT p.* FROM packages p "
+            "WHERE p.id NOT IN (SELECT id FROM kept) "
+            "AND p.id NOT IN (SELECT id FROM removed) "
+            "ORDER BY p.name",
+            (json.dumps(removed_ids),),
+        ).fetchall()
+
 
 def find_db() -> Path | None:
     """Try to find an existing py-trkpac database.
@@ -224,15 +1039,19 @@ def find_db() -> Path | None:
     return None
 
 
-def open_db(db_path: Path | None = None) -> Database:
-    """Open the database. If no path given, try to find it."""
+def open_db(db_path: Path | None = None, read_only: bool = False) -> Database:
+    """Open the database. If no path given, try to find it.
+
+    read_only is for commands that only look things up (list, list-deps,
+    tree, why, rdeps, owns): they never write, so they never wait on a writer.
+    """
     if db_path is None:
         db_path = find_db()
     if db_path is None:
         raise FileNotFoundError(
             "No py-trkpac database found. Run 'py-trkpac init' first."
         )
-    db = Database(db_path)
+    db = Database(db_path, read_only=read_only)
     return db
 
 
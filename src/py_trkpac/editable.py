@@ -0,0 +1,213 @@
+"""Editable installs: a local project's packages symlinked into the target, not copied."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tomllib
+from pathlib import Path
+
+from py_trkpac.wheel import INSTALLER_NAME, console_scripts, record_hash, write_atomic, write_record
+
+# Directories of a flat-layout project that are never its import packages
+_NOT_PACKAGES = {
+    "test", "tests", "doc", "docs", "example", "examples", "benchmarks", "scripts",
+    "build", "dist", "tools",
+}
+
+
+class EditableError(Exception):
+    """A project can't be installed in editable mode."""
+
+
+class EditableProject:
+    """What an editable install needs from pyproject.toml.
+
+    top_level maps each entry to create in the target ("pkg" or
+    "module.py") to the source path it links to.
+    """
+
+    __slots__ = (
+        "name", "version", "source_path", "requires_python", "requires_dist",
+        "entry_points", "top_level",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        source_path: Path,
+        requires_python: str | None,
+        requires_dist: list[str],
+        entry_points: str,
+        top_level: dict[str, Path],
+    ) -> None:
+        self.name = name
+        self.version = version
+        self.source_path = source_path
+        self.requires_python = requires_python
+        self.requires_dist = requires_dist
+        self.entry_points = entry_points
+        self.top_level = top_level
+
+
+def _find_top_level(source_path: Path, name: str, tool: dict) -> dict[str, Path]:
+    """Top-level import packages and modules of a project.
+
+    Explicit configuration wins (hatch's wheel packages, setuptools'
+    packages / py-modules / package-dir); otherwise packages (directories
+    with __init__.py) are discovered in src/ or, for a flat layout, the
+    project root, plus a module named after the project.
+    """
+    hatch = tool.get("hatch", {}).get("build", {}).get("targets", {}).get("wheel", {})
+    if hatch.get("packages"):
+        return {Path(p).name: source_path / p for p in hatch["packages"]}
+
+    setuptools = tool.get("setuptools", {})
+    package_dir = setuptools.get("package-dir", {}).get("")
+    packages = setuptools.get("packages")
+    if package_dir is not None:
+        base = source_path / package_dir
+    else:
+        base = source_path / "src" if (source_path / "src").is_dir() else source_path
+    if isinstance(packages, list) or setuptools.get("py-modules"):
+        top = {p: base / p for p in (packages or []) if "." not in p}
+        top.update({f"{m}.py": base / f"{m}.py" for m in setuptools.get("py-modules", [])})
+        return top
+
+    top = {}
+    for entry in sorted(base.iterdir()):
+        if (
+            entry.is_dir() and entry.name.isidentifier()
+            and (entry / "__init__.py").is_file()
+            and (base != source_path or entry.name not in _NOT_PACKAGES)
+        ):
+            top[entry.name] = entry
+    module = base / f"{re.sub(r'[-.]+', '_', name)}.py"
+    if not top and module.is_file():
+        top[module.name] = module
+    return top
+
+
+def read_project(source_path: Path) -> EditableProject:
+    """Read a project's [project] table and find its import packages. Raises EditableError."""
+    try:
+        with open(source_path / "pyproject.toml", "rb") as f:
+            data = tomllib.load(f)
+    except FileNotFoundError:
+        raise EditableError(f"{source_path} has no pyproject.toml") from None
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise EditableError(f"Could not read {source_path}/pyproject.toml: {e}") from e
+    project = data.get("project", {})
+    name = project.get("name")
+    if not name:
+        raise EditableError(f"{source_path}/pyproject.toml has no [project] name")
+    if "version" in project.get("dynamic", []):
+        raise EditableError(
+            f"{name} has a dynamic version; editable installs need a static [project] version"
+        )
+
+    requires_dist = list(project.get("dependencies", []))
+    for extra, reqs in project.get("optional-dependencies", {}).items():
+        for req in reqs:
+            spec, _, marker = req.partition(";")
+            condition = f"extra == '{extra}'"
+            if marker.strip():
+                condition = f"({marker.strip()}) and {condition}"
+            requires_dist.append(f"{spec.strip()}; {condition}")
+
+    groups = {
+        "console_scripts": project.get("scripts", {}),
+        "gui_scripts": project.get("gui-scripts", {}),
+        **project.get("entry-points", {}),
+    }
+    entry_points = "".join(
+        f"[{group}]\n" + "".join(f"{key} = {value}\n" for key, value in entries.items()) + "\n"
+        for group, entries in groups.items() if entries
+    )
+
+    top_level = _find_top_level(source_path, name, data.get("tool", {}))
+    missing = [str(p) for p in top_level.values() if not p.exists()]
+    if missing:
+        raise EditableError(f"{name}: {', '.join(missing)} not found")
+    if not top_level:
+        raise EditableError(
+            f"Could not find the import packages of {name} in {source_path}; "
+            f"list them in [tool.setuptools] packages"
+        )
+    return EditableProject(
+        name, project.get("version", "0.0.0"), source_path, project.get("requires-python"),
+        requires_dist, entry_points, top_level,
+    )
+
+
+def dist_info_name(project: EditableProject) -> str:
+    return f"{re.sub(r'[-_.]+', '_', project.name)}-{project.version}.dist-info"
+
+
+def _metadata(project: EditableProject) -> str:
+    lines = ["Metadata-Version: 2.1", f"Name: {project.name}", f"Version: {project.version}"]
+    if project.requires_python:
+        lines.append(f"Requires-Python: {project.requires_python}")
+    extras = sorted({m.group(1) for r in project.requires_dist
+                     if (m := re.search(r"extra == '([^']+)'", r))})
+    lines += [f"Provides-Extra: {e}" for e in extras]
+    lines += [f"Requires-Dist: {r}" for r in project.requires_dist]
+    return "\n".join(lines) + "\n"
+
+
+def install_editable(target_path: Path, project: EditableProject) -> dict:
+    """Link a project's packages into target and write its dist-info and scripts.
+
+    Each top-level package or module becomes a symlink to the source, so
+    edits apply without reinstalling. (A .pth file would not work: the
+    target is on PYTHONPATH, and only site directories process .pth files.)
+    The dist-info carries direct_url.json marking the install editable, as
+    pip's does. Returns the metadata dict for record_installed, with
+    meta["record"] set. Raises WheelError (bad entry points) or OSError.
+    """
+    entries: list[tuple[str, str | None, int | None]] = []
+    for top, source in project.top_level.items():
+        link = target_path / top
+        tmp = link.with_name(f".{link.name}.py-trkpac-link")
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        os.symlink(source, tmp, target_is_directory=source.is_dir())
+        os.replace(tmp, link)
+        entries.append((top, None, None))
+
+    for dest, data in console_scripts(project.entry_points, project.name).items():
+        (target_path / "bin").mkdir(exist_ok=True)
+        write_atomic(target_path / dest, data, 0o755)
+        entries.append((dest, record_hash(hashlib.sha256(data).digest()), len(data)))
+
+    dist_info = dist_info_name(project)
+    files = {
+        "METADATA": _metadata(project).encode("utf-8"),
+        "INSTALLER": f"{INSTALLER_NAME}\n".encode(),
+        "REQUESTED": b"",
+        "direct_url.json": json.dumps({
+            "url": project.source_path.as_uri(), "dir_info": {"editable": True},
+        }).encode(),
+    }
+    if project.entry_points:
+        files["entry_points.txt"] = project.entry_points.encode("utf-8")
+    (target_path / dist_info).mkdir(exist_ok=True)
+    for name, data in files.items():
+        write_atomic(target_path / dist_info / name, data, 0o644)
+        entries.append((f"{dist_info}/{name}", record_hash(hashlib.sha256(data).digest()), len(data)))
+    entries.append((f"{dist_info}/RECORD", None, None))
+    write_record(target_path / dist_info, entries)
+
+    return {
+        "name": project.name,
+        "version": project.version,
+        "requires_dist": project.requires_dist,
+        "requested": True,
+        "source_path": str(project.source_path),
+        "dist_info": dist_info,
+        "record": entries,
+        "editable": True,
+    }
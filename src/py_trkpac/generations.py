@@ -0,0 +1,263 @@
+"""Generations: immutable hardlink/reflink clones of the target behind a `current` symlink."""
+
+from __future__ import annotations
+
+import errno
+import fcntl
+import os
+import shutil
+import time
+from pathlib import Path
+
+from py_trkpac.db import OPTIONAL_CONFIG, Database
+from py_trkpac.removal import spawn_purge, trash_path
+from py_trkpac.utils import error, info
+
+GENERATIONS_DIRNAME = ".generations"
+CURRENT_LINK = "current"
+
+# linux/fs.h: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+
+def generations_root(target_path: Path) -> Path:
+    return target_path / GENERATIONS_DIRNAME
+
+
+def current_path(target_path: Path) -> Path:
+    """The symlink PYTHONPATH and PATH point at while generations are on."""
+    return generations_root(target_path) / CURRENT_LINK
+
+
+def enabled(db: Database) -> bool:
+    return db.get_config("generations") == "on"
+
+
+def current_generation(target_path: Path) -> int | None:
+    try:
+        return int(os.readlink(current_path(target_path)))
+    except (OSError, ValueError):
+        return None
+
+
+# -- Cloning --
+
+def _reflink(src: str, dst: str) -> None:
+    """Copy-on-write clone of one file (FICLONE); raises OSError if unsupported."""
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        except OSError:
+            os.unlink(dst)
+            raise
+    shutil.copymode(src, dst)
+
+
+def clone_tree(src: Path, dst: Path, method: str = "auto") -> int:
+    """Recreate src's tree at dst, sharing file data. Returns files cloned.
+
+    Top-level dot entries (database, lock, trash, staging, generations) are
+    skipped. method "reflink" gives every file its own copy-on-write inode,
+    "hardlink" shares inodes, and "auto" reflinks until the filesystem
+    refuses, then hardlinks the rest. Directories are created and symlinks
+    recreated; nothing is followed.
+    """
+    use_reflink = method in ("auto", "reflink")
+    count = 0
+    dst.mkdir()
+    stack = [(str(src), str(dst), True)]
+    while stack:
+        s_dir, d_dir, top = stack.pop()
+        with os.scandir(s_dir) as it:
+            for entry in it:
+                if top and entry.name.startswith("."):
+                    continue
+                d_path = os.path.join(d_dir, entry.name)
+                if entry.is_symlink():
+                    os.symlink(os.readlink(entry.path), d_path)
+                elif entry.is_dir():
+                    os.mkdir(d_path)
+                    stack.append((entry.path, d_path, False))
+                else:
+                    if use_reflink:
+                        try:
+                            _reflink(entry.path, d_path)
+                            count += 1
+                            continue
+                        except OSError as e:
+                            if method == "reflink" or e.errno not in (
+                                errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY,
+                            ):
+                                raise
+                            use_reflink = False
+                    os.link(entry.path, d_path)
+                    count += 1
+    return count
+
+
+def _switch_current(target_path: Path, generation: int) -> None:
+    """Point `current` at a generation with one atomic rename of a new symlink."""
+    root = generations_root(target_path)
+    tmp = root / f".{CURRENT_LINK}-{os.getpid()}"
+    if os.path.lexists(tmp):
+        os.unlink(tmp)
+    os.symlink(str(generation), tmp)
+    os.replace(tmp, root / CURRENT_LINK)
+
+
+def _to_trash(target_path: Path, path: Path) -> None:
+    batch = trash_path(target_path) / f"{time.time_ns()}-{os.getpid()}-{path.name}"
+    batch.parent.mkdir(exist_ok=True)
+    os.rename(path, batch)
+
+
+# -- Operations (call with the exclusive target lock held) --
+
+def publish(db: Database, target_path: Path, command: str, force: bool = False) -> int | None:
+    """Clone the target into a new generation and make it current.
+
+    Does nothing when generations are off, or (unless force) when packages
+    and dependencies are unchanged since the current generation. Returns
+    the new generation number.
+    """
+    if not enabled(db):
+        return None
+    if not force and not db.package_state_changed(current_generation(target_path)):
+        return None
+    root = generations_root(target_path)
+    root.mkdir(exist_ok=True)
+    generations = db.get_generations()
+    number = generations[-1]["id"] + 1 if generations else 1
+    gen_path = root / str(number)
+    if os.path.lexists(gen_path):
+        _to_trash(target_path, gen_path)  # left by an interrupted publish
+
+    method = db.get_config("clone_method") or OPTIONAL_CONFIG["clone_method"]
+    try:
+        files = clone_tree(target_path, gen_path, method)
+        with db.transaction():
+            db.add_generation(number, command)
+            db.set_state("generation_workdir", str(number))
+        _switch_current(target_path, number)
+    except BaseException:
+        if os.path.lexists(gen_path):
+            _to_trash(target_path, gen_path)
+        raise
+    info(f"Generation {number} is now current ({files} files linked).")
+    return number
+
+
+def sync_workdir(db: Database, target_path: Path) -> bool:
+    """Make the target match the current generation again after a rollback.
+
+    Operations modify the target, which is then published; after a
+    rollback the target still holds the newer state. Its entries are moved
+    to the trash and the current generation is cloned back. Returns True if
+    a resync was needed.
+    """
+    current = current_generation(target_path)
+    if not enabled(db) or current is None or db.get_state("generation_workdir") == str(current):
+        return False
+    info(f"Restoring the target from generation {current}...")
+    batch = trash_path(target_path) / f"{time.time_ns()}-{os.getpid()}-workdir"
+    batch.mkdir(parents=True)
+    with os.scandir(target_path) as it:
+        for entry in it:
+            if not entry.name.startswith("."):
+                os.rename(entry.path, batch / entry.name)
+    method = db.get_config("clone_method") or OPTIONAL_CONFIG["clone_method"]
+    staging = target_path / f".py-trkpac-workdir-{os.getpid()}"
+    clone_tree(generations_root(target_path) / str(current), staging, method)
+    with os.scandir(staging) as it:
+        for entry in it:
+            os.rename(entry.path, target_path / entry.name)
+    staging.rmdir()
+    db.set_state("generation_workdir", str(current))
+    # Index and snapshot describe the replaced tree
+    db.set_state("dist_info_index", "")
+    db.set_state("target_snapshot", "")
+    spawn_purge(db, target_path)
+    return True
+
+
+def rollback(db: Database, target_path: Path, generation: int | None = None) -> bool:
+    """Make an earlier generation current and restore its package state in the DB.
+
+    Only the symlink and DB rows change, so this takes milliseconds. The
+    target itself is restored lazily, by sync_workdir before the next
+    operation. Manifests are refilled from RECORD for packages whose
+    version differs between the two generations.
+    """
+    from py_trkpac.installer import parse_record_entries, scan_dist_infos
+    from py_trkpac.utils import normalize_name
+
+    if not enabled(db):
+        error("Generations are off. Enable them with 'py-trkpac generations enable'.")
+        return False
+    current = current_generation(target_path)
+    available = [g["id"] for g in db.get_generations()
+                 if (generations_root(target_path) / str(g["id"])).is_dir()]
+    if generation is None:
+        earlier = [g for g in available if current is None or g < current]
+        if not earlier:
+            error("There is no earlier generation to roll back to.")
+            return False
+        generation = earlier[-1]
+    if generation not in available:
+        error(f"Generation {generation} does not exist.")
+        return False
+    if generation == current:
+        info(f"Generation {generation} is already current.")
+        return True
+
+    gen_path = generations_root(target_path) / str(generation)
+    before = {p["name"]: p["version"] for p in db.get_all_packages()}
+    with db.transaction():
+        changed = db.restore_generation(generation)
+        if changed:
+            dist_infos = scan_dist_infos(gen_path)
+            ids = db.get_package_ids(changed)
+            db.set_package_files({
+                ids[name]: parse_record_entries(gen_path / dist_infos[normalize_name(name)])
+                for name in changed
+                if normalize_name(name) in dist_infos
+            })
+        _switch_current(target_path, generation)
+    after = {p["name"]: p["version"] for p in db.get_all_packages()}
+    differing = {n for n in before.keys() | after.keys() if before.get(n) != after.get(n)}
+    info(f"Rolled back from generation {current} to {generation}"
+         f" ({len(differing)} package(s) differ).")
+    return True
+
+
+def prune(db: Database, target_path: Path, keep: int) -> int:
+    """Delete all but the newest `keep` generations (never the current one)."""
+    current = current_generation(target_path)
+    ids = [g["id"] for g in db.get_generations()]
+    doomed = [i for i in ids[: max(0, len(ids) - keep)] if i != current]
+    for i in doomed:
+        gen_path = generations_root(target_path) / str(i)
+        if os.path.lexists(gen_path):
+            _to_trash(target_path, gen_path)
+    db.remove_generations(doomed)
+    spawn_purge(db, target_path)
+    return len(doomed)
+
+
+def enable(db: Database, target_path: Path) -> Path:
+    """Turn generations on, publishing the target as the first one. Returns `current`."""
+    db.set_config("generations", "on")
+    publish(db, target_path, "generations enable", force=True)
+    return current_path(target_path)
+
+
+def disable(db: Database, target_path: Path) -> None:
+    """Turn generations off: the target becomes live again and all generations go."""
+    sync_workdir(db, target_path)
+    db.set_config("generations", "off")
+    root = generations_root(target_path)
+    if root.exists():
+        _to_trash(target_path, root)
+    db.remove_generations([g["id"] for g in db.get_generations()])
+    db.set_state("generation_workdir", "")
+    spawn_purge(db, target_path)
@@ -0,0 +1,152 @@
+"""In-memory dependency graph for transitive queries (tree, why, rdeps)."""
+
+from __future__ import annotations
+
+from array import array
+from collections import deque
+
+from py_trkpac.db import Database
+from py_trkpac.utils import normalize_name
+
+
+class Node:
+    """One package in the graph. Lighter than a sqlite3.Row."""
+
+    __slots__ = (
+        "id", "name", "display_name", "version", "is_explicit", "is_local", "source_path",
+        "is_editable",
+    )
+
+    def __init__(
+        self, id: int, name: str, display_name: str, version: str,
+        is_explicit: int, is_local: int, source_path: str | None, is_editable: int = 0,
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.display_name = display_name
+        self.version = version
+        self.is_explicit = bool(is_explicit)
+        self.is_local = bool(is_local)
+        self.source_path = source_path
+        self.is_editable = bool(is_editable)
+
+    def label(self) -> str:
+        return f"{self.display_name}=={self.version}"
+
+
+def _csr(n: int, edges: list[tuple[int, int]]) -> tuple[array, array]:
+    """Build compressed adjacency arrays: targets of i are adj[off[i]:off[i+1]]."""
+    off = array("l", [0]) * (n + 1)
+    for src, _ in edges:
+        off[src + 1] += 1
+    for i in range(n):
+        off[i + 1] += off[i]
+    adj = array("l", [0]) * len(edges)
+    fill = array("l", off[:n])
+    for src, dst in edges:
+        adj[fill[src]] = dst
+        fill[src] += 1
+    return off, adj
+
+
+class DependencyGraph:
+    """Dependency graph loaded once from the DB.
+
+    Packages get dense integer indices (0..n-1); forward (depends on) and
+    reverse (required by) edges are stored as array-backed adjacency lists,
+    so traversals touch only ints until results are labelled.
+    """
+
+    __slots__ = ("nodes", "_by_name", "_fwd_off", "_fwd", "_rev_off", "_rev")
+
+    def __init__(self, nodes: list[Node], edges: list[tuple[int, int]]) -> None:
+        self.nodes = nodes
+        self._by_name = {node.name: i for i, node in enumerate(nodes)}
+        self._fwd_off, self._fwd = _csr(len(nodes), edges)
+        self._rev_off, self._rev = _csr(len(nodes), [(d, s) for s, d in edges])
+
+    @classmethod
+    def load(cls, db: Database) -> DependencyGraph:
+        nodes = [Node(*row) for row in db.iter_package_nodes()]
+        index = {node.id: i for i, node in enumerate(nodes)}
+        edges = [
+            (index[src], index[dst])
+            for src, dst in db.iter_dependency_edges()
+            if src in index and dst in index
+        ]
+        return cls(nodes, edges)
+
+    def find(self, name: str) -> int | None:
+        """Return the node index for a package name, or None."""
+        return self._by_name.get(normalize_name(name))
+
+    def dependencies(self, i: int) -> list[int]:
+        return sorted(self._fwd[self._fwd_off[i] : self._fwd_off[i + 1]], key=self._sort_key)
+
+    def dependents(self, i: int) -> list[int]:
+        return sorted(self._rev[self._rev_off[i] : self._rev_off[i + 1]], key=self._sort_key)
+
+    def _sort_key(self, i: int) -> str:
+        return self.nodes[i].name
+
+    def closure(self, i: int, reverse: bool = False) -> list[int]:
+        """All nodes reachable from i (excluding i), in BFS order."""
+        off, adj = (self._rev_off, self._rev) if reverse else (self._fwd_off, self._fwd)
+        seen = bytearray(len(self.nodes))
+        seen[i] = 1
+        order = []
+        queue = deque([i])
+        while queue:
+            cur = queue.popleft()
+            for nxt in adj[off[cur] : off[cur + 1]]:
+                if not seen[nxt]:
+                    seen[nxt] = 1
+                    order.append(nxt)
+                    queue.append(nxt)
+        return order
+
+    def tree(self, i: int) -> list[tuple[int, int, bool]]:
+        """Depth-first dependency tree as (depth, node, repeated) rows.
+
+        A node already expanded elsewhere in the tree is emitted once more
+        with repeated=True and not expanded again, which keeps output linear
+        in the size of the graph.
+        """
+        rows = []
+        expanded = bytearray(len(self.nodes))
+        stack = [(i, 0)]
+        while stack:
+            cur, depth = stack.pop()
+            if expanded[cur]:
+                rows.append((depth, cur, True))
+                continue
+            expanded[cur] = 1
+            rows.append((depth, cur, False))
+            for dep in reversed(self.dependencies(cur)):
+                stack.append((dep, depth + 1))
+        return rows
+
+    def why(self, i: int) -> list[list[int]]:
+        """Shortest path from each explicit package that pulls in node i.
+
+        Runs one BFS backwards over reverse edges; every explicit node it
+        reaches yields a path [root, ..., i]. An explicit i yields [i].
+        """
+        parent = array("l", [-1]) * len(self.nodes)
+        seen = bytearray(len(self.nodes))
+        seen[i] = 1
+        paths = []
+        queue = deque([i])
+        while queue:
+            cur = queue.popleft()
+            if self.nodes[cur].is_explicit:
+                path = [cur]
+                while path[-1] != i:
+                    path.append(parent[path[-1]])
+                paths.append(path)
+            for nxt in self._rev[self._rev_off[cur] : self._rev_off[cur + 1]]:
+                if not seen[nxt]:
+                    seen[nxt] = 1
+                    parent[nxt] = cur
+                    queue.append(nxt)
+        return paths
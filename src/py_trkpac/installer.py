@@ -1,54 +1,199 @@
-"""pip subprocess wrapper, .dist-info snapshot/diff, METADATA and RECORD parsing."""
+"""Install orchestration, .dist-info snapshot/diff, METADATA and RECORD parsing."""
 
 from __future__ import annotations
 
+import csv
+import os
+import posixpath
 import re
-import subprocess
+import site
+import sqlite3
 import sys
 import tomllib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from py_trkpac import wheelhouse
+from py_trkpac.backends import Backend, InProcessBackend, get_backend
+from py_trkpac.buildcache import build_local_wheels
 from py_trkpac.db import Database
+from py_trkpac.editable import EditableError, install_editable, read_project
+from py_trkpac.metadata import (
+    cache_known_metadata, get_metadata, get_metadata_batch, parse_metadata,
+)
+from py_trkpac.removal import remove_manifests, spawn_purge
+from py_trkpac.staging import commit_staging, create_staging, discard_staging
+from py_trkpac.store import open_store, release_files, store_installed
 from py_trkpac.utils import normalize_name, info, error
+from py_trkpac.versions import (
+    InvalidMarker, compare_versions, evaluate_marker, parse_requirement,
+)
+from py_trkpac.watch import InstallWatcher
+from py_trkpac.wheel import WheelError, parse_wheel_filename
 
 
 SYSTEM_DIST_PACKAGES = Path("/usr/lib/python3/dist-packages")
 
 
-def check_system_package(name: str) -> tuple[str, str] | None:
-    """Check if a package is installed in system dist-packages.
+# -- Packages shadowed from other sys.path roots --
 
-    Returns (name, version) if found, None otherwise.
+def shadow_roots(target_path: Path) -> list[Path]:
+    """Return the interpreter's other package roots that target could shadow.
+
+    Covers the system dist-packages, site-packages/dist-packages entries on
+    sys.path (e.g. /usr/local) and the user site directory. The target
+    itself is excluded.
     """
-    norm = normalize_name(name)
-    if not SYSTEM_DIST_PACKAGES.is_dir():
-        return None
-    for child in SYSTEM_DIST_PACKAGES.iterdir():
-        if not (child.is_dir() and child.name.endswith(".dist-info")):
+    candidates = [SYSTEM_DIST_PACKAGES, *site.getsitepackages()]
+    if site.ENABLE_USER_SITE:
+        candidates.append(site.getusersitepackages())
+    candidates += [
+        p for p in sys.path if Path(p).name in ("site-packages", "dist-packages")
+    ]
+
+    target = target_path.resolve()
+    roots: list[Path] = []
+    seen: set[Path] = set()
+    for candidate in candidates:
+        path = Path(candidate).resolve()
+        if path in seen or path == target or not path.is_dir():
             continue
-        dir_name = child.name[: -len(".dist-info")]
-        parts = dir_name.rsplit("-", 1)
-        if len(parts) == 2 and normalize_name(parts[0]) == norm:
-            return (parts[0], parts[1])
-    return None
+        seen.add(path)
+        roots.append(path)
+    return roots
+
+
+def _split_installed_name(entry_name: str) -> tuple[str, str] | None:
+    """Split a .dist-info or .egg-info entry name into (name, version)."""
+    if entry_name.endswith(".egg-info"):
+        # e.g. "PyYAML-5.3.1.egg-info" or "foo-1.0-py3.8.egg-info"
+        parts = entry_name[: -len(".egg-info")].split("-")
+        if len(parts) < 2:
+            return None
+        return (parts[0], parts[1])
+    return split_dist_info_name(entry_name)
+
+
+def _scan_shadow_root(root: Path) -> list[tuple[str, str, str]]:
+    """Single scandir pass over a root: [(normalized name, name, version)]."""
+    entries = []
+    try:
+        it = os.scandir(root)
+    except OSError:
+        return entries
+    with it:
+        for entry in it:
+            split = _split_installed_name(entry.name)
+            if split:
+                entries.append((normalize_name(split[0]), split[0], split[1]))
+    return entries
+
+
+def load_shadow_index(
+    db: Database, target_path: Path
+) -> dict[str, tuple[str, str, str]]:
+    """Return {normalized name: (name, version, root)} for packages on other roots.
+
+    Each root is rescanned only when its mtime fingerprint has changed since
+    the last scan; otherwise the persisted rows are reused. Earlier roots
+    (in sys.path priority order) win when a name appears on several.
+    """
+    roots = shadow_roots(target_path)
+    known = db.get_shadow_roots()
+    for root in roots:
+        fingerprint = _dir_fingerprint(root)
+        if fingerprint is not None and known.get(str(root)) != fingerprint:
+            db.replace_shadow_root(str(root), fingerprint, _scan_shadow_root(root))
+    stale = set(known) - {str(r) for r in roots}
+    if stale:
+        db.remove_shadow_roots(list(stale))
+
+    order = {str(r): i for i, r in enumerate(roots)}
+    result: dict[str, tuple[str, str, str]] = {}
+    rows = sorted(db.get_shadow_packages(), key=lambda r: order.get(r["root"], len(order)))
+    for row in rows:
+        if row["name"] not in result:
+            result[row["name"]] = (row["display_name"], row["version"], row["root"])
+    return result
+
+
+def check_system_package(
+    name: str, shadows: dict[str, tuple[str, str, str]]
+) -> tuple[str, str, str] | None:
+    """Check if a package is installed on another sys.path root.
+
+    shadows is the index from load_shadow_index, loaded once per operation.
+    Returns (name, version, root) if found, None otherwise.
+    """
+    return shadows.get(normalize_name(name))
 
 
 # -- .dist-info snapshot and diffing --
 
+def _entry_fingerprint(entry: os.DirEntry | Path) -> str:
+    """inode:mtime_ns:size of a dist-info dir; pip replaces the dir on reinstall."""
+    st = entry.stat(follow_symlinks=False)
+    return f"{st.st_ino}:{st.st_mtime_ns}:{st.st_size}"
+
+
 def snapshot_dist_infos(target_path: Path) -> dict[str, str]:
-    """Return a dict of {dist-info dir name: modification time as string} for all .dist-info in target."""
+    """Return {dist-info dir name: fingerprint} for all .dist-info in target.
+
+    One scandir pass with one stat per dist-info.
+    """
     result = {}
-    if not target_path.is_dir():
+    try:
+        entries = os.scandir(target_path)
+    except OSError:
         return result
-    for child in target_path.iterdir():
-        if child.is_dir() and child.name.endswith(".dist-info"):
-            # Use METADATA mtime as a fingerprint for changes
-            meta = child / "METADATA"
-            mtime = str(meta.stat().st_mtime) if meta.exists() else "0"
-            result[child.name] = mtime
+    with entries:
+        for entry in entries:
+            if entry.name.endswith(".dist-info") and entry.is_dir(follow_symlinks=False):
+                result[entry.name] = _entry_fingerprint(entry)
     return result
 
 
+def load_snapshot(db: Database, target_path: Path) -> dict[str, str]:
+    """Return the target's dist-info snapshot, reusing the persisted one if possible.
+
+    The snapshot saved after the last operation is still valid when the
+    target directory's mtime hasn't changed since; otherwise (drift) the
+    target is rescanned and the new snapshot saved.
+    """
+    fingerprint = _dir_fingerprint(target_path)
+    if fingerprint is not None and db.get_state("target_snapshot") == fingerprint:
+        return db.get_target_snapshot()
+    snapshot = snapshot_dist_infos(target_path)
+    save_snapshot(db, target_path, snapshot)
+    return snapshot
+
+
+def save_snapshot(db: Database, target_path: Path, snapshot: dict[str, str]) -> None:
+    """Persist a full post-operation snapshot, stamped with the target's mtime."""
+    with db.transaction():
+        db.replace_target_snapshot(snapshot)
+        db.set_state("target_snapshot", _dir_fingerprint(target_path) or "")
+
+
+def update_snapshot(
+    db: Database, target_path: Path, added: list[str], removed: list[str]
+) -> None:
+    """Apply a known change to the persisted snapshot and re-stamp it.
+
+    Only the added dist-infos are stat'ed. Like update_dist_info_index, this
+    assumes the snapshot was valid (load_snapshot) before the operation.
+    """
+    fingerprints = {}
+    for name in added:
+        try:
+            fingerprints[name] = _entry_fingerprint(target_path / name)
+        except OSError:
+            removed = [*removed, name]
+    with db.transaction():
+        db.update_target_snapshot(fingerprints, removed)
+        db.set_state("target_snapshot", _dir_fingerprint(target_path) or "")
+
+
 def diff_dist_infos(
     before: dict[str, str], after: dict[str, str]
 ) -> list[str]:
@@ -62,26 +207,6 @@ def diff_dist_infos(
 
 # -- METADATA parsing --
 
-def parse_metadata(dist_info_path: Path) -> dict:
-    """Parse a METADATA file and return {name, version, requires_dist}."""
-    meta_file = dist_info_path / "METADATA"
-    result = {"name": None, "version": None, "requires_dist": []}
-    if not meta_file.exists():
-        return result
-
-    for line in meta_file.read_text(errors="replace").splitlines():
-        if line.startswith("Name: "):
-            result["name"] = line[6:].strip()
-        elif line.startswith("Version: "):
-            result["version"] = line[9:].strip()
-        elif line.startswith("Requires-Dist: "):
-            result["requires_dist"].append(line[15:].strip())
-        elif line == "":
-            # End of headers
-            break
-    return result
-
-
 def parse_dependency_name(requires_dist_entry: str) -> str | None:
     """Extract just the package name from a Requires-Dist entry.
 
@@ -156,95 +281,318 @@ def resolve_local_packages(packages: list[str]) -> tuple[list[str], dict[str, st
 
 # -- RECORD parsing for removal --
 
-def parse_record(dist_info_path: Path) -> list[str]:
-    """Parse RECORD file to get list of installed file paths (relative to target)."""
+def _record_path(path: str) -> str | None:
+    """Normalize a RECORD path to be relative to the target directory.
+
+    pip --target writes scripts and data files relative to its temporary
+    lib dir ("../../bin/foo"), then moves them to the top of the target.
+    Anything else that escapes the target is dropped.
+    """
+    path = posixpath.normpath(path)
+    if path.startswith("../../"):
+        path = path[len("../../"):]
+    if path.startswith(("../", "/")) or path in ("..", "."):
+        return None
+    return path
+
+
+def parse_record_entries(dist_info_path: Path) -> list[tuple[str, str | None, int | None]]:
+    """Parse RECORD into [(path relative to target, hash, size)].
+
+    RECORD is CSV, so paths containing commas are quoted; the csv module
+    handles that. Empty hash/size fields (RECORD itself, .pyc files) are None.
+    """
     record_file = dist_info_path / "RECORD"
-    if not record_file.exists():
+    try:
+        with open(record_file, newline="", encoding="utf-8", errors="replace") as f:
+            rows = list(csv.reader(f))
+    except OSError:
         return []
 
-    files = []
-    for line in record_file.read_text(errors="replace").splitlines():
-        line = line.strip()
-        if not line:
+    entries = []
+    for row in rows:
+        if not row or not row[0]:
             continue
-        # RECORD format: filepath,hash,size
-        parts = line.split(",")
-        if parts:
-            filepath = parts[0]
-            if filepath:
-                files.append(filepath)
-    return files
-
-
-def remove_package_files(target_path: Path, dist_info_name: str) -> int:
-    """Remove all files for a package using its RECORD. Returns count of files removed."""
-    dist_info_path = target_path / dist_info_name
-    files = parse_record(dist_info_path)
-
-    removed = 0
-    dirs_to_check = set()
-
-    for rel_path in files:
-        full_path = target_path / rel_path
-        if full_path.is_file():
-            full_path.unlink()
-            removed += 1
-            dirs_to_check.add(full_path.parent)
-
-    # Remove the .dist-info directory itself
-    if dist_info_path.is_dir():
-        import shutil
-        shutil.rmtree(dist_info_path)
-        removed += 1
-
-    # Prune empty parent directories (but never remove target_path itself)
-    for d in sorted(dirs_to_check, key=lambda p: len(p.parts), reverse=True):
-        try:
-            if d != target_path and d.is_dir() and not any(d.iterdir()):
-                d.rmdir()
-        except OSError:
-            pass
+        path = _record_path(row[0])
+        if path is None:
+            continue
+        file_hash = row[1] if len(row) > 1 and row[1] else None
+        size = int(row[2]) if len(row) > 2 and row[2].isdigit() else None
+        entries.append((path, file_hash, size))
+    return entries
 
-    return removed
+
+def parse_record(dist_info_path: Path) -> list[str]:
+    """Parse RECORD file to get list of installed file paths (relative to target)."""
+    return [path for path, _, _ in parse_record_entries(dist_info_path)]
 
 
 # -- Find .dist-info for a package name --
 
-def find_dist_info(target_path: Path, package_name: str) -> Path | None:
-    """Find the .dist-info directory for a given package name."""
+def split_dist_info_name(dir_name: str) -> tuple[str, str] | None:
+    """Split "numpy-2.4.0.dist-info" into ("numpy", "2.4.0"). None if not a dist-info."""
+    if not dir_name.endswith(".dist-info"):
+        return None
+    # Split on last hyphen to separate name from version
+    parts = dir_name[: -len(".dist-info")].rsplit("-", 1)
+    if len(parts) != 2:
+        return None
+    return (parts[0], parts[1])
+
+
+def scan_dist_infos(target_path: Path) -> dict[str, str]:
+    """Scan target once and return {normalized name: dist-info dir name}.
+
+    If stale dist-infos for the same name exist (pip --target leaves the old
+    version's directory behind on upgrade), the most recently modified wins.
+    """
+    result: dict[str, str] = {}
+    mtimes: dict[str, int] = {}
+    try:
+        entries = os.scandir(target_path)
+    except OSError:
+        return result
+    with entries:
+        for entry in entries:
+            split = split_dist_info_name(entry.name)
+            if split is None or not entry.is_dir():
+                continue
+            norm = normalize_name(split[0])
+            mtime = entry.stat().st_mtime_ns
+            if norm not in result or mtime > mtimes[norm]:
+                result[norm] = entry.name
+                mtimes[norm] = mtime
+    return result
+
+
+def _dir_fingerprint(path: Path) -> str | None:
+    """Cheap change fingerprint for a directory: resolved path plus mtime."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return f"{path.resolve()}:{st.st_mtime_ns}"
+
+
+def refresh_dist_info_index(db: Database, target_path: Path) -> None:
+    """Rebuild the dist-info index if the target directory changed since it was built.
+
+    Adding, removing or renaming a dist-info updates the target's mtime, so an
+    unchanged mtime means the index is still accurate.
+    """
+    fingerprint = _dir_fingerprint(target_path)
+    if fingerprint is None or db.get_state("dist_info_index") == fingerprint:
+        return
+    db.replace_dist_info_index(scan_dist_infos(target_path))
+    db.set_state("dist_info_index", fingerprint)
+
+
+def update_dist_info_index(
+    db: Database,
+    target_path: Path,
+    added: dict[str, str] | None = None,
+    removed: list[str] | None = None,
+) -> None:
+    """Apply a known change to the index and re-stamp it with the target's mtime.
+
+    Call after an operation that refreshed the index beforehand, so that the
+    only changes since the last stamp are the ones passed in.
+    """
+    if added:
+        db.set_dist_info_names(added)
+    if removed:
+        db.remove_dist_info_names(removed)
+    fingerprint = _dir_fingerprint(target_path)
+    if fingerprint is not None:
+        db.set_state("dist_info_index", fingerprint)
+
+
+def apply_dist_info_changes(
+    db: Database, target_path: Path, added: list[str], removed: set[str]
+) -> None:
+    """Update the index for dist-infos that appeared or disappeared since the last operation.
+
+    Only the affected names are looked at; where several dist-infos remain
+    for one, the most recently modified wins, as in scan_dist_infos. This
+    relies on the index and the snapshot having been stamped together; if
+    they weren't, the index is rebuilt instead.
+    """
+    if db.get_state("dist_info_index") != db.get_state("target_snapshot"):
+        refresh_dist_info_index(db, target_path)
+        return
+    candidates: dict[str, set[str]] = {}
+    for name in [*added, *removed]:
+        split = split_dist_info_name(name)
+        if split:
+            candidates.setdefault(normalize_name(split[0]), set())
+    for name in [*db.get_snapshot_dist_infos(sorted(candidates)), *added]:
+        split = split_dist_info_name(name)
+        if split and name not in removed and normalize_name(split[0]) in candidates:
+            candidates[normalize_name(split[0])].add(name)
+
+    entries: dict[str, str] = {}
+    gone = []
+    for norm, names in candidates.items():
+        mtimes = {}
+        for name in names:
+            try:
+                mtimes[name] = (target_path / name).stat().st_mtime_ns
+            except OSError:
+                pass
+        if mtimes:
+            entries[norm] = max(mtimes, key=mtimes.__getitem__)
+        else:
+            gone.append(norm)
+    update_dist_info_index(db, target_path, added=entries, removed=gone)
+
+
+def find_dist_info(
+    target_path: Path, package_name: str, db: Database | None = None
+) -> Path | None:
+    """Find the .dist-info directory for a given package name.
+
+    With a database, this is an indexed lookup (revalidated against the
+    target's mtime); without one, the target is scanned.
+    """
     norm = normalize_name(package_name)
-    if not target_path.is_dir():
+    if db is not None:
+        refresh_dist_info_index(db, target_path)
+        name = db.get_dist_info_name(norm)
+    else:
+        name = scan_dist_infos(target_path).get(norm)
+    if name is None:
         return None
-    for child in target_path.iterdir():
-        if not (child.is_dir() and child.name.endswith(".dist-info")):
-            continue
-        # dist-info names look like: numpy-2.4.0.dist-info
-        dir_name = child.name[: -len(".dist-info")]
-        # Split on last hyphen to separate name from version
-        parts = dir_name.rsplit("-", 1)
-        if parts and normalize_name(parts[0]) == norm:
-            return child
-    return None
+    path = target_path / name
+    return path if path.is_dir() else None
+
+
+# -- Install plans --
+
+def plan_install(db: Database, resolved: list[dict]) -> list[dict]:
+    """Diff a resolved install set against the DB.
 
+    Returns one entry per resolved package:
+    {name, version, old_version, requested, action} where action is one of
+    "new", "upgrade", "downgrade" or "reinstall".
+    """
+    plan = []
+    for meta in resolved:
+        existing = db.get_package(meta["name"])
+        if existing is None:
+            action, old_version = "new", None
+        else:
+            old_version = existing["version"]
+            cmp = compare_versions(meta["version"], old_version)
+            action = "upgrade" if cmp > 0 else "downgrade" if cmp < 0 else "reinstall"
+        plan.append({
+            "name": meta["name"],
+            "version": meta["version"],
+            "old_version": old_version,
+            "requested": meta["requested"],
+            "action": action,
+        })
+    return plan
+
+
+def print_plan(plan: list[dict]) -> None:
+    """Print an install plan grouped by action."""
+    sections = [
+        ("new", "New packages:", lambda p: f"{p['name']}=={p['version']}"),
+        ("upgrade", "Upgrades:", lambda p: f"{p['name']} {p['old_version']} -> {p['version']}"),
+        ("downgrade", "Downgrades:", lambda p: f"{p['name']} {p['old_version']} -> {p['version']}"),
+    ]
+    info("\nInstall plan:")
+    for action, title, fmt in sections:
+        entries = sorted(
+            (p for p in plan if p["action"] == action),
+            key=lambda p: (not p["requested"], normalize_name(p["name"])),
+        )
+        if not entries:
+            continue
+        info(f"  {title}")
+        for p in entries:
+            marker = "*" if p["requested"] else " "
+            kind = "" if p["requested"] or action != "new" else " (dependency)"
+            info(f"    {marker} {fmt(p)}{kind}")
+    unchanged = sum(1 for p in plan if p["action"] == "reinstall")
+    if unchanged:
+        info(f"  {unchanged} package(s) reinstalled at their current version.")
+    info("(* = explicitly requested)")
 
-# -- pip operations --
 
-def pip_install(packages: list[str], target_path: Path) -> subprocess.CompletedProcess:
-    """Run pip install --target for the given packages."""
-    cmd = [
-        sys.executable, "-m", "pip", "install",
-        "--no-user", "--upgrade",
-        f"--target={target_path}",
-        *packages,
+def _locate_dist_info(target_path: Path, name: str, version: str) -> str | None:
+    """Find the dist-info dir for a just-installed name/version by direct stat."""
+    candidates = [
+        f"{re.sub(r'[-_.]+', '_', name)}-{version}.dist-info",
+        f"{name}-{version}.dist-info",
+        f"{name.replace('-', '_')}-{version}.dist-info",
+        f"{normalize_name(name)}-{version}.dist-info",
     ]
-    info(f"Running: {' '.join(cmd)}\n")
-    return subprocess.run(cmd, capture_output=False)
+    for candidate in candidates:
+        if (target_path / candidate).is_dir():
+            return candidate
+    return None
 
 
 # -- High-level install orchestration --
 
-def do_install(db: Database, packages: list[str], target_path: Path) -> bool:
-    """Run the full install flow. Returns True on success."""
+def is_satisfied(db: Database, requirement: str, upgrade: bool = False) -> sqlite3.Row | None:
+    """Return the installed package row if the DB already satisfies requirement.
+
+    A requirement is satisfied when the package is recorded at a version
+    inside its specifier. Requirements with extras or markers are never
+    considered satisfied (pip has to evaluate them). With upgrade, a bare name
+    asks for the latest version, which only pip can answer.
+    """
+    req = parse_requirement(requirement)
+    if req is None or req.extras or req.marker:
+        return None
+    if upgrade and not req.specifier:
+        return None
+    existing = db.get_package(req.name)
+    if existing and req.specifier.contains(existing["version"]):
+        return existing
+    return None
+
+
+def do_install(
+    db: Database,
+    packages: list[str],
+    target_path: Path,
+    plan_only: bool = False,
+    upgrade: bool = False,
+    staged: bool | None = None,
+    offline: bool = False,
+    as_dependencies: bool = False,
+) -> bool:
+    """Run the full install flow. Returns True on success.
+
+    Requirements the DB already satisfies are handled without pip (a
+    dependency is just promoted to explicit); if that covers every request,
+    pip is never started. upgrade makes bare names unsatisfiable, as used by
+    do_update.
+
+    When pip supports reports, the resolved set is shown as a plan (new
+    packages, upgrades, downgrades) and confirmed once before the target is
+    touched. With plan_only, the plan is printed and nothing is installed.
+
+    staged (default: config staged_install) runs pip into a staging
+    directory and swaps the result into the target (see commit_staging),
+    so the live target never holds a half-written package. The shortcuts
+    that write into the target directly (linking from the store, installing
+    local wheels in-process) are skipped, so everything goes through it.
+
+    offline installs from the wheelhouse only. With config wheelhouse on,
+    requests the wheelhouse can't resolve are first captured into it with
+    pip wheel, and the install itself then runs offline (see wheelhouse).
+
+    as_dependencies records the requested packages as dependencies (of an
+    editable install) instead of explicit ones, and never promotes them.
+
+    A package installed in editable mode is unlinked before it is
+    reinstalled normally, so nothing is written through its symlinks into
+    the source tree.
+    """
     # Resolve local paths: separate into pip args and local-package mapping
     pip_args, local_packages = resolve_local_packages(packages)
 
@@ -259,21 +607,50 @@ def do_install(db: Database, packages: list[str], target_path: Path) -> bool:
                 if path == str(resolved):
                     name_to_arg[norm] = pkg
                     break
+        elif pkg.endswith(".whl") and (wheel := parse_wheel_filename(Path(pkg).name)):
+            name_to_arg[normalize_name(wheel[0])] = pkg
+        else:
+            req = parse_requirement(pkg)
+            name_to_arg[normalize_name(req.name if req else pkg)] = pkg
+
+    # Fast path: drop requirements the DB already satisfies
+    for norm, original_arg in list(name_to_arg.items()):
+        if norm in local_packages:
+            continue
+        existing = is_satisfied(db, original_arg, upgrade=upgrade)
+        if existing is None:
+            continue
+        if not existing["is_explicit"] and not plan_only and not as_dependencies:
+            db.upsert_package(
+                name=existing["name"],
+                display_name=existing["display_name"],
+                version=existing["version"],
+                is_explicit=True,
+            )
+            info(f"{existing['display_name']}=={existing['version']} satisfies "
+                 f"{original_arg}; marked as explicit.")
         else:
-            name_to_arg[normalize_name(pkg)] = pkg
+            info(f"{existing['display_name']}=={existing['version']} already satisfies {original_arg}.")
+        del name_to_arg[norm]
+
+    if not name_to_arg:
+        info("All requested packages are already satisfied.")
+        return True
 
     # Pre-flight checks
     from py_trkpac.utils import confirm as _confirm
     to_install = []
+    replace_editable = []
+    shadows = load_shadow_index(db, target_path)
     for norm, original_arg in name_to_arg.items():
         # Check if package exists in system Python (e.g. managed by apt)
         if norm not in local_packages:
-            sys_pkg = check_system_package(norm)
+            sys_pkg = check_system_package(norm, shadows)
             if sys_pkg:
-                sys_name, sys_ver = sys_pkg
+                sys_name, sys_ver, sys_root = sys_pkg
                 info(
                     f"Warning: {sys_name}=={sys_ver} is installed in system "
-                    f"Python ({SYSTEM_DIST_PACKAGES}). "
+                    f"Python ({sys_root}). "
                     f"Installing will shadow the system version."
                 )
                 if not _confirm(f"Proceed with installing {norm}?", default_yes=False):
@@ -281,7 +658,11 @@ def do_install(db: Database, packages: list[str], target_path: Path) -> bool:
                     continue
 
         existing = db.get_package(norm)
-        if existing:
+        if existing and existing["is_editable"]:
+            info(f"{existing['display_name']} is installed in editable mode from "
+                 f"{existing['source_path']}; it will be replaced.")
+            replace_editable.append(existing)
+        elif existing:
             dependents = db.get_dependents(existing["id"])
             if existing["is_explicit"]:
                 info(f"{existing['display_name']}=={existing['version']} is already installed.")
@@ -317,77 +698,594 @@ def do_install(db: Database, packages: list[str], target_path: Path) -> bool:
         info("Nothing to install.")
         return True
 
-    # Snapshot before
-    before = snapshot_dist_infos(target_path)
+    if staged is None:
+        staged = db.get_config("staged_install") == "on"
+    if not plan_only:
+        # Local projects become wheels, rebuilt only when their source changed
+        to_install = build_local_wheels(db, target_path, to_install, local_packages)
+        if to_install is None:
+            return False
+        if replace_editable:
+            _remove_from_target(db, target_path, replace_editable)
+    if not plan_only and not staged:
+        # Exact pins the store already holds are linked in without pip
+        to_install = _link_from_store(db, target_path, to_install, local_packages)
+        if to_install:
+            to_install = _install_local_wheels(db, target_path, to_install, local_packages)
+            if to_install is None:
+                return False
+        if not to_install:
+            return True
 
-    # Run pip
-    result = pip_install(to_install, target_path)
-    if result.returncode != 0:
-        error("pip install failed. Database not modified.")
+    resolved = None
+    if offline or wheelhouse.enabled(db):
+        backend = get_backend(db, wheelhouse.offline_args(target_path))
+        if backend is None:
+            return False
+        if not offline and not plan_only:
+            # Offline first: only go to the index for what the wheelhouse lacks
+            if not upgrade and backend.can_resolve:
+                resolved = backend.resolve(to_install, target_path, quiet=True)
+            if resolved is None:
+                to_install = wheelhouse.capture(db, target_path, to_install, local_packages)
+                if to_install is None:
+                    return False
+            else:
+                info("Resolved from the wheelhouse.")
+    else:
+        backend = get_backend(db)
+        if backend is None:
+            return False
+
+    # Dry-run pre-flight: show everything the backend would change, confirm once
+    if backend.can_resolve:
+        if resolved is None:
+            resolved = backend.resolve(to_install, target_path)
+        if resolved is None:
+            error(f"{backend.name} could not resolve the requested packages. Nothing installed.")
+            return False
+        print_plan(plan_install(db, resolved))
+        if plan_only:
+            return True
+        if not _confirm("Proceed with installation?"):
+            info("Cancelled.")
+            return False
+    elif plan_only:
+        error("install --plan requires pip 22.2 or newer (for --dry-run --report), or uv.")
         return False
 
-    # Snapshot after and diff
-    after = snapshot_dist_infos(target_path)
-    changed = diff_dist_infos(before, after)
+    requested_names = set(name_to_arg.keys())
+    refresh_dist_info_index(db, target_path)
+    # Validates (or rebuilds) the persisted snapshot, so the post-install
+    # update below can be applied incrementally
+    before = load_snapshot(db, target_path)
 
-    if not changed:
+    if staged:
+        staging = create_staging(target_path)
+        try:
+            installed = _install_into(db, backend, to_install, staging, requested_names, before={})
+            if installed is None:
+                return False
+            moved = commit_staging(db, target_path, staging, installed)
+            info(f"Moved {moved} changed package(s) into {target_path}.")
+            store_installed(db, target_path, installed)
+        finally:
+            discard_staging(target_path, staging)
+            spawn_purge(db, target_path)
+        save_snapshot(db, target_path, snapshot_dist_infos(target_path))
+    else:
+        installed = _install_into(db, backend, to_install, target_path, requested_names, before)
+        if installed is None:
+            return False
+        store_installed(db, target_path, installed)  # before the dist-infos are fingerprinted
+        if backend.reports:
+            located = [m["dist_info"] for m in installed if m["dist_info"]]
+            update_snapshot(db, target_path, added=located, removed=[])
+            if len(located) < len(installed):
+                db.set_state("target_snapshot", "")  # force a rescan next time
+        else:
+            save_snapshot(db, target_path, snapshot_dist_infos(target_path))
+
+    if not installed:
         info("No packages changed on disk.")
         return True
 
-    # Record all new/changed packages in DB
-    requested_names = set(name_to_arg.keys())
-    installed_packages = {}  # norm_name -> (package_id, meta)
+    if offline or wheelhouse.enabled(db):
+        wheelhouse.touch(db, installed)
+        evicted, freed = wheelhouse.evict(db, target_path)
+        if evicted:
+            info(f"Wheelhouse: evicted {evicted} wheel(s), {freed / 1e6:.1f} MB freed.")
 
-    for dist_info_name in changed:
-        dist_path = target_path / dist_info_name
-        meta = parse_metadata(dist_path)
-        if not meta["name"] or not meta["version"]:
-            continue
-
-        norm = normalize_name(meta["name"])
-        is_explicit = norm in requested_names
-        is_local = norm in local_packages
-        source_path = local_packages.get(norm)
-        pkg_id = db.upsert_package(
-            name=meta["name"],
-            display_name=meta["name"],
-            version=meta["version"],
-            is_explicit=is_explicit,
-            is_local=is_local,
-            source_path=source_path,
-        )
-        installed_packages[norm] = (pkg_id, meta)
-
-    # Build dependency relationships
-    for norm, (pkg_id, meta) in installed_packages.items():
-        dep_ids = []
-        for req in meta["requires_dist"]:
-            dep_name = parse_dependency_name(req)
-            if dep_name is None:
-                continue
-            dep_pkg = db.get_package(dep_name)
-            if dep_pkg:
-                dep_ids.append(dep_pkg["id"])
-        db.set_dependencies(pkg_id, dep_ids)
+    if as_dependencies:
+        for meta in installed:
+            meta["requested"] = False
+    collisions = record_installed(db, target_path, installed, local_packages)
+    if collisions:
+        report_collisions(collisions)
 
     # Summary
-    info(f"\nInstalled/updated {len(changed)} package(s):")
-    for dist_info_name in sorted(changed):
-        dist_path = target_path / dist_info_name
-        meta = parse_metadata(dist_path)
-        norm = normalize_name(meta["name"] or "")
-        marker = "*" if norm in requested_names else " "
+    info(f"\nInstalled/updated {len(installed)} package(s):")
+    for meta in sorted(installed, key=lambda m: normalize_name(m["name"])):
+        norm = normalize_name(meta["name"])
+        marker = "*" if meta["requested"] else " "
         local_marker = " (local)" if norm in local_packages else ""
         info(f"  {marker} {meta['name']}=={meta['version']}{local_marker}")
     info("(* = explicitly requested)")
 
+    spawn_purge(db, target_path)  # leftovers from an interrupted purge
     return True
 
 
+def do_install_editable(db: Database, source: str, target_path: Path) -> bool:
+    """Install a local project in editable mode. Returns True on success.
+
+    The project's import packages are symlinked into the target (see
+    editable.install_editable) and it is recorded as local and editable.
+    Its dependencies that apply to this interpreter are installed first,
+    through do_install, as dependencies. A previous install of the project,
+    editable or not, is removed first.
+    """
+    try:
+        project = read_project(Path(source).expanduser().resolve())
+    except EditableError as e:
+        error(str(e))
+        return False
+
+    existing = db.get_package(project.name)
+    owned = set(db.get_package_files(existing["id"])) if existing else set()
+    for top in project.top_level:
+        if os.path.lexists(target_path / top) and not (
+            top in owned or any(path.startswith(top + "/") for path in owned)
+        ):
+            error(f"{target_path / top} already exists and doesn't belong to {project.name}. "
+                  f"Nothing installed.")
+            return False
+
+    deps = []
+    for entry in project.requires_dist:
+        req = parse_requirement(entry)
+        try:
+            applies = req is not None and (req.marker is None or evaluate_marker(req.marker))
+        except InvalidMarker:
+            applies = False
+        if applies:
+            deps.append(entry.split(";", 1)[0].strip())
+    if deps and not do_install(db, deps, target_path, as_dependencies=True):
+        error(f"Could not install the dependencies of {project.name}. Nothing linked.")
+        return False
+
+    refresh_dist_info_index(db, target_path)
+    load_snapshot(db, target_path)  # must be valid before _remove_from_target re-stamps it
+    if existing:
+        _remove_from_target(db, target_path, [existing])
+    try:
+        meta = install_editable(target_path, project)
+    except (WheelError, OSError) as e:
+        error(f"Could not link {project.name}: {e}")
+        return False
+    save_snapshot(db, target_path, snapshot_dist_infos(target_path))
+    collisions = record_installed(
+        db, target_path, [meta], {normalize_name(project.name): str(project.source_path)}
+    )
+    if collisions:
+        report_collisions(collisions)
+
+    info(f"Installed {project.name}=={project.version} in editable mode from "
+         f"{project.source_path}.")
+    for top, path in project.top_level.items():
+        info(f"  {top} -> {path}")
+    spawn_purge(db, target_path)
+    return True
+
+
+def _link_from_store(
+    db: Database,
+    target_path: Path,
+    to_install: list[str],
+    local_packages: dict[str, str],
+) -> list[str]:
+    """Install "name==version" requests from the store by hardlinking. Returns the rest.
+
+    A stored package qualifies when it was stored for this interpreter,
+    the target holds no other version of it, and each of its unconditional
+    Requires-Dist entries is already satisfied by a recorded package;
+    anything else (markers, extras, missing dependencies) is left to pip.
+    """
+    store = open_store(db)
+    if store is None:
+        return to_install
+    remaining = []
+    linked = []
+    try:
+        for arg in to_install:
+            req = parse_requirement(arg)
+            specs = req.specifier.specifiers if req else []
+            if (
+                req is None or req.extras or req.marker
+                or normalize_name(req.name) in local_packages
+                or len(specs) != 1 or specs[0].operator != "==" or specs[0].version.endswith(".*")
+            ):
+                remaining.append(arg)
+                continue
+            existing = db.get_package(req.name)
+            stored = store.get_dist(req.name, specs[0].version)
+            if stored is None or (existing and existing["version"] != specs[0].version):
+                remaining.append(arg)
+                continue
+            requires, manifest = stored
+            deps_ok = True
+            for entry in requires:
+                if parse_dependency_name(entry) is None:
+                    continue  # only needed with an extra
+                dep = parse_requirement(entry)
+                installed_dep = db.get_package(dep.name) if dep and not dep.marker else None
+                if installed_dep is None or not dep.specifier.contains(installed_dep["version"]):
+                    deps_ok = False
+                    break
+            if not deps_ok:
+                remaining.append(arg)
+                continue
+            if not linked:
+                refresh_dist_info_index(db, target_path)
+                load_snapshot(db, target_path)  # must be valid before incremental updates
+            store.link_dist(target_path, manifest)
+            dist_info = next(p.split("/", 1)[0] for p, _ in manifest
+                             if p.split("/", 1)[0].endswith(".dist-info"))
+            linked.append({
+                "name": parse_metadata(target_path / dist_info)["name"] or req.name,
+                "version": specs[0].version,
+                "requires_dist": requires,
+                "requested": True,
+                "source_path": None,
+                "dist_info": dist_info,
+            })
+    finally:
+        store.close()
+
+    if linked:
+        update_snapshot(db, target_path, added=[m["dist_info"] for m in linked], removed=[])
+        collisions = record_installed(db, target_path, linked, {})
+        if collisions:
+            report_collisions(collisions)
+        for meta in linked:
+            info(f"Linked {meta['name']}=={meta['version']} from the store.")
+    return remaining
+
+
+def _install_local_wheels(
+    db: Database,
+    target_path: Path,
+    to_install: list[str],
+    local_packages: dict[str, str],
+) -> list[str] | None:
+    """Install local .whl files in-process (see InProcessBackend). Returns the rest.
+
+    Wheels that need anything from an index (an unsatisfied dependency,
+    an unsupported tag, extras) are left to the configured backend, along
+    with every other request. Wheels built from local projects (see
+    build_local_wheels) are recorded as local, with their source path from
+    local_packages. Returns None if installing failed.
+    """
+    backend = InProcessBackend(db)
+    wheels, rest = backend.split(to_install)
+    if not wheels:
+        return to_install
+
+    refresh_dist_info_index(db, target_path)
+    result = backend.install(wheels, target_path)
+    if not result.ok:
+        error("Database not modified.")
+        return None
+    installed = result.installed
+
+    store_installed(db, target_path, installed)
+    save_snapshot(db, target_path, snapshot_dist_infos(target_path))
+    collisions = record_installed(db, target_path, installed, local_packages)
+    if collisions:
+        report_collisions(collisions)
+    info(f"\nInstalled/updated {len(installed)} package(s) from local wheels:")
+    for meta in sorted(installed, key=lambda m: normalize_name(m["name"])):
+        local_marker = " (local)" if normalize_name(meta["name"]) in local_packages else ""
+        info(f"  * {meta['name']}=={meta['version']}{local_marker}")
+    return rest
+
+
+def _install_into(
+    db: Database,
+    backend: Backend,
+    to_install: list[str],
+    root: Path,
+    requested_names: set[str],
+    before: dict[str, str],
+) -> list[dict] | None:
+    """Install into root (the target, or a staging directory) and describe the result.
+
+    Returns metadata dicts for record_installed, with dist_info names
+    relative to root, or None if the backend failed. before is root's
+    dist-info snapshot, used to find what changed when the backend can't
+    report what it installed.
+    """
+    # Watch root while the installer runs (Linux, unless config inotify=off)
+    watcher = None
+    if db.get_config("inotify") != "off":
+        watcher = InstallWatcher.start_if_available(root, _parse_dist_info)
+
+    try:
+        result = backend.install(to_install, root)
+    finally:
+        observation = watcher.stop() if watcher else None
+
+    if not result.ok:
+        error(f"{backend.name} install failed. Database not modified.")
+        return None
+    observed = observation.dist_infos if observation else {}
+
+    if backend.reports:
+        installed = result.installed
+        if installed is None:
+            error(f"{backend.name} did not write an installation report. Database not modified.")
+            return None
+        for meta in installed:
+            meta["dist_info"] = _locate_dist_info(root, meta["name"], meta["version"])
+            if meta["dist_info"] in observed:
+                meta["record"] = observed[meta["dist_info"]][1]
+    else:
+        # No report (uv, older pip): find what changed by diffing .dist-info snapshots
+        installed = []
+        for dist_info_name in diff_dist_infos(before, snapshot_dist_infos(root)):
+            if dist_info_name in observed:
+                meta, record = observed[dist_info_name]
+                meta["record"] = record
+            else:
+                meta = get_metadata(db, root / dist_info_name)
+            if not meta["name"] or not meta["version"]:
+                continue
+            meta["requested"] = normalize_name(meta["name"]) in requested_names
+            meta["source_path"] = None
+            meta["dist_info"] = dist_info_name
+            installed.append(meta)
+
+    if observation is not None and not observation.overflowed:
+        unowned = attribute_observed_files(root, observation.files, installed)
+        if unowned:
+            info(f"\nWarning: pip wrote {len(unowned)} file(s) not owned by any installed package:")
+            for path in sorted(unowned)[:10]:
+                info(f"  {path}")
+            if len(unowned) > 10:
+                info(f"  ... and {len(unowned) - 10} more")
+    return installed
+
+
+def _parse_dist_info(dist_info_path: Path) -> tuple[dict, list]:
+    """Parse METADATA and RECORD of one dist-info (safe to run in a worker thread)."""
+    return parse_metadata(dist_info_path), parse_record_entries(dist_info_path)
+
+
+def attribute_observed_files(
+    target_path: Path, files: set[str], installed: list[dict]
+) -> list[str]:
+    """Add files pip wrote outside any RECORD to the owning package's manifest.
+
+    A file is attributed to a newly installed package when that package is
+    the only one whose RECORD has entries under the same top-level entry
+    (e.g. a data file dropped into "numpy/"). The extra entries are appended
+    to meta["record"] with no hash. Returns the files nobody could own.
+    """
+    owner_of_top: dict[str, dict | None] = {}
+    recorded: set[str] = set()
+    for meta in installed:
+        if not meta.get("dist_info"):
+            continue
+        if "record" not in meta:
+            meta["record"] = parse_record_entries(target_path / meta["dist_info"])
+        for path, _, _ in meta["record"]:
+            recorded.add(path)
+            top = path.split("/", 1)[0]
+            if "/" not in path:
+                continue  # top-level files don't claim a directory
+            # A top-level dir shared by several packages (bin/, namespace
+            # packages) can't be attributed to one of them
+            owner_of_top[top] = meta if owner_of_top.get(top, meta) is meta else None
+
+    unowned = []
+    for path in files - recorded:
+        owner = owner_of_top.get(path.split("/", 1)[0])
+        if owner is None:
+            unowned.append(path)
+            continue
+        try:
+            size = (target_path / path).stat().st_size
+        except OSError:
+            continue
+        owner["record"].append((path, None, size))
+    return unowned
+
+
+def record_installed(
+    db: Database,
+    target_path: Path,
+    installed: list[dict],
+    local_packages: dict[str, str],
+) -> list[sqlite3.Row]:
+    """Record freshly installed packages and their dependency edges in the DB.
+
+    installed: list of {name, version, requires_dist, requested, source_path,
+    dist_info, and optionally record (parsed RECORD entries)}, as produced
+    from a pip report or a snapshot diff. Packages installed from a local
+    directory are recorded as local, whether they were matched through
+    pyproject.toml (local_packages) or the report.
+
+    Returns the file collisions between the new manifests and those of
+    other packages (see Database.get_file_collisions).
+    """
+    index_entries = {}
+    rows = []
+    for meta in installed:
+        norm = normalize_name(meta["name"])
+        source_path = local_packages.get(norm) or meta.get("source_path")
+        rows.append({
+            "name": meta["name"],
+            "display_name": meta["name"],
+            "version": meta["version"],
+            "is_explicit": meta["requested"],
+            "is_local": source_path is not None,
+            "is_editable": bool(meta.get("editable")),
+            "source_path": source_path,
+        })
+        if meta.get("dist_info"):
+            index_entries[norm] = meta["dist_info"]
+
+    # Dependency names per package; ids resolved in one batch below
+    dep_names = {}
+    for meta in installed:
+        names = (parse_dependency_name(req) for req in meta["requires_dist"])
+        dep_names[normalize_name(meta["name"])] = [n for n in names if n]
+
+    with db.transaction():
+        ids = db.upsert_packages(rows)
+        all_deps = {n for names in dep_names.values() for n in names}
+        dep_ids = db.get_package_ids(list(all_deps - ids.keys()))
+        dep_ids.update(ids)
+        db.set_dependency_edges({
+            ids[norm]: [dep_ids[n] for n in names if n in dep_ids]
+            for norm, names in dep_names.items()
+        })
+        cache_known_metadata(db, [
+            (target_path / meta["dist_info"], meta)
+            for meta in installed
+            if meta.get("dist_info")
+        ])
+        db.set_package_files({
+            ids[normalize_name(meta["name"])]: (
+                meta["record"] if "record" in meta
+                else parse_record_entries(target_path / meta["dist_info"])
+            )
+            for meta in installed
+            if meta.get("dist_info")
+        })
+
+        update_dist_info_index(db, target_path, added=index_entries)
+        if len(index_entries) < len(installed):
+            # Some dist-info dirs could not be located by name; force a rescan
+            db.set_state("dist_info_index", "")
+
+        return db.get_file_collisions(list(ids.values()))
+
+
+def report_collisions(collisions: list[sqlite3.Row]) -> None:
+    """Print file collisions grouped by package pair. Both owners are kept."""
+    pairs: dict[tuple[str, str], dict[str, bool]] = {}
+    for row in collisions:
+        pair = tuple(sorted((row["owner"], row["other"])))
+        differs = bool(row["hash"] and row["other_hash"] and row["hash"] != row["other_hash"])
+        pairs.setdefault(pair, {})[row["path"]] = differs
+
+    total = sum(len(paths) for paths in pairs.values())
+    info(f"\nWarning: {total} file(s) are owned by more than one package:")
+    for (a, b), paths in sorted(pairs.items()):
+        differing = sum(paths.values())
+        info(f"  {a} and {b}: {len(paths)} file(s), {differing} with different contents")
+        for path in sorted(paths)[:5]:
+            info(f"    {path}")
+        if len(paths) > 5:
+            info(f"    ... and {len(paths) - 5} more")
+    info("The last package installed wins on disk; removing either one keeps the shared files.")
+
+
+def backfill_manifests(db: Database, target_path: Path) -> None:
+    """Store manifests, read from RECORD, for packages recorded without one.
+
+    Removal counts references from manifests, so a package without one
+    would have its files in shared directories trashed along with the
+    removed package's. Runs once per package: the query is empty after.
+    """
+    manifests = {}
+    for pkg in db.get_packages_without_files():
+        dist_info = find_dist_info(target_path, pkg["name"], db)
+        if dist_info is not None:
+            entries = parse_record_entries(dist_info)
+            if entries:
+                manifests[pkg["id"]] = entries
+    if manifests:
+        db.set_package_files(manifests)
+
+
+def _remove_from_target(
+    db: Database, target_path: Path, pkgs: list[sqlite3.Row], forget: bool = False
+) -> dict[int, int | None]:
+    """Delete packages' files from target. Returns {id: entries removed, None if not on disk}.
+
+    Uses the manifests stored at install time, so a damaged or missing
+    dist-info doesn't prevent removal; packages recorded before manifests
+    existed get theirs from RECORD first (backfill_manifests). Whole
+    directories go to the trash (see removal.remove_manifests) unless a
+    dist-info in the target still has no manifest, in which case files are
+    unlinked one by one; call spawn_purge afterwards. Stale dist-infos pip
+    left behind for the same names on upgrade are removed along with them.
+
+    The filesystem work runs first, outside any transaction: a rollback
+    couldn't undo it, and other writers shouldn't wait on it. The DB is
+    then updated in one transaction, which with forget also deletes the
+    packages themselves.
+    """
+    snapshot = load_snapshot(db, target_path)
+    backfill_manifests(db, target_path)
+    by_name: dict[str, list[str]] = {}
+    for name in snapshot:
+        split = split_dist_info_name(name)
+        if split:
+            by_name.setdefault(normalize_name(split[0]), []).append(name)
+
+    manifests: dict[int, list[str]] = {}
+    dist_infos: dict[int, list[str]] = {}
+    for pkg in pkgs:
+        dist_info = find_dist_info(target_path, pkg["name"], db)
+        files = db.get_package_files(pkg["id"])
+        if not files and dist_info is not None:
+            files = parse_record(dist_info)
+        names = by_name.get(pkg["name"], [])
+        if dist_info is not None and dist_info.name not in names:
+            names.append(dist_info.name)
+        if names:
+            dist_infos[pkg["id"]] = names
+        if files or names:
+            manifests[pkg["id"]] = files
+    removed = [name for names in dist_infos.values() for name in names]
+
+    # Files of a dist-info without a manifest could be anywhere, including
+    # inside a directory that would otherwise be trashed whole
+    unowned = set(db.get_unowned_dist_infos()) - set(removed)
+    counts = remove_manifests(db, target_path, manifests, dist_infos, trash_dirs=not unowned)
+    release_files(db, target_path, [path for files in manifests.values() for path in files])
+    kept = db.get_shared_files(list(manifests))
+    if kept:
+        info(f"Kept {len(kept)} file(s) also owned by other packages.")
+
+    with db.transaction():
+        if forget:
+            # CASCADE deletes dependency rows and manifests
+            db.remove_packages([p["name"] for p in pkgs])
+        else:
+            # Drop the manifests so later lookups see the files as unowned
+            db.set_package_files({pkg_id: [] for pkg_id in manifests})
+        # Re-stamp the index and snapshot so the next lookup doesn't rescan
+        update_dist_info_index(db, target_path, removed=[p["name"] for p in pkgs])
+        db.remove_cached_metadata([str((target_path / d).absolute()) for d in removed])
+        update_snapshot(db, target_path, added=[], removed=removed)
+    return {pkg["id"]: counts.get(pkg["id"]) for pkg in pkgs}
+
+
 def do_remove(db: Database, packages: list[str], target_path: Path) -> bool:
-    """Run the full remove flow. Returns True on success."""
+    """Run the full remove flow. Returns True on success.
+
+    All prompts happen up front, including a single confirmation for every
+    dependency that would be orphaned (computed transitively in one query).
+    Files are then removed, and the DB updated in one transaction once the
+    filesystem work is done (see _remove_from_target).
+    """
     from py_trkpac.utils import confirm
 
+    to_remove = []
     for pkg in packages:
         existing = db.get_package(pkg)
         if not existing:
@@ -402,36 +1300,216 @@ def do_remove(db: Database, packages: list[str], target_path: Path) -> bool:
             if not confirm(f"Remove {existing['display_name']} anyway?", default_yes=False):
                 info(f"Skipping {existing['display_name']}.")
                 continue
+        to_remove.append(existing)
+
+    # Everything that becomes unreachable from explicit packages, in one plan
+    orphans = db.get_orphan_closure([p["id"] for p in to_remove])
+    if orphans:
+        info("\nThe following packages will no longer be needed by anything:")
+        for o in orphans:
+            info(f"  {o['display_name']}=={o['version']}")
+        if not confirm("Remove them too?"):
+            orphans = []
 
-        # Find and remove files
-        dist_info = find_dist_info(target_path, existing["name"])
-        if dist_info:
-            removed = remove_package_files(target_path, dist_info.name)
-            info(f"Removed {removed} files for {existing['display_name']}.")
+    if not to_remove and not orphans:
+        return True
+
+    removed = _remove_from_target(db, target_path, to_remove + orphans, forget=True)
+    for existing in to_remove:
+        if removed[existing["id"]] is not None:
+            info(f"Removed {removed[existing['id']]} files for {existing['display_name']}.")
         else:
             info(f"Warning: .dist-info not found for {existing['display_name']} on disk.")
-
-        # Remove from DB (CASCADE deletes dependency rows)
-        db.remove_package(existing["name"])
         info(f"Removed {existing['display_name']}=={existing['version']} from database.")
+    for o in orphans:
+        info(f"  Removed {o['display_name']}")
+
+    # Trashed directories are deleted by a detached process
+    spawn_purge(db, target_path)
+    return True
+
+
+def do_reconcile(db: Database, target_path: Path, workers: int | None = None) -> bool:
+    """Rebuild DB state from the dist-infos actually present in target.
+
+    Parses every dist-info on a thread pool, reports packages added,
+    removed or changed since the DB was last updated, and after confirmation
+    rewrites packages, dependency edges, file manifests and the dist-info
+    index in one transaction. Packages found only on disk are recorded as
+    explicit unless another package on disk depends on them.
+    """
+    from py_trkpac.utils import confirm
+
+    on_disk = scan_dist_infos(target_path)
+    paths = [target_path / d for d in on_disk.values()]
+    metas = get_metadata_batch(db, paths, workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        records = list(pool.map(parse_record_entries, paths))
+    parsed = dict(zip(on_disk, zip(metas, records)))
+
+    # Key everything by the name in METADATA; skip unreadable dist-infos
+    disk: dict[str, tuple[dict, list]] = {}
+    for norm, (meta, record) in parsed.items():
+        if meta["name"] and meta["version"]:
+            disk[normalize_name(meta["name"])] = (meta, record)
+        else:
+            error(f"Skipping {on_disk[norm]}: METADATA has no name or version.")
+
+    dep_names = {
+        norm: [n for n in map(parse_dependency_name, meta["requires_dist"]) if n]
+        for norm, (meta, _) in disk.items()
+    }
+    required = {n for names in dep_names.values() for n in names}
+
+    known = {p["name"]: p for p in db.get_all_packages()}
+    added = sorted(n for n in disk if n not in known)
+    removed = sorted(n for n in known if n not in disk)
+    changed = sorted(
+        n for n in disk
+        if n in known and known[n]["version"] != disk[n][0]["version"]
+    )
+
+    if added or removed or changed:
+        info("Differences between the database and the target:")
+        for n in added:
+            meta = disk[n][0]
+            kind = "dependency" if n in required else "explicit"
+            info(f"  + {meta['name']}=={meta['version']} ({kind})")
+        for n in removed:
+            info(f"  - {known[n]['display_name']}=={known[n]['version']}")
+        for n in changed:
+            info(f"  ~ {known[n]['display_name']} {known[n]['version']} -> {disk[n][0]['version']}")
+        if not confirm("Update the database to match?"):
+            info("Cancelled.")
+            return False
+    else:
+        info("Database already matches the target; refreshing dependencies and manifests.")
+
+    with db.transaction():
+        ids = db.upsert_packages([
+            {
+                "name": disk[n][0]["name"],
+                "display_name": disk[n][0]["name"],
+                "version": disk[n][0]["version"],
+                "is_explicit": n not in known and n not in required,
+            }
+            for n in added + changed
+        ])
+        db.remove_packages(removed)
+        ids.update({n: known[n]["id"] for n in disk if n not in ids})
+        db.set_dependency_edges({
+            ids[n]: [ids[d] for d in names if d in ids] for n, names in dep_names.items()
+        })
+        db.set_package_files({ids[n]: record for n, (_, record) in disk.items()})
+        db.replace_dist_info_index(on_disk)
+        fingerprint = _dir_fingerprint(target_path)
+        if fingerprint is not None:
+            db.set_state("dist_info_index", fingerprint)
+        save_snapshot(db, target_path, snapshot_dist_infos(target_path))
+
+    info(
+        f"Reconciled {len(disk)} package(s): {len(added)} added, "
+        f"{len(removed)} removed, {len(changed)} changed."
+    )
+    return True
 
-    # Recursive orphan cleanup — peel off one layer at a time
-    while True:
-        orphans = db.get_orphaned_dependencies()
-        if not orphans:
-            break
-        info("\nThe following packages are no longer needed by anything:")
-        for o in orphans:
-            info(f"  {o['display_name']}=={o['version']}")
-        if not confirm("Remove them?"):
-            break
-        for o in orphans:
-            dist_info = find_dist_info(target_path, o["name"])
-            if dist_info:
-                remove_package_files(target_path, dist_info.name)
-            db.remove_package(o["name"])
-            info(f"  Removed {o['display_name']}")
 
+def sync_dist_infos(
+    db: Database,
+    target_path: Path,
+    added: set[str] | None,
+    removed: set[str] | None,
+) -> tuple[list[str], list[str]]:
+    """Apply out-of-band dist-info changes to the DB, touching only those packages.
+
+    added/removed are dist-info dir names that appeared or disappeared since
+    the last sync; None for both means they are unknown (e.g. the watcher's
+    queue overflowed) and are recomputed from the persisted snapshot. The
+    dist-info index is updated for the affected names only. New dist-infos
+    go through record_installed; a package is explicit unless something in
+    the target declares it as a requirement, which is looked up by name. A package is
+    dropped only when no dist-info for it remains. Call with the target
+    lock held. Returns (recorded, dropped) display names.
+    """
+    with db.transaction():
+        if added is None or removed is None:
+            before = db.get_target_snapshot()
+            after = snapshot_dist_infos(target_path)
+            added = set(diff_dist_infos(before, after))
+            removed = set(before) - set(after)
+
+        on_disk = [name for name in added if (target_path / name).is_dir()]
+        apply_dist_info_changes(db, target_path, on_disk, removed)
+        metas = get_metadata_batch(db, [target_path / name for name in on_disk])
+
+        installed = []
+        for dist_info, meta in zip(on_disk, metas):
+            if not meta["name"] or not meta["version"]:
+                continue
+            existing = db.get_package(meta["name"])
+            if existing is not None and existing["version"] == meta["version"]:
+                continue  # already recorded (e.g. by our own install)
+            installed.append({**meta, "dist_info": dist_info, "source_path": None})
+
+        new_names = sorted({normalize_name(meta["name"]) for meta in installed})
+        declared = db.get_requirements_naming(new_names)
+        for meta in installed:
+            declared.extend(meta["requires_dist"])
+        required = {n for n in map(parse_dependency_name, declared) if n}
+        for meta in installed:
+            existing = db.get_package(meta["name"])
+            meta["requested"] = (
+                bool(existing["is_explicit"]) if existing is not None
+                else normalize_name(meta["name"]) not in required
+            )
+        if installed:
+            record_installed(db, target_path, installed, {})
+
+        dropped = []
+        gone = set()
+        for dist_info in removed:
+            split = split_dist_info_name(dist_info)
+            if split is None:
+                continue
+            norm = normalize_name(split[0])
+            if db.get_dist_info_name(norm) is None:
+                gone.add(norm)
+        for norm in gone:
+            pkg = db.get_package(norm)
+            if pkg is not None:
+                dropped.append(pkg["display_name"])
+        db.remove_packages(sorted(gone))
+        db.remove_cached_metadata([str((target_path / name).absolute()) for name in removed])
+        update_snapshot(db, target_path, added=on_disk, removed=sorted(removed))
+
+    return [meta["name"] for meta in installed], dropped
+
+
+def do_watch(db: Database, target_path: Path, debounce: float = 2.0) -> bool:
+    """Keep the DB in sync with changes made to target by other tools until interrupted."""
+    from py_trkpac import inotify
+    from py_trkpac.lock import target_lock
+    from py_trkpac.watch import watch_dist_infos
+
+    if not inotify.available():
+        error("inotify is not available on this system; use 'py-trkpac reconcile' instead.")
+        return False
+
+    def apply(added: set[str] | None, removed: set[str] | None) -> None:
+        # Wait for any running py-trkpac operation, which records its own changes
+        with target_lock(target_path):
+            recorded, dropped = sync_dist_infos(db, target_path, added, removed)
+        for name in recorded:
+            info(f"  + {name}")
+        for name in dropped:
+            info(f"  - {name}")
+
+    info(f"Watching {target_path} for changes (Ctrl-C to stop)...")
+    apply(None, None)  # catch up on anything that changed while not watching
+    try:
+        watch_dist_infos(target_path, apply, debounce=debounce)
+    except KeyboardInterrupt:
+        info("Stopped watching.")
     return True
 
 
@@ -440,17 +1518,26 @@ def do_update(db: Database, packages: list[str] | None, target_path: Path) -> bo
     if packages:
         to_update = []
         for pkg in packages:
-            existing = db.get_package(pkg)
+            req = parse_requirement(pkg)
+            existing = db.get_package(req.name if req else pkg)
             if not existing:
                 error(f"{pkg} is not installed.")
                 continue
+            if existing["is_editable"]:
+                info(
+                    f"{existing['display_name']} is an editable install; source changes "
+                    f"apply immediately. After changing its metadata, run: "
+                    f"py-trkpac install --editable {existing['source_path']}"
+                )
+                continue
             if existing["is_local"]:
                 info(
                     f"{existing['display_name']} is a local install. "
                     f"Reinstall from source path: py-trkpac install {existing['source_path']}"
                 )
                 continue
-            to_update.append(existing["display_name"])
+            # Keep any version specifier so satisfied requests can skip pip
+            to_update.append(pkg if req else existing["display_name"])
     else:
         explicit = db.get_explicit_packages()
         # Skip local packages — they need explicit reinstall from source path
@@ -465,4 +1552,4 @@ def do_update(db: Database, packages: list[str] | None, target_path: Path) -> bo
         return True
 
     # Use the same install flow — pip --upgrade handles version checking
-    return do_install(db, to_update, target_path)
+    return do_install(db, to_update, target_path, upgrade=True)
@@ -0,0 +1,41 @@
+"""Advisory fcntl lock coordinating py-trkpac processes on one target directory."""
+
+from __future__ import annotations
+
+import fcntl
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from py_trkpac.utils import info
+
+LOCK_FILENAME = ".py-trkpac.lock"
+
+
+@contextmanager
+def target_lock(target_path: Path, exclusive: bool = True) -> Iterator[None]:
+    """Hold a lock on target_path for the duration of the block.
+
+    Operations that modify the target (install, remove, update) take it
+    exclusively. Operations that must see a consistent target without
+    changing it take it shared, so they can run alongside each other but
+    not alongside a writer. Plain DB reads (list, list-deps) need no lock:
+    the database runs in WAL mode, and they open it query-only and never
+    touch the target, so they never block.
+
+    The lock is released automatically if the process dies.
+    """
+    lock_path = target_path / LOCK_FILENAME
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+    try:
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            info(f"Waiting for another py-trkpac operation on {target_path}...")
+            fcntl.flock(fd, mode)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
@@ -0,0 +1,118 @@
+"""METADATA header parsing and the stat-keyed metadata cache."""
+
+from __future__ import annotations
+
+import os
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from py_trkpac.db import Database
+
+
+def read_metadata_headers(meta_file: Path) -> list[tuple[str, str]]:
+    """Stream RFC 822 headers from a METADATA file, stopping at the first blank line.
+
+    The description body (often a multi-hundred-KB README) is never read.
+    Continuation lines (starting with whitespace) are folded into the
+    previous header's value.
+    """
+    with open(meta_file, encoding="utf-8", errors="replace") as f:
+        return parse_metadata_headers(f)
+
+
+def parse_metadata_headers(lines: Iterable[str]) -> list[tuple[str, str]]:
+    """Parse RFC 822 headers from METADATA lines, stopping at the first blank line."""
+    headers: list[tuple[str, str]] = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            break  # End of headers
+        if line[0] in " \t":
+            if headers:
+                key, value = headers[-1]
+                headers[-1] = (key, f"{value} {line.strip()}")
+            continue
+        key, sep, value = line.partition(":")
+        if sep:
+            headers.append((key.strip(), value.strip()))
+    return headers
+
+
+def parse_metadata(dist_info_path: Path) -> dict:
+    """Parse a METADATA file and return {name, version, requires_dist}."""
+    meta_file = dist_info_path / "METADATA"
+    result = {"name": None, "version": None, "requires_dist": []}
+    try:
+        headers = read_metadata_headers(meta_file)
+    except OSError:
+        return result
+
+    for key, value in headers:
+        key = key.lower()
+        if key == "name":
+            result["name"] = value
+        elif key == "version":
+            result["version"] = value
+        elif key == "requires-dist":
+            result["requires_dist"].append(value)
+    return result
+
+
+def _stat_key(dist_info_path: Path) -> tuple[str, int, int] | None:
+    """(absolute path, METADATA mtime_ns, METADATA size), or None if unreadable."""
+    try:
+        st = os.stat(dist_info_path / "METADATA")
+    except OSError:
+        return None
+    return (str(dist_info_path.absolute()), st.st_mtime_ns, st.st_size)
+
+
+def get_metadata(db: Database, dist_info_path: Path) -> dict:
+    """Parsed metadata for one dist-info, served from the cache when unchanged."""
+    return get_metadata_batch(db, [dist_info_path])[0]
+
+
+def get_metadata_batch(
+    db: Database, dist_info_paths: list[Path], workers: int | None = None
+) -> list[dict]:
+    """Parsed metadata for many dist-infos, in the same order.
+
+    Entries whose METADATA (path, mtime, size) matches the cache are returned
+    without opening the file. Misses are parsed on a thread pool and
+    written back in one batch; DB access stays on the calling thread.
+    """
+    keys = [_stat_key(p) for p in dist_info_paths]
+    cached = db.get_cached_metadata([k for k in keys if k is not None])
+
+    results: list[dict | None] = []
+    misses = []
+    for i, key in enumerate(keys):
+        if key is None:
+            results.append({"name": None, "version": None, "requires_dist": []})
+        elif key in cached:
+            results.append(cached[key])
+        else:
+            results.append(None)
+            misses.append(i)
+
+    if misses:
+        if len(misses) == 1:
+            parsed = [parse_metadata(dist_info_paths[misses[0]])]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                parsed = list(pool.map(parse_metadata, (dist_info_paths[i] for i in misses)))
+        for i, meta in zip(misses, parsed):
+            results[i] = meta
+        db.cache_metadata([(keys[i], meta) for i, meta in zip(misses, parsed)])
+    return results
+
+
+def cache_known_metadata(db: Database, entries: list[tuple[Path, dict]]) -> None:
+    """Seed the cache with metadata already known from elsewhere (a pip report)."""
+    rows = []
+    for dist_info_path, meta in entries:
+        key = _stat_key(dist_info_path)
+        if key is not None:
+            rows.append((key, meta))
+    db.cache_metadata(rows)
@@ -0,0 +1,206 @@
+"""Removal engine: trash whole entries by rename, unlink shared files, purge in the background."""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import posixpath
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from py_trkpac.db import OPTIONAL_CONFIG, Database
+
+TRASH_DIRNAME = ".py-trkpac-trash"
+_PURGE_LOCK = ".purge.lock"
+
+
+def trash_path(target_path: Path) -> Path:
+    return target_path / TRASH_DIRNAME
+
+
+def _unlink(path: str | Path) -> bool:
+    """Unlink a file or symlink; False if it was already gone or is a directory."""
+    try:
+        os.unlink(path)
+        return True
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        return False
+
+
+def remove_manifests(
+    db: Database,
+    target_path: Path,
+    manifests: dict[int, list[str]],
+    dist_infos: dict[int, list[str]],
+    trash_dirs: bool = True,
+) -> dict[int, int]:
+    """Remove several packages' files from target. Returns {package_id: entries removed}.
+
+    manifests: {package_id: paths relative to target}; dist_infos:
+    {package_id: dist-info dir names} still on disk, stale ones included.
+
+    Reference counts come from the manifests of the packages that stay. The
+    shallowest directory on a removed path that no remaining package owns
+    anything under (usually the package's top-level directory, but e.g.
+    google/protobuf inside a shared namespace) is renamed into the trash in
+    one syscall; purge_trash deletes its contents later. Files directly in
+    still-referenced directories (bin/) are unlinked one by one, skipping
+    files another package also owns, and emptied directories are rmdir'ed
+    deepest first. Directories are never listed.
+
+    With trash_dirs False (some dist-info in the target has no manifest, so its
+    files could sit in any directory), every file is unlinked one by one
+    and only directories left empty are removed.
+    """
+    ids = list(manifests)
+    keep = db.get_shared_files(ids)
+    tops = {path.split("/", 1)[0] for files in manifests.values() for path in files}
+
+    referenced_dirs: set[str] = set()
+    for path in db.get_files_under(sorted(tops), ids):
+        parent = posixpath.dirname(path)
+        while parent and parent not in referenced_dirs:
+            referenced_dirs.add(parent)
+            parent = posixpath.dirname(parent)
+
+    batch = trash_path(target_path) / f"{time.time_ns()}-{os.getpid()}"
+    trashed: dict[str, bool] = {}
+
+    def to_trash(name: str) -> bool:
+        if name not in trashed:
+            batch.mkdir(parents=True, exist_ok=True)
+            try:
+                # Flat names in the batch: nested units can't collide
+                os.rename(target_path / name, batch / str(len(trashed)))
+                trashed[name] = True
+            except FileNotFoundError:
+                trashed[name] = False
+        return trashed[name]
+
+    counts = dict.fromkeys(ids, 0)
+    prune: set[str] = set()
+    for pkg_id, files in manifests.items():
+        for path in files:
+            if path in keep:
+                continue
+            unit = None
+            parent = posixpath.dirname(path) if trash_dirs else ""
+            while parent:
+                if parent not in referenced_dirs:
+                    unit = parent
+                parent = posixpath.dirname(parent)
+            if unit is not None and to_trash(unit):
+                counts[pkg_id] += 1
+                continue
+            if _unlink(target_path / path):
+                counts[pkg_id] += 1
+                parent = posixpath.dirname(path)
+                while parent and parent not in referenced_dirs and parent not in prune:
+                    prune.add(parent)
+                    parent = posixpath.dirname(parent)
+
+    for d in sorted(prune, key=lambda p: p.count("/"), reverse=True):
+        try:
+            os.rmdir(target_path / d)
+        except OSError:
+            pass  # holds files no manifest lists (e.g. a stray __pycache__)
+
+    for pkg_id, names in dist_infos.items():
+        for name in names:
+            if name not in trashed and to_trash(name):  # not already moved via its RECORD
+                counts[pkg_id] += 1
+    return counts
+
+
+# -- Purging the trash --
+
+def has_trash(target_path: Path) -> bool:
+    try:
+        with os.scandir(trash_path(target_path)) as it:
+            return any(not e.name.startswith(".") for e in it)
+    except OSError:
+        return False
+
+
+def spawn_purge(db: Database, target_path: Path) -> None:
+    """Start a detached process that empties the trash, if there is anything in it."""
+    if not has_trash(target_path):
+        return
+    workers = db.get_config("purge_workers") or OPTIONAL_CONFIG["purge_workers"]
+    subprocess.Popen(
+        [sys.executable, "-m", "py_trkpac.removal", str(target_path), workers],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _delete_tree(root: str, pool: ThreadPoolExecutor) -> None:
+    """Delete a trashed entry: files on the pool, then directories bottom-up.
+
+    Symlinks (to files or directories) are unlinked, never followed.
+    """
+    if os.path.islink(root) or not os.path.isdir(root):
+        _unlink(root)
+        return
+    files: list[str] = []
+    dirs: list[str] = []
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        dirs.append(d)
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        files.append(entry.path)
+        except OSError:
+            continue
+    list(pool.map(_unlink, files, chunksize=256))
+    for d in reversed(dirs):  # children were appended after their parent
+        try:
+            os.rmdir(d)
+        except OSError:
+            pass
+
+
+def purge_trash(target_path: Path, workers: int = 4, niceness: int = 19) -> None:
+    """Empty the target's trash until nothing is left.
+
+    Runs at low CPU priority, which also lowers I/O priority under the
+    default Linux I/O schedulers; workers caps how many unlinks are in
+    flight. Only one purger runs per target; others return immediately.
+    """
+    trash = trash_path(target_path)
+    try:
+        fd = os.open(trash / _PURGE_LOCK, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        return
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        if niceness:
+            os.nice(niceness)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while True:
+                with os.scandir(trash) as it:
+                    batches = [e.path for e in it if not e.name.startswith(".")]
+                if not batches:
+                    break
+                for batch in batches:
+                    _delete_tree(batch, pool)
+    finally:
+        os.close(fd)
+
+
+if __name__ == "__main__":
+    # Entry point of the detached purger started by spawn_purge
+    purge_trash(Path(sys.argv[1]), workers=int(sys.argv[2]))
@@ -0,0 +1,218 @@
+"""Staged installs: pip writes into a private directory, results are swapped into target."""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import posixpath
+import time
+from pathlib import Path
+
+from py_trkpac.db import Database
+from py_trkpac.removal import trash_path
+
+STAGING_PREFIX = ".py-trkpac-staging-"
+
+_AT_FDCWD = -100
+_RENAME_EXCHANGE = 2
+
+_renameat2 = None
+
+
+def _load_renameat2():
+    global _renameat2
+    if _renameat2 is None:
+        _renameat2 = False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            func = libc.renameat2
+        except (OSError, AttributeError):
+            return None
+        func.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+        _renameat2 = func
+    return _renameat2 or None
+
+
+def exchange(a: Path, b: Path) -> bool:
+    """Atomically swap two existing paths (renameat2 RENAME_EXCHANGE).
+
+    Returns False if the kernel, libc or filesystem doesn't support it.
+    """
+    func = _load_renameat2()
+    if func is None:
+        return False
+    if func(_AT_FDCWD, os.fsencode(a), _AT_FDCWD, os.fsencode(b), _RENAME_EXCHANGE) == 0:
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP):
+        return False
+    raise OSError(err, os.strerror(err), str(b))
+
+
+def create_staging(target_path: Path) -> Path:
+    """Create an empty staging directory inside target (same filesystem, not importable).
+
+    Staging directories left by a crashed install are moved to the trash
+    first; the caller holds the exclusive target lock, so none is in use.
+    """
+    for entry in os.scandir(target_path):
+        if entry.name.startswith(STAGING_PREFIX):
+            discard_staging(target_path, Path(entry.path))
+    staging = target_path / f"{STAGING_PREFIX}{os.getpid()}"
+    staging.mkdir()
+    return staging
+
+
+def discard_staging(target_path: Path, staging: Path) -> None:
+    """Move a staging directory (and the old entries swapped into it) to the trash."""
+    if not os.path.lexists(staging):
+        return
+    batch = trash_path(target_path) / f"{time.time_ns()}-{os.getpid()}-staging"
+    batch.parent.mkdir(exist_ok=True)
+    os.rename(staging, batch)
+
+
+def _move_into_place(staging: Path, target_path: Path, name: str) -> None:
+    """Replace target/name with staging/name in one step where the OS allows.
+
+    Directories are exchanged, so the old one ends up in staging (and is
+    purged with it); files and symlinks are replaced with rename(2). Without
+    RENAME_EXCHANGE, the old directory is moved aside first, leaving a
+    window in which the entry is missing.
+    """
+    src, dst = staging / name, target_path / name
+    if not os.path.lexists(dst):
+        os.rename(src, dst)
+        return
+    old_is_dir = dst.is_dir() and not dst.is_symlink()
+    new_is_dir = src.is_dir() and not src.is_symlink()
+    if old_is_dir and new_is_dir and exchange(src, dst):
+        return
+    if old_is_dir or new_is_dir:
+        os.rename(dst, staging / f"{name}.old")
+    os.replace(src, dst)
+
+
+def _content(record: list[tuple[str, str | None, int | None]]) -> frozenset:
+    """What a RECORD says was installed, ignoring the dist-info and compiled bytecode.
+
+    .pyc hashes change with every install, so they don't indicate a change.
+    """
+    return frozenset(
+        (path, file_hash) for path, file_hash, _ in record
+        if not path.endswith(".pyc") and ".dist-info/" not in path
+    )
+
+
+def commit_staging(
+    db: Database,
+    target_path: Path,
+    staging: Path,
+    installed: list[dict],
+) -> int:
+    """Move what pip installed into staging over the live target. Returns packages moved.
+
+    installed: metadata dicts as for record_installed, with dist_info names
+    relative to staging; meta["record"] is filled in from staging.
+
+    A package whose version and RECORD contents match the live copy is left
+    untouched. For the others, each top-level entry that no other package
+    owns anything under is swapped in whole; shared ones (bin/, namespace
+    packages) are merged file by file with rename(2), and files an older
+    version left in them are unlinked. Top-level entries only an older
+    version had are moved out whole. dist-info directories are moved
+    last, so metadata never describes code that isn't there yet, and the
+    previous version's dist-info is retired. Everything replaced ends up in
+    staging, to be discarded by the caller.
+    """
+    from py_trkpac.installer import find_dist_info, parse_record_entries
+
+    changed = []
+    unchanged_tops: set[str] = set()
+    for meta in installed:
+        if not meta.get("dist_info"):
+            continue
+        if "record" not in meta:
+            meta["record"] = parse_record_entries(staging / meta["dist_info"])
+        existing = db.get_package(meta["name"])
+        live = find_dist_info(target_path, meta["name"], db) if existing else None
+        if (
+            live is not None
+            and existing["version"] == meta["version"]
+            and _content(parse_record_entries(live)) == _content(meta["record"])
+        ):
+            unchanged_tops.update(p.split("/", 1)[0] for p, _, _ in meta["record"])
+            meta["dist_info"] = live.name
+            continue
+        changed.append((meta, existing, live))
+    if not changed:
+        return 0
+
+    changed_ids = [existing["id"] for _, existing, _ in changed if existing is not None]
+    new_paths: dict[str, list[str]] = {}
+    for meta, _, _ in changed:
+        for path, _, _ in meta["record"]:
+            top = path.split("/", 1)[0]
+            if not top.endswith(".dist-info"):
+                new_paths.setdefault(top, []).append(path)
+    old_paths = {pkg_id: db.get_package_files(pkg_id) for pkg_id in changed_ids}
+    old_tops = {
+        path.split("/", 1)[0] for paths in old_paths.values() for path in paths
+    } - new_paths.keys()
+    old_tops = {top for top in old_tops if not top.endswith(".dist-info")}
+    shared = {
+        p.split("/", 1)[0]
+        for p in db.get_files_under(sorted(new_paths.keys() | old_tops), changed_ids)
+    }
+    shared |= unchanged_tops
+
+    for top, paths in new_paths.items():
+        if top not in shared:
+            if os.path.lexists(staging / top):
+                _move_into_place(staging, target_path, top)
+            continue
+        for path in paths:
+            src = staging / path
+            if os.path.lexists(src) and not (src.is_dir() and not src.is_symlink()):
+                (target_path / path).parent.mkdir(parents=True, exist_ok=True)
+                os.replace(src, target_path / path)
+
+    # Files the previous versions had that the new ones don't. Entries
+    # swapped in whole took theirs to staging already; top-level entries
+    # only the previous versions had go there in one rename too.
+    for top in old_tops - shared:
+        if os.path.lexists(target_path / top):
+            os.rename(target_path / top, staging / f"{top}.old")
+    still_owned = db.get_shared_files(changed_ids)
+    prune: set[str] = set()
+    for meta, existing, _ in changed:
+        if existing is None:
+            continue
+        current = {path for path, _, _ in meta["record"]}
+        for path in old_paths[existing["id"]]:
+            if (
+                path.split("/", 1)[0] in shared
+                and path not in current
+                and path not in still_owned
+            ):
+                try:
+                    os.unlink(target_path / path)
+                except (FileNotFoundError, IsADirectoryError):
+                    continue
+                parent = posixpath.dirname(path)
+                while parent and parent not in prune:
+                    prune.add(parent)
+                    parent = posixpath.dirname(parent)
+    for d in sorted(prune, key=lambda p: p.count("/"), reverse=True):
+        try:
+            os.rmdir(target_path / d)
+        except OSError:
+            pass  # still holds files
+
+    for meta, _, live in changed:
+        _move_into_place(staging, target_path, meta["dist_info"])
+        if live is not None and live.name != meta["dist_info"]:
+            os.rename(live, staging / live.name)
+    return len(changed)
@@ -0,0 +1,357 @@
+"""Content-addressed file store shared by several targets (opt-in via config store_path)."""
+
+from __future__ import annotations
+
+import base64
+import errno
+import hashlib
+import json
+import os
+import sqlite3
+import stat
+import sys
+import sysconfig
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from py_trkpac.db import BUSY_TIMEOUT, Database
+from py_trkpac.utils import info, normalize_name
+
+STORE_DB_FILENAME = "store.db"
+
+STORE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS objects (
+    key      TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS refs (
+    target TEXT NOT NULL,
+    path   TEXT NOT NULL,
+    key    TEXT NOT NULL REFERENCES objects(key),
+    PRIMARY KEY (target, path)
+);
+
+CREATE INDEX IF NOT EXISTS idx_refs_key ON refs(key);
+
+CREATE TRIGGER IF NOT EXISTS refs_insert AFTER INSERT ON refs BEGIN
+    UPDATE objects SET refcount = refcount + 1 WHERE key = NEW.key;
+END;
+
+CREATE TRIGGER IF NOT EXISTS refs_delete AFTER DELETE ON refs BEGIN
+    UPDATE objects SET refcount = refcount - 1 WHERE key = OLD.key;
+END;
+
+CREATE TABLE IF NOT EXISTS dists (
+    name     TEXT NOT NULL,
+    version  TEXT NOT NULL,
+    abi      TEXT NOT NULL,
+    requires TEXT NOT NULL,
+    manifest TEXT NOT NULL,
+    PRIMARY KEY (name, version, abi)
+);
+"""
+
+
+class StoreError(Exception):
+    """The store can't be used with this target (e.g. different filesystem)."""
+
+
+def interpreter_abi() -> str:
+    """Installed files depend on the interpreter (scripts, compiled bytecode).
+
+    Scripts in bin/ carry the interpreter's path in their shebang, so two
+    venvs of the same Python don't share stored dists.
+    """
+    return f"{sys.implementation.cache_tag}-{sysconfig.get_platform()}:{sys.executable}"
+
+
+def record_key(file_hash: str | None) -> str | None:
+    """Hex sha256 from a RECORD hash ("sha256=<urlsafe base64>"), if it is one."""
+    if not file_hash:
+        return None
+    algo, _, digest = file_hash.partition("=")
+    if algo != "sha256" or not digest:
+        return None
+    try:
+        return base64.urlsafe_b64decode(digest + "=" * (-len(digest) % 4)).hex()
+    except ValueError:
+        return None
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Store:
+    """Objects are files named by their sha256 (plus ".x" if executable).
+
+    Installed files are hardlinks to objects. refs records which target
+    path uses which object; triggers keep objects.refcount in step. dists
+    keeps the manifest of every fully stored package, for link-only
+    reinstalls.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.objects_path = path / "objects"
+        self.objects_path.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path / STORE_DB_FILENAME), timeout=BUSY_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}")
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(STORE_SCHEMA_SQL)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def object_path(self, key: str) -> Path:
+        return self.objects_path / key[:2] / key
+
+    # -- Ingesting installed files --
+
+    def ingest(
+        self,
+        target_path: Path,
+        packages: list[tuple[str, str, list[str], list[tuple[str, str | None, int | None]]]],
+        workers: int | None = None,
+    ) -> tuple[int, int]:
+        """Replace packages' files in target with hardlinks to store objects.
+
+        packages: [(name, version, Requires-Dist, manifest entries)]. Files
+        already stored are replaced by a link (renamed over the original, so
+        readers never see a missing file); new ones are hashed to confirm
+        RECORD, then linked into the store. Symlinks are skipped. Packages
+        stored completely are added to dists. Returns (files deduplicated,
+        files added to the store).
+        """
+        target = str(target_path.resolve())
+        entries = []
+        for _, _, _, manifest in packages:
+            for path, file_hash, _ in manifest:
+                full = target_path / path
+                try:
+                    st = full.lstat()
+                except OSError:
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                entries.append((path, record_key(file_hash), st))
+
+        # Hash what RECORD doesn't vouch for, and every would-be new object
+        def resolve(entry):
+            path, key, st = entry
+            suffix = ".x" if st.st_mode & 0o111 else ""
+            if key is not None and self.object_path(key + suffix).exists():
+                return path, key + suffix, st
+            actual = _sha256_file(str(target_path / path))
+            if key is not None and actual != key:
+                return path, None, st  # file differs from RECORD: leave it alone
+            return path, actual + suffix, st
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            resolved = [r for r in pool.map(resolve, entries) if r[1] is not None]
+
+        linked = added = 0
+        keys: dict[str, str] = {}
+        for path, key, st in resolved:
+            obj = self.object_path(key)
+            full = target_path / path
+            try:
+                obj_st = obj.stat()
+            except FileNotFoundError:
+                obj.parent.mkdir(exist_ok=True)
+                try:
+                    os.link(full, obj)
+                    added += 1
+                except FileExistsError:
+                    obj_st = obj.stat()  # stored concurrently by another target
+                except OSError as e:
+                    if e.errno == errno.EXDEV:
+                        raise StoreError(
+                            f"store {self.path} is not on the same filesystem as {target_path}"
+                        ) from e
+                    raise
+                else:
+                    keys[path] = key
+                    continue
+            if obj_st.st_ino != st.st_ino:
+                tmp = full.with_name(f".{full.name}.py-trkpac-link")
+                os.link(obj, tmp)
+                os.replace(tmp, full)
+                linked += 1
+            keys[path] = key
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO objects (key, size) VALUES (?, ?)",
+                [(key, st.st_size) for (path, key, st) in resolved if path in keys],
+            )
+            self.conn.executemany(
+                "DELETE FROM refs WHERE target = ? AND path = ?",
+                [(target, path) for path in keys],
+            )
+            self.conn.executemany(
+                "INSERT INTO refs (target, path, key) VALUES (?, ?, ?)",
+                [(target, path, key) for path, key in keys.items()],
+            )
+            abi = interpreter_abi()
+            for name, version, requires, manifest in packages:
+                paths = [path for path, _, _ in manifest]
+                if paths and all(path in keys for path in paths):
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO dists (name, version, abi, requires, manifest) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (normalize_name(name), version, abi, json.dumps(requires),
+                         json.dumps([[p, keys[p]] for p in paths])),
+                    )
+        return linked, added
+
+    def release(self, target_path: Path, paths: list[str]) -> None:
+        """Drop a target's references, e.g. for files of a removed package."""
+        target = str(target_path.resolve())
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM refs WHERE target = ? AND path = ?",
+                [(target, path) for path in paths],
+            )
+
+    # -- Link-only installs --
+
+    def get_dist(self, name: str, version: str) -> tuple[list[str], list[tuple[str, str]]] | None:
+        """(Requires-Dist, [(path, key)]) of a stored package built for this interpreter.
+
+        None unless every object is still present.
+        """
+        row = self.conn.execute(
+            "SELECT requires, manifest FROM dists WHERE name = ? AND version = ? AND abi = ?",
+            (normalize_name(name), version, interpreter_abi()),
+        ).fetchone()
+        if row is None:
+            return None
+        manifest = [tuple(entry) for entry in json.loads(row["manifest"])]
+        if not all(self.object_path(key).exists() for _, key in manifest):
+            return None
+        return json.loads(row["requires"]), manifest
+
+    def link_dist(self, target_path: Path, manifest: list[tuple[str, str]]) -> None:
+        """Materialize a stored package in target using links only."""
+        target = str(target_path.resolve())
+        for path, key in manifest:
+            full = target_path / path
+            full.parent.mkdir(parents=True, exist_ok=True)
+            tmp = full.with_name(f".{full.name}.py-trkpac-link")
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            os.link(self.object_path(key), tmp)
+            os.replace(tmp, full)
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM refs WHERE target = ? AND path = ?",
+                [(target, path) for path, _ in manifest],
+            )
+            self.conn.executemany(
+                "INSERT INTO refs (target, path, key) VALUES (?, ?, ?)",
+                [(target, path, key) for path, key in manifest],
+            )
+
+    # -- Maintenance --
+
+    def stats(self) -> sqlite3.Row:
+        return self.conn.execute(
+            "SELECT COUNT(*) AS objects, COALESCE(SUM(size), 0) AS bytes, "
+            "(SELECT COUNT(*) FROM refs) AS refs, "
+            "(SELECT COUNT(DISTINCT target) FROM refs) AS targets, "
+            "(SELECT COUNT(*) FROM dists) AS dists FROM objects"
+        ).fetchone()
+
+    def gc(self) -> tuple[int, int]:
+        """Delete unreferenced objects. Returns (objects deleted, bytes freed).
+
+        References are first checked against the filesystem: a ref whose
+        target file is gone or no longer the object's inode (pip replaced
+        it, a target was deleted) is dropped. An object with no refs is
+        deleted only if nothing else links to it (st_nlink == 1), so files
+        kept alive by generations or untracked targets survive.
+        """
+        stale = []
+        for row in self.conn.execute("SELECT target, path, key FROM refs"):
+            try:
+                same = os.path.samestat(
+                    os.lstat(os.path.join(row["target"], row["path"])),
+                    os.stat(self.object_path(row["key"])),
+                )
+            except OSError:
+                same = False
+            if not same:
+                stale.append((row["target"], row["path"]))
+        with self.conn:
+            self.conn.executemany("DELETE FROM refs WHERE target = ? AND path = ?", stale)
+
+        deleted = freed = 0
+        gone = []
+        for row in self.conn.execute("SELECT key, size FROM objects WHERE refcount <= 0"):
+            obj = self.object_path(row["key"])
+            try:
+                if obj.stat().st_nlink > 1:
+                    continue
+                obj.unlink()
+            except FileNotFoundError:
+                pass
+            gone.append((row["key"],))
+            deleted += 1
+            freed += row["size"]
+        with self.conn:
+            self.conn.executemany("DELETE FROM objects WHERE key = ?", gone)
+            # A dist whose objects are gone can no longer be linked
+            self.conn.execute(
+                "DELETE FROM dists WHERE EXISTS (SELECT 1 FROM json_each(dists.manifest) m "
+                "WHERE json_extract(m.value, '$[1]') NOT IN (SELECT key FROM objects))"
+            )
+        return deleted, freed
+
+
+def open_store(db: Database) -> Store | None:
+    """The store configured for this target (config store_path), or None."""
+    path = db.get_config("store_path")
+    return Store(Path(path).expanduser()) if path else None
+
+
+def store_installed(db: Database, target_path: Path, installed: list[dict]) -> None:
+    """Deduplicate freshly installed packages into the store, if one is configured."""
+    store = open_store(db)
+    if store is None:
+        return
+    from py_trkpac.installer import parse_record_entries
+
+    packages = [
+        (meta["name"], meta["version"], meta.get("requires_dist", []),
+         meta["record"] if "record" in meta
+         else parse_record_entries(target_path / meta["dist_info"]))
+        for meta in installed
+        if meta.get("dist_info")
+    ]
+    try:
+        linked, added = store.ingest(target_path, packages)
+    except StoreError as e:
+        info(f"Warning: {e}; files were not stored.")
+        return
+    finally:
+        store.close()
+    info(f"Store: {linked} file(s) deduplicated, {added} added.")
+
+
+def release_files(db: Database, target_path: Path, paths: list[str]) -> None:
+    """Drop the store's references to files removed from target, if a store is configured."""
+    store = open_store(db)
+    if store is None:
+        return
+    try:
+        store.release(target_path, paths)
+    finally:
+        store.close()
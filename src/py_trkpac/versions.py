@@ -0,0 +1,469 @@
+"""PEP 440 versions and specifiers, PEP 508 requirements and markers (stdlib only)."""
+
+from __future__ import annotations
+
+import os
+import platform
+import re
+import sys
+
+_VERSION_PATTERN = re.compile(
+    r"""
+    ^\s*v?
+    (?:(?P<epoch>\d+)!)?
+    (?P<release>\d+(?:\.\d+)*)
+    (?P<pre>[-_.]?(?P<pre_l>a|b|c|rc|alpha|beta|pre|preview)[-_.]?(?P<pre_n>\d+)?)?
+    (?P<post>(?:-(?P<post_n1>\d+))|(?:[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>\d+)?))?
+    (?P<dev>[-_.]?dev[-_.]?(?P<dev_n>\d+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    \s*$
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+
+_PRE_ALIASES = {"alpha": "a", "beta": "b", "c": "rc", "pre": "rc", "preview": "rc"}
+
+
+class InvalidVersion(ValueError):
+    """Raised when a string is not a valid PEP 440 version."""
+
+
+class Version:
+    """A parsed PEP 440 version that compares and hashes by PEP 440 rules."""
+
+    __slots__ = ("epoch", "release", "pre", "post", "dev", "local", "_key")
+
+    def __init__(self, version: str) -> None:
+        match = _VERSION_PATTERN.match(version)
+        if not match:
+            raise InvalidVersion(f"Invalid version: {version!r}")
+
+        self.epoch = int(match.group("epoch") or 0)
+        self.release = tuple(int(p) for p in match.group("release").split("."))
+        self.pre = None
+        if match.group("pre"):
+            label = match.group("pre_l").lower()
+            self.pre = (_PRE_ALIASES.get(label, label), int(match.group("pre_n") or 0))
+        self.post = None
+        if match.group("post"):
+            self.post = int(match.group("post_n1") or match.group("post_n2") or 0)
+        self.dev = None
+        if match.group("dev"):
+            self.dev = int(match.group("dev_n") or 0)
+        self.local = None
+        if match.group("local"):
+            self.local = tuple(
+                int(p) if p.isdigit() else p.lower()
+                for p in re.split(r"[-_.]", match.group("local"))
+            )
+        self._key = self._cmpkey()
+
+    def _cmpkey(self) -> tuple:
+        # Trailing zeros are insignificant: 1.0 == 1.0.0
+        release = list(self.release)
+        while len(release) > 1 and release[-1] == 0:
+            release.pop()
+
+        # Each segment is keyed as (rank, value...) so absent segments sort
+        # correctly without comparing mismatched types.
+        # A dev release without pre/post sorts before any pre-release.
+        if self.pre is None and self.post is None and self.dev is not None:
+            pre = (0, "", 0)
+        elif self.pre is None:
+            pre = (2, "", 0)
+        else:
+            pre = (1, *self.pre)
+        post = (0, 0) if self.post is None else (1, self.post)
+        dev = (1, 0) if self.dev is None else (0, self.dev)
+        if self.local is None:
+            local = ()
+        else:
+            # Numeric segments sort above alphanumeric ones
+            local = tuple((1, p, "") if isinstance(p, int) else (0, 0, p) for p in self.local)
+        return (self.epoch, tuple(release), pre, post, dev, local)
+
+    @property
+    def public(self) -> str:
+        """The version without its local segment."""
+        return str(self).split("+", 1)[0]
+
+    @property
+    def is_prerelease(self) -> bool:
+        return self.pre is not None or self.dev is not None
+
+    def __str__(self) -> str:
+        parts = []
+        if self.epoch:
+            parts.append(f"{self.epoch}!")
+        parts.append(".".join(str(p) for p in self.release))
+        if self.pre is not None:
+            parts.append(f"{self.pre[0]}{self.pre[1]}")
+        if self.post is not None:
+            parts.append(f".post{self.post}")
+        if self.dev is not None:
+            parts.append(f".dev{self.dev}")
+        if self.local is not None:
+            parts.append("+" + ".".join(str(p) for p in self.local))
+        return "".join(parts)
+
+    def __repr__(self) -> str:
+        return f"<Version({str(self)!r})>"
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key == other._key
+
+    def __lt__(self, other: Version) -> bool:
+        return self._key < other._key
+
+    def __le__(self, other: Version) -> bool:
+        return self._key <= other._key
+
+    def __gt__(self, other: Version) -> bool:
+        return self._key > other._key
+
+    def __ge__(self, other: Version) -> bool:
+        return self._key >= other._key
+
+
+def parse_version(version: str) -> Version | None:
+    """Parse a version string, returning None if it is not valid PEP 440."""
+    try:
+        return Version(version)
+    except InvalidVersion:
+        return None
+
+
+def compare_versions(a: str, b: str) -> int:
+    """Return -1, 0 or 1 comparing two version strings.
+
+    Falls back to plain string comparison when either is not valid PEP 440.
+    """
+    va, vb = parse_version(a), parse_version(b)
+    if va is None or vb is None:
+        return (a > b) - (a < b)
+    return (va > vb) - (va < vb)
+
+
+# -- Specifiers --
+
+_SPECIFIER_PATTERN = re.compile(r"^\s*(===|~=|==|!=|<=|>=|<|>)\s*([^\s,;]+)\s*$")
+
+
+class InvalidSpecifier(ValueError):
+    """Raised when a string is not a valid PEP 440 version specifier."""
+
+
+class Specifier:
+    """A single version clause such as ">=2.31" or "==1.4.*"."""
+
+    __slots__ = ("operator", "version")
+
+    def __init__(self, spec: str) -> None:
+        match = _SPECIFIER_PATTERN.match(spec)
+        if not match:
+            raise InvalidSpecifier(f"Invalid specifier: {spec!r}")
+        self.operator, self.version = match.groups()
+        if self.operator != "===":
+            base = self.version[:-2] if self.version.endswith(".*") else self.version
+            if self.version.endswith(".*") and self.operator not in ("==", "!="):
+                raise InvalidSpecifier(f"Wildcard not allowed with {self.operator}: {spec!r}")
+            if parse_version(base) is None:
+                raise InvalidSpecifier(f"Invalid specifier: {spec!r}")
+
+    def __str__(self) -> str:
+        return f"{self.operator}{self.version}"
+
+    def contains(self, version: str) -> bool:
+        """True if version satisfies this clause. Pre-releases are allowed."""
+        if self.operator == "===":
+            return version.strip().lower() == self.version.lower()
+        candidate = parse_version(version)
+        if candidate is None:
+            return False
+        if self.operator == "==":
+            return self._equal(candidate)
+        if self.operator == "!=":
+            return not self._equal(candidate)
+
+        spec = Version(self.version)
+        public = Version(candidate.public)
+        if self.operator == "~=":
+            prefix = ".".join(str(p) for p in spec.release[:-1])
+            return public >= spec and _release_prefix_match(candidate, prefix)
+        if self.operator == ">=":
+            return public >= spec
+        if self.operator == "<=":
+            return public <= spec
+        if self.operator == "<":
+            # <3.0 excludes pre-releases of 3.0 unless the spec is itself one
+            if not public < spec:
+                return False
+            return spec.is_prerelease or not (
+                public.is_prerelease and _base_release(public) == _base_release(spec)
+            )
+        # ">": >1.0 excludes post-releases of 1.0 unless the spec is itself one
+        if not public > spec:
+            return False
+        return spec.post is not None or not (
+            public.post is not None and _base_release(public) == _base_release(spec)
+        )
+
+    def _equal(self, candidate: Version) -> bool:
+        if self.version.endswith(".*"):
+            return _release_prefix_match(candidate, self.version[:-2])
+        spec = Version(self.version)
+        if spec.local is None:
+            return Version(candidate.public) == spec
+        return candidate == spec
+
+
+def _base_release(version: Version) -> tuple:
+    release = list(version.release)
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+    return (version.epoch, tuple(release))
+
+
+def _release_prefix_match(candidate: Version, prefix: str) -> bool:
+    """True if candidate's public version matches prefix padded with zeros ("1.4" ~ 1.4.x)."""
+    spec = Version(prefix)
+    if spec.epoch != candidate.epoch:
+        return False
+    n = len(spec.release)
+    release = candidate.release + (0,) * max(0, n - len(candidate.release))
+    if release[:n] != spec.release:
+        return False
+    # A prefix with a pre/post/dev part must match it exactly
+    if spec.pre is not None or spec.post is not None or spec.dev is not None:
+        return (candidate.pre, candidate.post, candidate.dev) == (spec.pre, spec.post, spec.dev)
+    return True
+
+
+class SpecifierSet:
+    """A comma-separated set of clauses; a version must satisfy all of them."""
+
+    __slots__ = ("specifiers",)
+
+    def __init__(self, specs: str = "") -> None:
+        self.specifiers = [Specifier(s) for s in specs.split(",") if s.strip()]
+
+    def __str__(self) -> str:
+        return ",".join(str(s) for s in self.specifiers)
+
+    def __bool__(self) -> bool:
+        return bool(self.specifiers)
+
+    def contains(self, version: str) -> bool:
+        return all(s.contains(version) for s in self.specifiers)
+
+
+# -- Requirements --
+
+_REQUIREMENT_PATTERN = re.compile(
+    r"""
+    ^\s*(?P<name>[A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)
+    \s*(?:\[(?P<extras>[^\]]*)\])?
+    \s*(?:\((?P<paren>[^)]*)\)|(?P<specs>[<>=!~][^;]*))?
+    \s*(?:;(?P<marker>.*))?$
+    """,
+    re.VERBOSE,
+)
+
+
+class Requirement:
+    """A parsed PEP 508 requirement like "requests[socks]>=2.31; python_version<'3.14'"."""
+
+    __slots__ = ("name", "extras", "specifier", "marker")
+
+    def __init__(self, name: str, extras: list[str], specifier: SpecifierSet, marker: str | None) -> None:
+        self.name = name
+        self.extras = extras
+        self.specifier = specifier
+        self.marker = marker
+
+    def __str__(self) -> str:
+        extras = f"[{','.join(self.extras)}]" if self.extras else ""
+        marker = f"; {self.marker}" if self.marker else ""
+        return f"{self.name}{extras}{self.specifier}{marker}"
+
+
+def parse_requirement(text: str) -> Requirement | None:
+    """Parse a requirement string. Returns None for paths, URLs and invalid input."""
+    if "@" in text.split(";", 1)[0]:
+        return None  # direct reference (name @ url)
+    match = _REQUIREMENT_PATTERN.match(text)
+    if not match:
+        return None
+    extras = [e.strip() for e in (match.group("extras") or "").split(",") if e.strip()]
+    try:
+        specifier = SpecifierSet(match.group("paren") or match.group("specs") or "")
+    except InvalidSpecifier:
+        return None
+    marker = (match.group("marker") or "").strip() or None
+    return Requirement(match.group("name"), extras, specifier, marker)
+
+
+# -- Environment markers --
+
+class InvalidMarker(ValueError):
+    """Raised when a string is not a valid PEP 508 environment marker."""
+
+
+_MARKER_TOKEN = re.compile(
+    r"""
+    \s*(?:
+        (?P<paren>[()])
+      | (?P<op>===|==|!=|<=|>=|~=|<|>|not\s+in\b|in\b)
+      | (?P<bool>and\b|or\b)
+      | (?P<string>'[^']*'|"[^"]*")
+      | (?P<var>[A-Za-z_][A-Za-z0-9_.]*)
+    )
+    """,
+    re.VERBOSE,
+)
+
+# Variables compared as versions when both sides parse as one
+_VERSION_VARIABLES = {"python_version", "python_full_version", "implementation_version"}
+
+
+def default_environment() -> dict[str, str]:
+    """Marker variables for the running interpreter."""
+    impl = sys.implementation
+    iv = impl.version
+    implementation_version = f"{iv.major}.{iv.minor}.{iv.micro}"
+    if iv.releaselevel != "final":
+        implementation_version += iv.releaselevel[0] + str(iv.serial)
+    return {
+        "implementation_name": impl.name,
+        "implementation_version": implementation_version,
+        "os_name": os.name,
+        "platform_machine": platform.machine(),
+        "platform_release": platform.release(),
+        "platform_system": platform.system(),
+        "platform_version": platform.version(),
+        "python_full_version": platform.python_version(),
+        "platform_python_implementation": platform.python_implementation(),
+        "python_version": ".".join(platform.python_version_tuple()[:2]),
+        "sys_platform": sys.platform,
+    }
+
+
+def _tokenize_marker(marker: str) -> list[tuple[str, str]]:
+    tokens = []
+    pos = 0
+    marker = marker.rstrip()
+    while pos < len(marker):
+        match = _MARKER_TOKEN.match(marker, pos)
+        if not match or match.end() == pos:
+            raise InvalidMarker(f"Invalid marker: {marker!r}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+def _compare_marker(lhs: tuple[str, str], op: str, rhs: tuple[str, str], env: dict) -> bool:
+    def value(token: tuple[str, str]) -> str:
+        kind, text = token
+        if kind == "string":
+            return text[1:-1]
+        if text not in env:
+            raise InvalidMarker(f"Unknown marker variable: {text!r}")
+        return env[text]
+
+    left, right = value(lhs), value(rhs)
+    op = " ".join(op.split())
+    if "extra" in (lhs[1], rhs[1]):
+        # extra names compare normalized (PEP 685)
+        left, right = _normalize_extra(left), _normalize_extra(right)
+    if op == "in":
+        return left in right
+    if op == "not in":
+        return left not in right
+    if {lhs[1], rhs[1]} & _VERSION_VARIABLES and parse_version(left) is not None:
+        try:
+            return Specifier(f"{op}{right}").contains(left)
+        except InvalidSpecifier:
+            pass
+    if op == "==":
+        return left == right
+    if op == "!=":
+        return left != right
+    if op == "===":
+        return left == right
+    raise InvalidMarker(f"Can't compare {left!r} {op} {right!r}")
+
+
+def _normalize_extra(name: str) -> str:
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+def evaluate_marker(marker: str, environment: dict[str, str] | None = None,
+                    extras: list[str] | tuple[str, ...] = ()) -> bool:
+    """Evaluate a PEP 508 marker such as "python_version < '3.11' and extra == 'socks'".
+
+    environment defaults to the running interpreter's. A marker mentioning
+    extra is true if it holds for any of the requested extras (or for
+    none, when no extras were requested). Raises InvalidMarker.
+    """
+    env = dict(environment if environment is not None else default_environment())
+    tokens = _tokenize_marker(marker)
+    pos = 0
+
+    def expect_value() -> tuple[str, str]:
+        nonlocal pos
+        if pos >= len(tokens) or tokens[pos][0] not in ("string", "var"):
+            raise InvalidMarker(f"Invalid marker: {marker!r}")
+        pos += 1
+        return tokens[pos - 1]
+
+    def atom() -> bool:
+        nonlocal pos
+        if pos < len(tokens) and tokens[pos] == ("paren", "("):
+            pos += 1
+            result = disjunction()
+            if pos >= len(tokens) or tokens[pos] != ("paren", ")"):
+                raise InvalidMarker(f"Unbalanced parentheses in marker: {marker!r}")
+            pos += 1
+            return result
+        lhs = expect_value()
+        if pos >= len(tokens) or tokens[pos][0] != "op":
+            raise InvalidMarker(f"Invalid marker: {marker!r}")
+        op = tokens[pos][1]
+        pos += 1
+        return _compare_marker(lhs, op, expect_value(), env)
+
+    def conjunction() -> bool:
+        nonlocal pos
+        result = atom()
+        while pos < len(tokens) and tokens[pos] == ("bool", "and"):
+            pos += 1
+            result = atom() and result
+        return result
+
+    def disjunction() -> bool:
+        nonlocal pos
+        result = conjunction()
+        while pos < len(tokens) and tokens[pos] == ("bool", "or"):
+            pos += 1
+            result = conjunction() or result
+        return result
+
+    def evaluate() -> bool:
+        nonlocal pos
+        pos = 0
+        result = disjunction()
+        if pos != len(tokens):
+            raise InvalidMarker(f"Invalid marker: {marker!r}")
+        return result
+
+    for extra in extras or [""]:
+        env["extra"] = extra
+        if evaluate():
+            return True
+    return False
@@ -0,0 +1,208 @@
+"""inotify-based observation of the target: around installs, and as a drift watcher."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from py_trkpac import inotify
+
+_INSTALL_MASK = (
+    inotify.IN_CREATE | inotify.IN_MOVED_TO | inotify.IN_CLOSE_WRITE
+    | inotify.IN_MODIFY | inotify.IN_DELETE | inotify.IN_MOVED_FROM
+)
+
+
+class InstallObservation:
+    """What an InstallWatcher saw.
+
+    files: paths (relative to target) created or modified during the watch.
+    dist_infos: {dist-info dir name: parse result} for dist-infos that appeared.
+    overflowed: the kernel queue overflowed, so files may be incomplete.
+    """
+
+    __slots__ = ("files", "dist_infos", "overflowed")
+
+    def __init__(self, files: set[str], dist_infos: dict[str, object], overflowed: bool) -> None:
+        self.files = files
+        self.dist_infos = dist_infos
+        self.overflowed = overflowed
+
+
+class InstallWatcher:
+    """Record every file written under target while a subprocess runs.
+
+    The target root is watched, and every directory created or moved into
+    it is watched recursively from the moment it appears (and walked, so
+    files written before the watch was added are not missed). Existing
+    subdirectories are not watched: pip --target never writes into them, it
+    moves whole top-level entries into place.
+
+    Each .dist-info moved into the top level is handed to parse() on a
+    thread pool right away, so metadata parsing overlaps with the install.
+    One that is created instead is still being filled (shutil.move falls
+    back to copytree across filesystems, so RECORD may be missing or
+    partial); it is parsed in stop(), once the installer has exited, as is
+    any dist-info whose files change after it was handed to parse().
+    """
+
+    def __init__(
+        self,
+        target_path: Path,
+        parse: Callable[[Path], object],
+        workers: int = 4,
+    ) -> None:
+        self.target_path = target_path
+        self._parse = parse
+        self._ino = inotify.Inotify()
+        self._wd_paths: dict[int, str] = {}
+        self._files: set[str] = set()
+        self._futures: dict[str, Future] = {}
+        self._incomplete: set[str] = set()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._overflowed = False
+        self._stop = threading.Event()
+        self._watch_dir("")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @classmethod
+    def start_if_available(
+        cls, target_path: Path, parse: Callable[[Path], object]
+    ) -> InstallWatcher | None:
+        """Start a watcher, or return None where inotify isn't usable."""
+        if not inotify.available():
+            return None
+        try:
+            watcher = cls(target_path, parse)
+        except OSError:
+            return None
+        watcher._thread.start()
+        return watcher
+
+    def _watch_dir(self, rel: str) -> None:
+        try:
+            wd = self._ino.add_watch(self.target_path / rel, _INSTALL_MASK | inotify.IN_ONLYDIR)
+        except OSError:
+            return  # vanished, or out of watches; the walk below still sees files
+        self._wd_paths[wd] = rel
+
+    def _adopt_dir(self, rel: str) -> None:
+        """Watch a newly appeared directory tree and record the files already in it."""
+        for root, dirs, files in os.walk(self.target_path / rel):
+            root_rel = os.path.relpath(root, self.target_path)
+            self._watch_dir(root_rel)
+            for name in files:
+                self._files.add(os.path.join(root_rel, name))
+
+    def _handle(self, event: inotify.Event) -> None:
+        if event.mask & inotify.IN_Q_OVERFLOW:
+            self._overflowed = True
+            return
+        parent = self._wd_paths.get(event.wd)
+        if parent is None or not event.name:
+            return
+        rel = os.path.join(parent, event.name) if parent else event.name
+
+        top = rel.split(os.sep, 1)[0]
+        if parent and top.endswith(".dist-info"):
+            # Written into after it appeared: whatever was parsed is stale
+            self._futures.pop(top, None)
+            self._incomplete.add(top)
+
+        if event.mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+            self._files.discard(rel)
+        elif event.is_dir and event.mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+            self._adopt_dir(rel)
+            if not parent and rel.endswith(".dist-info"):
+                if event.mask & inotify.IN_MOVED_TO:
+                    self._futures[rel] = self._pool.submit(self._parse, self.target_path / rel)
+                    self._incomplete.discard(rel)
+                else:
+                    self._futures.pop(rel, None)
+                    self._incomplete.add(rel)
+        elif not event.is_dir:
+            self._files.add(rel)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            for event in self._ino.read(timeout=0.1):
+                self._handle(event)
+
+    def stop(self) -> InstallObservation:
+        """Stop watching, drain pending events and collect the parse results."""
+        self._stop.set()
+        self._thread.join()
+        while events := self._ino.read(timeout=0):
+            for event in events:
+                self._handle(event)
+        self._ino.close()
+
+        for name in self._incomplete:
+            if (self.target_path / name).is_dir():
+                self._futures[name] = self._pool.submit(self._parse, self.target_path / name)
+        dist_infos = {name: future.result() for name, future in self._futures.items()}
+        self._pool.shutdown()
+        files = {f for f in self._files if os.path.lexists(self.target_path / f)}
+        return InstallObservation(files, dist_infos, self._overflowed)
+
+
+# -- Drift watcher (long-running `py-trkpac watch`) --
+
+_DRIFT_MASK = (
+    inotify.IN_CREATE | inotify.IN_MOVED_TO | inotify.IN_DELETE
+    | inotify.IN_MOVED_FROM | inotify.IN_ONLYDIR
+)
+
+
+def watch_dist_infos(
+    target_path: Path,
+    on_change: Callable[[set[str] | None, set[str] | None], None],
+    debounce: float = 2.0,
+    max_delay: float = 30.0,
+    stop: threading.Event | None = None,
+) -> None:
+    """Watch target's top level and report .dist-info changes in debounced batches.
+
+    on_change(added, removed) receives dist-info dir names once no event has
+    arrived for `debounce` seconds (or after `max_delay` during a continuous
+    burst). If the kernel queue overflowed, both are None: the caller has to
+    rescan. Runs until stop is set (or forever).
+    """
+    with inotify.Inotify() as ino:
+        ino.add_watch(target_path, _DRIFT_MASK)
+        added: set[str] = set()
+        removed: set[str] = set()
+        overflowed = False
+        first_event = None
+
+        while stop is None or not stop.is_set():
+            pending = overflowed or added or removed
+            events = ino.read(timeout=debounce if pending else 1.0)
+            now = time.monotonic()
+            if pending and (not events or now - first_event >= max_delay):
+                if overflowed:
+                    on_change(None, None)
+                else:
+                    on_change(added, removed)
+                added, removed, overflowed, first_event = set(), set(), False, None
+                if not events:
+                    continue
+
+            for event in events:
+                if event.mask & inotify.IN_Q_OVERFLOW:
+                    overflowed = True
+                elif event.is_dir and event.name.endswith(".dist-info"):
+                    if event.mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+                        added.add(event.name)
+                        removed.discard(event.name)
+                    else:
+                        removed.add(event.name)
+                        added.discard(event.name)
+                else:
+                    continue
+                if first_event is None:
+                    first_event = now
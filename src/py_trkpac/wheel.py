@@ -0,0 +1,503 @@
+"""In-process installer for local wheel files: no pip subprocess, parallel extraction."""
+
+from __future__ import annotations
+
+import base64
+import configparser
+import csv
+import functools
+import hashlib
+import importlib.util
+import io
+import os
+import platform
+import posixpath
+import py_compile
+import re
+import shutil
+import sys
+import sysconfig
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from py_trkpac.db import Database
+from py_trkpac.metadata import parse_metadata_headers
+from py_trkpac.staging import STAGING_PREFIX
+from py_trkpac.utils import normalize_name
+from py_trkpac.versions import (
+    InvalidMarker, InvalidSpecifier, SpecifierSet, evaluate_marker, parse_requirement,
+)
+
+INSTALLER_NAME = "py-trkpac"
+
+_WHEEL_FILENAME = re.compile(
+    r"^(?P<name>[^-]+)-(?P<version>[^-]+)(?:-(?P<build>\d[^-]*))?"
+    r"-(?P<py>[^-]+)-(?P<abi>[^-]+)-(?P<plat>[^-]+)\.whl$"
+)
+
+# .data/<scheme>/ subdirectories and where pip --target puts them
+_SCHEME_DIRS = {"purelib": "", "platlib": "", "data": "", "scripts": "bin/"}
+
+_SCRIPT_TEMPLATE = """\
+#!{python}
+# -*- coding: utf-8 -*-
+import re
+import sys
+from {module} import {head}
+if __name__ == "__main__":
+    sys.argv[0] = re.sub(r"(-script\\.pyw|\\.exe)?$", "", sys.argv[0])
+    sys.exit({call}())
+"""
+
+
+class WheelError(Exception):
+    """A wheel is malformed, or its contents don't match its RECORD."""
+
+
+# -- Compatibility tags --
+
+def parse_wheel_filename(filename: str) -> tuple[str, str, frozenset[str]] | None:
+    """("requests", "2.32.3", {"py3-none-any"}) from a wheel file name, or None."""
+    match = _WHEEL_FILENAME.match(filename)
+    if not match:
+        return None
+    tags = frozenset(
+        f"{py}-{abi}-{plat}"
+        for py in match.group("py").split(".")
+        for abi in match.group("abi").split(".")
+        for plat in match.group("plat").split(".")
+    )
+    return match.group("name"), match.group("version"), tags
+
+
+def _platforms() -> list[str]:
+    plat = sysconfig.get_platform().replace("-", "_").replace(".", "_")
+    platforms = [plat]
+    if plat.startswith("linux_"):
+        arch = plat[len("linux_"):]
+        if arch == "x86_64" and sys.maxsize <= 2**32:
+            arch = "i686"  # 32-bit interpreter on a 64-bit kernel
+        platforms = [f"linux_{arch}"]
+        libc = os.confstr("CS_GNU_LIBC_VERSION") if hasattr(os, "confstr") else None
+        if libc and libc.startswith("glibc "):
+            glibc_minor = int(libc.split()[1].split(".")[1])
+            legacy = {17: "manylinux2014", 12: "manylinux2010", 5: "manylinux1"}
+            for minor in range(glibc_minor, 4, -1):
+                platforms.append(f"manylinux_2_{minor}_{arch}")
+                if minor in legacy:
+                    platforms.append(f"{legacy[minor]}_{arch}")
+    elif plat.startswith("macosx_"):
+        release, _, machine = platform.mac_ver()
+        major, minor = (int(p) for p in (release.split(".") + ["0"])[:2])
+        archs = [machine, "universal2"] if machine in ("arm64", "x86_64") else [machine]
+        versions = [(m, 0) for m in range(major, 10, -1)] + [(10, m) for m in range(
+            minor if major == 10 else 16, -1, -1)]
+        platforms = [f"macosx_{a}_{b}_{arch}" for a, b in versions for arch in archs]
+    return platforms
+
+
+@functools.lru_cache(maxsize=None)
+def supported_tags() -> frozenset[str]:
+    """Wheel tags the running interpreter can install, like pip's compatibility check."""
+    major, minor = sys.version_info[:2]
+    impl = {"cpython": "cp", "pypy": "pp"}.get(sys.implementation.name, sys.implementation.name)
+    interp = f"{impl}{major}{minor}"
+    platforms = _platforms()
+    tags = set()
+    if impl == "cp":
+        threaded = "t" if sysconfig.get_config_var("Py_GIL_DISABLED") else ""
+        tags.update(f"{interp}-{interp}{threaded}-{p}" for p in platforms)
+        if not threaded:
+            tags.update(f"cp{major}{m}-abi3-{p}" for m in range(2, minor + 1) for p in platforms)
+    else:
+        soabi = (sysconfig.get_config_var("SOABI") or "").split("-")
+        if len(soabi) > 1:
+            abi = f"{soabi[0]}_{soabi[1]}".replace(".", "_").replace("-", "_")
+            tags.update(f"{interp}-{abi}-{p}" for p in platforms)
+    pythons = [interp, f"py{major}"] + [f"py{major}{m}" for m in range(minor, -1, -1)]
+    for p in platforms + ["any"]:
+        tags.update(f"{py}-none-{p}" for py in pythons)
+    return frozenset(tags)
+
+
+# -- Reading wheels --
+
+class WheelInfo:
+    """What a wheel declares, read from its central directory and dist-info.
+
+    record: {archive member: RECORD hash or None}.
+    entry_points: the raw entry_points.txt, "" if there is none.
+    """
+
+    __slots__ = ("path", "name", "version", "dist_info", "requires_dist",
+                 "requires_python", "record", "entry_points")
+
+    def __init__(
+        self,
+        path: Path,
+        name: str,
+        version: str,
+        dist_info: str,
+        requires_dist: list[str],
+        requires_python: str | None,
+        record: dict[str, str | None],
+        entry_points: str = "",
+    ) -> None:
+        self.path = path
+        self.name = name
+        self.version = version
+        self.dist_info = dist_info
+        self.requires_dist = requires_dist
+        self.requires_python = requires_python
+        self.record = record
+        self.entry_points = entry_points
+
+
+def read_wheel(path: Path) -> WheelInfo:
+    """Read a wheel's metadata without extracting anything. Raises WheelError."""
+    parsed = parse_wheel_filename(path.name)
+    if parsed is None:
+        raise WheelError(f"{path.name} is not a valid wheel file name")
+    try:
+        with zipfile.ZipFile(path) as zf:
+            names = zf.namelist()
+            prefix = normalize_name(parsed[0])
+            dist_infos = {
+                n.split("/", 1)[0] for n in names
+                if n.split("/", 1)[0].endswith(".dist-info") and n.endswith("/WHEEL")
+            }
+            matching = [
+                d for d in dist_infos
+                if normalize_name(d[: -len(".dist-info")].rsplit("-", 1)[0]) == prefix
+            ]
+            if len(matching) != 1:
+                raise WheelError(f"{path.name} has no single .dist-info for {parsed[0]}")
+            dist_info = matching[0]
+
+            wheel = dict(parse_metadata_headers(
+                io.TextIOWrapper(zf.open(f"{dist_info}/WHEEL"), encoding="utf-8")))
+            if not wheel.get("Wheel-Version", "").startswith("1."):
+                raise WheelError(f"{path.name}: unsupported Wheel-Version {wheel.get('Wheel-Version')}")
+
+            headers = parse_metadata_headers(
+                io.TextIOWrapper(zf.open(f"{dist_info}/METADATA"), encoding="utf-8", errors="replace"))
+            with zf.open(f"{dist_info}/RECORD") as f:
+                rows = list(csv.reader(io.TextIOWrapper(f, encoding="utf-8", newline="")))
+            entry_points = ""
+            if f"{dist_info}/entry_points.txt" in names:
+                entry_points = zf.read(f"{dist_info}/entry_points.txt").decode("utf-8")
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        raise WheelError(f"{path.name}: {e}") from e
+
+    meta = {"name": parsed[0], "version": parsed[1], "requires_dist": [], "requires_python": None}
+    for key, value in headers:
+        key = key.lower()
+        if key in ("name", "version"):
+            meta[key] = value
+        elif key == "requires-dist":
+            meta["requires_dist"].append(value)
+        elif key == "requires-python":
+            meta["requires_python"] = value
+    return WheelInfo(
+        path=path,
+        name=meta["name"],
+        version=meta["version"],
+        dist_info=dist_info,
+        requires_dist=meta["requires_dist"],
+        requires_python=meta["requires_python"],
+        record={row[0]: (row[1] or None) if len(row) > 1 else None for row in rows if row},
+        entry_points=entry_points,
+    )
+
+
+def select_installable(
+    db: Database, paths: list[Path]
+) -> tuple[list[WheelInfo], list[Path]]:
+    """Split local wheels into those installable in-process and those left to pip.
+
+    A wheel qualifies when one of its tags is supported, Requires-Python
+    matches, and every dependency that applies here (markers evaluated
+    without extras) is satisfied by another qualifying wheel in the batch
+    or by a recorded package the batch doesn't replace. Anything with
+    extras, invalid markers or unreadable metadata goes to pip.
+    """
+    python_version = platform.python_version()
+    candidates: dict[str, WheelInfo] = {}
+    rejected: list[Path] = []
+    for path in paths:
+        parsed = parse_wheel_filename(path.name)
+        try:
+            if parsed is None or not (parsed[2] & supported_tags()):
+                raise WheelError(f"{path.name} is not compatible")
+            wheel = read_wheel(path)
+            if wheel.requires_python and not SpecifierSet(wheel.requires_python).contains(
+                python_version
+            ):
+                raise WheelError(f"{path.name} requires Python {wheel.requires_python}")
+        except (WheelError, InvalidSpecifier):
+            rejected.append(path)
+            continue
+        candidates[normalize_name(wheel.name)] = wheel
+
+    def satisfied(entry: str) -> bool:
+        req = parse_requirement(entry)
+        if req is None:
+            return False
+        try:
+            if req.marker and not evaluate_marker(req.marker):
+                return True  # doesn't apply here
+        except InvalidMarker:
+            return False
+        if req.extras:
+            return False
+        norm = normalize_name(req.name)
+        if norm in candidates:
+            return req.specifier.contains(candidates[norm].version)
+        existing = db.get_package(norm)
+        return existing is not None and req.specifier.contains(existing["version"])
+
+    changed = True
+    while changed:
+        changed = False
+        for norm, wheel in list(candidates.items()):
+            if not all(satisfied(entry) for entry in wheel.requires_dist):
+                rejected.append(wheel.path)
+                del candidates[norm]
+                changed = True
+    return list(candidates.values()), rejected
+
+
+# -- Installing --
+
+def record_hash(data_hash: bytes) -> str:
+    return "sha256=" + base64.urlsafe_b64encode(data_hash).rstrip(b"=").decode("ascii")
+
+
+def _destination(wheel: WheelInfo, name: str) -> str | None:
+    """Where an archive member goes, relative to target; None to skip it."""
+    data_dir = wheel.dist_info[: -len(".dist-info")] + ".data/"
+    if name.startswith(data_dir):
+        scheme, _, rest = name[len(data_dir):].partition("/")
+        if scheme == "headers":
+            dest = f"include/python/{wheel.name}/{rest}"
+        elif scheme in _SCHEME_DIRS:
+            dest = _SCHEME_DIRS[scheme] + rest
+        else:
+            raise WheelError(f"{wheel.path.name}: unknown .data scheme {scheme!r}")
+    else:
+        dest = name
+    dest = posixpath.normpath(dest)
+    if dest.startswith(("../", "/")) or dest in ("..", "."):
+        raise WheelError(f"{wheel.path.name}: {name} points outside the target")
+    if dest in (f"{wheel.dist_info}/RECORD", f"{wheel.dist_info}/RECORD.jws",
+                f"{wheel.dist_info}/RECORD.p7s", f"{wheel.dist_info}/INSTALLER"):
+        return None
+    return dest
+
+
+def write_atomic(path: Path, data: bytes, mode: int) -> None:
+    """Write via a temporary file and rename, so readers see old or new, never half."""
+    tmp = path.with_name(f".{path.name}.py-trkpac-tmp-{threading.get_ident()}")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, mode)  # not subject to umask
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_record(dist_info_path: Path, entries: list[tuple[str, str | None, int | None]]) -> None:
+    """Write RECORD from (path, hash, size) entries; None fields are left empty."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    for path, file_hash, size in entries:
+        writer.writerow([path, file_hash or "", "" if size is None else size])
+    write_atomic(dist_info_path / "RECORD", buf.getvalue().encode("utf-8"), 0o644)
+
+
+class _Extractor:
+    """Extracts members on worker threads, each with its own ZipFile handle."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._local = threading.local()
+        self._opened: list[zipfile.ZipFile] = []
+        self._lock = threading.Lock()
+
+    def _zip(self, path: Path) -> zipfile.ZipFile:
+        handles = self._local.__dict__.setdefault("handles", {})
+        if path not in handles:
+            handles[path] = zipfile.ZipFile(path)
+            with self._lock:
+                self._opened.append(handles[path])
+        return handles[path]
+
+    def close(self) -> None:
+        for zf in self._opened:
+            zf.close()
+
+    def extract(self, wheel: WheelInfo, member: zipfile.ZipInfo, dest: str) -> tuple[str, str, int]:
+        data = self._zip(wheel.path).read(member)
+        digest = hashlib.sha256(data).digest()
+        if wheel.record.get(member.filename) != record_hash(digest):
+            raise WheelError(f"{wheel.path.name}: {member.filename} does not match RECORD")
+        mode = 0o755 if (member.external_attr >> 16) & 0o111 else 0o644
+        if dest.startswith("bin/") and data.startswith(b"#!python"):
+            # Scripts shipped in .data/scripts/ get the real interpreter
+            _, _, rest = data.partition(b"\n")
+            data = b"#!" + os.fsencode(sys.executable) + b"\n" + rest
+            digest = hashlib.sha256(data).digest()
+            mode = 0o755
+        full = self.root / dest
+        full.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(full, data, mode)
+        return dest, record_hash(digest), len(data)
+
+
+def console_scripts(entry_points: str, origin: str) -> dict[str, bytes]:
+    """Launcher scripts for the console_scripts and gui_scripts in entry_points.txt text.
+
+    origin names the wheel or project in error messages. Raises WheelError.
+    """
+    if not entry_points:
+        return {}
+    parser = configparser.ConfigParser(delimiters=("=",), interpolation=None)
+    parser.optionxform = str  # script names are case-sensitive
+    try:
+        parser.read_string(entry_points)
+    except configparser.Error as e:
+        raise WheelError(f"{origin}: invalid entry_points.txt: {e}") from e
+    scripts = {}
+    for section in ("console_scripts", "gui_scripts"):
+        if not parser.has_section(section):
+            continue
+        for name, value in parser.items(section):
+            module, _, attr = value.split("[", 1)[0].strip().partition(":")
+            attr = attr.strip() or None
+            if attr is None:
+                raise WheelError(f"{origin}: entry point {name} has no callable")
+            head = attr.split(".", 1)[0]
+            scripts[f"bin/{name}"] = _SCRIPT_TEMPLATE.format(
+                python=sys.executable, module=module.strip(), head=head, call=attr,
+            ).encode("utf-8")
+    return scripts
+
+
+def _compile(target_path: Path, path: str) -> tuple[str, None, int] | None:
+    """Byte-compile one module as pip does; returns its RECORD entry."""
+    source = target_path / path
+    cfile = importlib.util.cache_from_source(str(source))
+    try:
+        py_compile.compile(str(source), cfile=cfile, doraise=True, quiet=2)
+        size = os.path.getsize(cfile)
+    except (py_compile.PyCompileError, OSError, SyntaxError):
+        return None
+    return os.path.relpath(cfile, target_path).replace(os.sep, "/"), None, size
+
+
+def install_wheels(
+    target_path: Path,
+    wheels: list[WheelInfo],
+    requested_names: set[str],
+    workers: int | None = None,
+) -> list[dict]:
+    """Unpack wheels into target and write their RECORD, INSTALLER and scripts.
+
+    Every member must be listed in the wheel's RECORD with a hash (RECORD
+    itself and its signatures excepted). All members of all wheels are
+    extracted on one thread pool into a hidden directory inside the target,
+    hashes checked as they are read; only once every wheel has been
+    verified are the files renamed into place, so a bad wheel leaves the
+    target untouched. Modules are then byte-compiled on the same pool.
+    Returns metadata dicts for record_installed, with the written RECORD
+    already parsed into meta["record"]. Raises WheelError.
+    """
+    tasks = []
+    for wheel in wheels:
+        with zipfile.ZipFile(wheel.path) as zf:
+            for member in zf.infolist():
+                if member.is_dir():
+                    continue
+                dest = _destination(wheel, member.filename)
+                if dest is None:
+                    continue
+                if not wheel.record.get(member.filename):
+                    raise WheelError(
+                        f"{wheel.path.name}: {member.filename} is not hashed in RECORD"
+                    )
+                tasks.append((wheel, member, dest))
+
+    results: dict[str, list[tuple[str, str | None, int | None]]] = {w.dist_info: [] for w in wheels}
+    unpack = Path(tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=target_path))
+    extractor = _Extractor(unpack)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [(w, pool.submit(extractor.extract, w, m, d)) for w, m, d in tasks]
+            for wheel, future in futures:
+                results[wheel.dist_info].append(future.result())
+
+            for wheel in wheels:
+                for dest, data in console_scripts(wheel.entry_points, wheel.path.name).items():
+                    (unpack / "bin").mkdir(exist_ok=True)
+                    write_atomic(unpack / dest, data, 0o755)
+                    results[wheel.dist_info].append(
+                        (dest, record_hash(hashlib.sha256(data).digest()), len(data)))
+
+            # Everything verified: move it in, each file with one rename(2)
+            moved = set()
+            for wheel in wheels:
+                for dest, _, _ in results[wheel.dist_info]:
+                    if dest in moved:
+                        continue  # two wheels in the batch ship the same file
+                    (target_path / dest).parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(unpack / dest, target_path / dest)
+                    moved.add(dest)
+
+            compiled = [
+                (wheel, pool.submit(_compile, target_path, path))
+                for wheel in wheels
+                for path, _, _ in results[wheel.dist_info]
+                if path.endswith(".py") and not path.startswith("bin/")
+            ]
+            for wheel, future in compiled:
+                entry = future.result()
+                if entry is not None:
+                    results[wheel.dist_info].append(entry)
+    finally:
+        extractor.close()
+        shutil.rmtree(unpack, ignore_errors=True)
+
+    installed = []
+    for wheel in wheels:
+        entries = results[wheel.dist_info]
+        dist_info = target_path / wheel.dist_info
+        requested = normalize_name(wheel.name) in requested_names
+        extra_files = {"INSTALLER": f"{INSTALLER_NAME}\n".encode()}
+        if requested:
+            extra_files["REQUESTED"] = b""
+        for name, data in extra_files.items():
+            write_atomic(dist_info / name, data, 0o644)
+            entries.append((f"{wheel.dist_info}/{name}",
+                            record_hash(hashlib.sha256(data).digest()), len(data)))
+        entries.append((f"{wheel.dist_info}/RECORD", None, None))
+        write_record(dist_info, entries)
+
+        installed.append({
+            "name": wheel.name,
+            "version": wheel.version,
+            "requires_dist": wheel.requires_dist,
+            "requested": requested,
+            "source_path": None,
+            "dist_info": wheel.dist_info,
+            "record": entries,
+        })
+    return installed
@@ -0,0 +1,160 @@
+"""Managed wheelhouse: every wheel py-trkpac installs, kept under the target for offline installs."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from py_trkpac.db import OPTIONAL_CONFIG, Database
+from py_trkpac.utils import error, info, normalize_name
+from py_trkpac.wheel import parse_wheel_filename
+
+WHEELHOUSE_DIRNAME = ".py-trkpac-wheels"
+
+
+def wheelhouse_path(target_path: Path) -> Path:
+    return target_path / WHEELHOUSE_DIRNAME
+
+
+def links_path(target_path: Path) -> Path:
+    """Flat directory of wheels under their real file names, for --find-links."""
+    return wheelhouse_path(target_path) / "links"
+
+
+def object_path(target_path: Path, sha256: str) -> Path:
+    return wheelhouse_path(target_path) / "objects" / sha256[:2] / f"{sha256}.whl"
+
+
+def enabled(db: Database) -> bool:
+    return db.get_config("wheelhouse") == "on"
+
+
+def offline_args(target_path: Path) -> list[str]:
+    """Installer arguments that resolve against the wheelhouse only."""
+    return ["--no-index", f"--find-links={links_path(target_path)}"]
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _place(src: Path, dst: Path) -> None:
+    """Hardlink (or copy, across filesystems) src to dst through a temporary name."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def add_wheels(db: Database, target_path: Path, paths: list[Path]) -> list[Path]:
+    """Store wheel files in the wheelhouse and index them. Returns their --find-links paths.
+
+    Objects are named by sha256, so the same wheel is only ever stored
+    once; links/ holds one hardlink per file name. A different wheel under
+    a known file name (a local project rebuilt without a version bump)
+    replaces the old one. Files that aren't wheels are skipped.
+    """
+    known = {row["filename"]: row["sha256"] for row in db.get_wheels()}
+    stored = []
+    with db.transaction():
+        for path in paths:
+            parsed = parse_wheel_filename(path.name)
+            if parsed is None:
+                continue
+            sha256 = _sha256_file(path)
+            obj = object_path(target_path, sha256)
+            link = links_path(target_path) / path.name
+            old = known.get(path.name)
+            if old is not None and old != sha256:
+                _forget(db, target_path, [(old, path.name)])
+            if not obj.exists():
+                _place(path, obj)
+            if not link.exists() or not os.path.samefile(link, obj):
+                _place(obj, link)
+            db.add_wheel(
+                sha256, path.name, parsed[0], parsed[1],
+                " ".join(sorted(parsed[2])), obj.stat().st_size,
+            )
+            known[path.name] = sha256
+            stored.append(link)
+    return stored
+
+
+def _forget(db: Database, target_path: Path, wheels: list[tuple[str, str]]) -> None:
+    """Unlink and unindex [(sha256, filename)]."""
+    for sha256, filename in wheels:
+        for path in (links_path(target_path) / filename, object_path(target_path, sha256)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(object_path(target_path, sha256).parent)
+        except OSError:
+            pass  # other objects share the prefix
+    db.remove_wheels([sha256 for sha256, _ in wheels])
+
+
+def evict(db: Database, target_path: Path) -> tuple[int, int]:
+    """Drop least recently used wheels until the wheelhouse fits wheelhouse_max_mb.
+
+    Returns (wheels evicted, bytes freed).
+    """
+    max_mb = db.get_config("wheelhouse_max_mb") or OPTIONAL_CONFIG["wheelhouse_max_mb"]
+    doomed = db.get_eviction_candidates(int(float(max_mb) * 1e6))
+    if doomed:
+        _forget(db, target_path, [(row["sha256"], row["filename"]) for row in doomed])
+    return len(doomed), sum(row["size"] for row in doomed)
+
+
+def touch(db: Database, installed: list[dict]) -> None:
+    """Record that installed packages' wheels were just used (for LRU eviction)."""
+    db.touch_wheels([(meta["name"], meta["version"]) for meta in installed])
+
+
+def capture(
+    db: Database,
+    target_path: Path,
+    packages: list[str],
+    local_packages: dict[str, str],
+) -> list[str] | None:
+    """Build or download wheels for packages and their dependencies into the wheelhouse.
+
+    Runs `pip wheel`, which reuses pip's HTTP cache and the wheelhouse
+    itself. Returns packages with local project directories replaced by
+    the wheels just built for them, so the install that follows doesn't
+    build them again; None if pip failed.
+    """
+    with tempfile.TemporaryDirectory(prefix="py-trkpac-wheels-") as tmp:
+        cmd = [
+            sys.executable, "-m", "pip", "wheel",
+            f"--wheel-dir={tmp}",
+            f"--find-links={links_path(target_path)}",
+            *packages,
+        ]
+        info(f"Running: {' '.join(cmd)}\n")
+        if subprocess.run(cmd, capture_output=False).returncode != 0:
+            error("pip wheel failed. Nothing installed.")
+            return None
+        stored = add_wheels(db, target_path, sorted(Path(tmp).glob("*.whl")))
+
+    built = {normalize_name(parse_wheel_filename(p.name)[0]): str(p) for p in stored}
+    by_path = {path: norm for norm, path in local_packages.items()}
+    result = []
+    for pkg in packages:
+        norm = by_path.get(str(Path(pkg).expanduser().resolve()))
+        result.append(built.get(norm, pkg) if norm else pkg)
+    info(f"Stored {len(stored)} wheel(s) in the wheelhouse.")
+    return result
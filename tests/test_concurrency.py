@@ -0,0 +1,228 @@
+"""Stress test: parallel CLI processes against one target, with a fake pip.
+
+A stub pip package placed first on PYTHONPATH stands in for `python -m pip`:
+it "installs" generated packages (a top-level package and a dist-info, each
+depending on a shared base package) and writes pip's JSON report, so the
+whole install/remove flow runs without network or real wheels. After every
+round of concurrent installs, removes and lists, the database and the target
+must agree.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+STUB_PIP = textwrap.dedent('''
+    """Fake `pip install --target` for the concurrency stress test."""
+
+    import base64
+    import hashlib
+    import json
+    import os
+    import shutil
+    import sys
+    import tempfile
+    import time
+
+    BASE = "stressbase"
+
+
+    def write_package(root, name, version, requested, requires):
+        files = {
+            f"{name}/__init__.py": f"VERSION = {version!r}\\n".encode(),
+            f"{name}/data.txt": (name * 64).encode(),
+        }
+        dist_info = f"{name}-{version}.dist-info"
+        files[f"{dist_info}/METADATA"] = "".join([
+            "Metadata-Version: 2.1\\n", f"Name: {name}\\n", f"Version: {version}\\n",
+            *(f"Requires-Dist: {r}\\n" for r in requires),
+        ]).encode()
+        files[f"{dist_info}/INSTALLER"] = b"pip\\n"
+        if requested:
+            files[f"{dist_info}/REQUESTED"] = b""
+        record = []
+        for rel, data in files.items():
+            os.makedirs(os.path.join(root, os.path.dirname(rel)), exist_ok=True)
+            with open(os.path.join(root, rel), "wb") as f:
+                f.write(data)
+            digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=")
+            record.append(f"{rel},sha256={digest.decode()},{len(data)}\\n")
+        record.append(f"{dist_info}/RECORD,,\\n")
+        with open(os.path.join(root, dist_info, "RECORD"), "w") as f:
+            f.writelines(record)
+
+
+    def main(argv):
+        if argv[:1] != ["install"]:
+            sys.exit(f"stub pip: unsupported command {argv!r}")
+        target = report = None
+        dry_run = False
+        names = []
+        for arg in argv[1:]:
+            if arg.startswith("--target="):
+                target = arg.split("=", 1)[1]
+            elif arg.startswith("--report="):
+                report = arg.split("=", 1)[1]
+            elif arg == "--dry-run":
+                dry_run = True
+            elif not arg.startswith("-"):
+                names.append(arg.split("==")[0].lower())
+
+        plan = [(name, "1.0", True, [BASE]) for name in names if name != BASE]
+        plan.append((BASE, "1.0", BASE in names, []))
+        if report:
+            with open(report, "w") as f:
+                json.dump({"version": "1", "install": [
+                    {"metadata": {"name": n, "version": v, "requires_dist": r},
+                     "requested": req, "download_info": {"url": f"https://example.invalid/{n}"}}
+                    for n, v, req, r in plan
+                ]}, f)
+        if dry_run:
+            return
+
+        # Like pip --target: build aside, then move each entry into place
+        staging = tempfile.mkdtemp(prefix="stub-pip-")
+        for name, version, requested, requires in plan:
+            write_package(staging, name, version, requested, requires)
+        time.sleep(0.05)  # widen the window in which a racing writer would interleave
+        for entry in os.listdir(staging):
+            dest = os.path.join(target, entry)
+            if os.path.isdir(dest) and not os.path.islink(dest):
+                shutil.rmtree(dest)
+            elif os.path.lexists(dest):
+                os.unlink(dest)
+            shutil.move(os.path.join(staging, entry), dest)
+        shutil.rmtree(staging)
+
+
+    main(sys.argv[1:])
+''')
+
+PACKAGES = [f"stresspkg{i}" for i in range(8)]
+
+
+@pytest.fixture
+def env(tmp_path: Path) -> dict[str, str]:
+    stub = tmp_path / "stub"
+    (stub / "pip").mkdir(parents=True)
+    (stub / "pip" / "__init__.py").write_text("")
+    (stub / "pip" / "__main__.py").write_text(STUB_PIP)
+    # pip_supports_report() reads the version from pip's metadata
+    (stub / "pip-24.0.dist-info").mkdir()
+    (stub / "pip-24.0.dist-info" / "METADATA").write_text("Name: pip\nVersion: 24.0\n")
+
+    home = tmp_path / "home"
+    home.mkdir()
+    env = {
+        k: v for k, v in os.environ.items()
+        if not k.startswith(("PIP_", "PYTHON")) and k != "HOME"
+    }
+    env.update(HOME=str(home), PYTHONPATH=f"{stub}{os.pathsep}{SRC}")
+    result = run(env, "init", "--target", str(home / "python-libraries"),
+                 "--shell-config", str(home / ".bashrc"))
+    assert result.returncode == 0, result.stdout + result.stderr
+    return env
+
+
+def run(env: dict[str, str], *args: str) -> subprocess.CompletedProcess:
+    """One py-trkpac CLI process, answering yes to every prompt."""
+    return subprocess.run(
+        [sys.executable, "-m", "py_trkpac", *args],
+        input="y\n" * 20, env=env, capture_output=True, text=True, timeout=120,
+    )
+
+
+def run_parallel(env: dict[str, str], commands: list[list[str]]) -> None:
+    with ThreadPoolExecutor(max_workers=len(commands)) as pool:
+        results = list(pool.map(lambda args: run(env, *args), commands))
+    for args, result in zip(commands, results):
+        assert result.returncode == 0, (args, result.stdout + result.stderr)
+        assert "database is locked" not in result.stderr, (args, result.stderr)
+
+
+def assert_consistent(env: dict[str, str]) -> set[str]:
+    """The DB and the target describe the same packages. Returns their names."""
+    target = Path(env["HOME"]) / "python-libraries"
+    conn = sqlite3.connect(target / ".py-trkpac.db")
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    packages = dict(conn.execute("SELECT name, version FROM packages"))
+
+    on_disk = {}
+    for entry in target.iterdir():
+        if entry.name.endswith(".dist-info"):
+            name, version = entry.name[: -len(".dist-info")].rsplit("-", 1)
+            assert name not in on_disk, f"two dist-infos for {name}"
+            on_disk[name] = version
+            with open(entry / "RECORD", newline="") as f:
+                for row in csv.reader(f):
+                    assert (target / row[0]).exists(), f"{row[0]} of {entry.name} is missing"
+    assert packages == on_disk
+
+    for name, path in conn.execute(
+        "SELECT p.name, pf.path FROM package_files pf JOIN packages p ON p.id = pf.package_id"
+    ):
+        assert (target / path).exists(), f"{path} of {name} is in the DB but not on disk"
+    orphans = conn.execute(
+        "SELECT name FROM packages WHERE is_explicit = 0 AND id NOT IN "
+        "(SELECT dependency_id FROM package_dependencies)"
+    ).fetchall()
+    assert orphans == []
+    conn.close()
+
+    leftovers = [e.name for e in target.iterdir() if e.name.startswith(".py-trkpac-staging-")]
+    assert leftovers == []
+    return set(packages)
+
+
+def test_parallel_installs_and_removes(env: dict[str, str]) -> None:
+    run_parallel(env, [["install", PACKAGES[0]]])
+    run_parallel(
+        env,
+        [["install", pkg] for pkg in PACKAGES[1:]] + [["list"], ["list-deps", PACKAGES[0]]],
+    )
+    assert assert_consistent(env) == {*PACKAGES, "stressbase"}
+
+    keep, drop = PACKAGES[::2], PACKAGES[1::2]
+    run_parallel(env, [["remove", pkg] for pkg in drop] + [["list"]] * 2)
+    assert assert_consistent(env) == {*keep, "stressbase"}
+
+    # Removing the last dependents also removes the base; reinstalls race with it
+    run_parallel(
+        env,
+        [["remove", pkg] for pkg in keep]
+        + [["install", pkg] for pkg in drop]
+        + [["list"]],
+    )
+    assert assert_consistent(env) == {*drop, "stressbase"}
+
+
+def test_readers_do_not_wait_for_writers(env: dict[str, str]) -> None:
+    run_parallel(env, [["install", PACKAGES[0]]])
+    target = Path(env["HOME"]) / "python-libraries"
+    # Stand-in for a remove holding the write lock; busy_timeout is 30s
+    writer = sqlite3.connect(target / ".py-trkpac.db", isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("DELETE FROM dist_info_index")
+    os.utime(target)  # an index rebuild would now be due
+    try:
+        for args in (["list"], ["list-deps", PACKAGES[0]], ["tree", PACKAGES[0]],
+                     ["owns", f"{PACKAGES[0]}/__init__.py"]):
+            result = subprocess.run(
+                [sys.executable, "-m", "py_trkpac", *args],
+                env=env, capture_output=True, text=True, timeout=10,
+            )
+            assert result.returncode == 0, (args, result.stdout + result.stderr)
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
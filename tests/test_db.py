@@ -0,0 +1,66 @@
+"""Dependency graph queries (Database.get_orphan_closure)."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from py_trkpac.db import Database
+
+
+@pytest.fixture
+def db(tmp_path: Path) -> Database:
+    db = Database(tmp_path / ".py-trkpac.db")
+    db.init_schema()
+    return db
+
+
+def add_graph(db: Database, edges: dict[str, list[str]], explicit: set[str]) -> dict[str, int]:
+    """Record packages and their dependency edges. Returns {name: id}."""
+    names = {*edges, *(dep for deps in edges.values() for dep in deps)}
+    ids = db.upsert_packages([
+        {"name": name, "display_name": name, "version": "1.0", "is_explicit": name in explicit,
+         "is_local": False, "is_editable": False, "source_path": None}
+        for name in sorted(names)
+    ])
+    db.set_dependency_edges({ids[name]: [ids[d] for d in deps] for name, deps in edges.items()})
+    return ids
+
+
+def orphans(db: Database, ids: dict[str, int], removed: list[str]) -> list[str]:
+    return [row["name"] for row in db.get_orphan_closure([ids[name] for name in removed])]
+
+
+@pytest.mark.parametrize("edges, explicit, removed, expected", [
+    # chain: everything below the removed root goes
+    ({"app": ["a"], "a": ["b"], "b": ["c"]}, {"app"}, ["app"], ["a", "b", "c"]),
+    # diamond: the shared base goes once, with both sides
+    ({"app": ["left", "right"], "left": ["base"], "right": ["base"]}, {"app"}, ["app"],
+     ["base", "left", "right"]),
+    # diamond with one side still reachable from another explicit package
+    ({"app": ["left", "right"], "left": ["base"], "right": ["base"], "tool": ["right"]},
+     {"app", "tool"}, ["app"], ["left"]),
+    # an explicit dependency is a root of its own
+    ({"app": ["lib"], "lib": ["dep"]}, {"app", "lib"}, ["app"], []),
+    # reachable from a kept root only through the removed package
+    ({"tool": ["app"], "app": ["dep"]}, {"tool", "app"}, ["app"], ["dep"]),
+    # cycles are orphaned as a whole
+    ({"app": ["a"], "a": ["b"], "b": ["a"]}, {"app"}, ["app"], ["a", "b"]),
+    # removing several roots at once
+    ({"one": ["shared"], "two": ["shared"], "three": ["own"]}, {"one", "two", "three"},
+     ["one", "two"], ["shared"]),
+])
+def test_orphan_closure(
+    db: Database, edges: dict[str, list[str]], explicit: set[str],
+    removed: list[str], expected: list[str],
+) -> None:
+    ids = add_graph(db, edges, explicit)
+    assert orphans(db, ids, removed) == expected
+
+
+def test_orphan_closure_includes_existing_orphans(db: Database) -> None:
+    # A dependency nothing explicit reaches any more is an orphan already
+    ids = add_graph(db, {"app": ["dep"], "stray": []}, {"app"})
+    assert orphans(db, ids, []) == ["stray"]
+    assert orphans(db, ids, ["app"]) == ["dep", "stray"]
@@ -0,0 +1,121 @@
+"""Removing packages' files by manifest (removal.remove_manifests)."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from py_trkpac.db import Database
+from py_trkpac.removal import TRASH_DIRNAME, remove_manifests
+
+
+@pytest.fixture
+def target(tmp_path: Path) -> Path:
+    path = tmp_path / "target"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def db(target: Path) -> Database:
+    db = Database(target / ".py-trkpac.db")
+    db.init_schema()
+    return db
+
+
+def install(db: Database, target: Path, manifests: dict[str, list[str]]) -> dict[str, int]:
+    """Write each package's files and record its manifest. Returns {name: id}."""
+    ids = db.upsert_packages([
+        {"name": name, "display_name": name, "version": "1.0", "is_explicit": True,
+         "is_local": False, "is_editable": False, "source_path": None}
+        for name in manifests
+    ])
+    for files in manifests.values():
+        for path in files:
+            (target / path).parent.mkdir(parents=True, exist_ok=True)
+            (target / path).write_text(path)
+    db.set_package_files({
+        ids[name]: [(path, None, None) for path in files] for name, files in manifests.items()
+    })
+    return ids
+
+
+def trashed(target: Path) -> list[str]:
+    """Files moved into the trash, relative to the unit renamed there."""
+    trash = target / TRASH_DIRNAME
+    if not trash.exists():
+        return []
+    return sorted(
+        p.relative_to(unit).as_posix()
+        for batch in trash.iterdir() for unit in batch.iterdir()
+        for p in unit.rglob("*") if p.is_file()
+    )
+
+
+def files(target: Path) -> list[str]:
+    return sorted(
+        p.relative_to(target).as_posix() for p in target.rglob("*")
+        if p.is_file() and TRASH_DIRNAME not in p.parts and not p.name.startswith(".py-trkpac")
+    )
+
+
+def test_unreferenced_dirs_are_trashed_whole(db: Database, target: Path) -> None:
+    ids = install(db, target, {
+        "foo": ["foo/__init__.py", "foo/sub/mod.py", "foo-1.0.dist-info/RECORD", "bin/foo"],
+        "bar": ["bar/__init__.py", "bin/bar"],
+    })
+    manifests = {ids["foo"]: db.get_package_files(ids["foo"])}
+    counts = remove_manifests(db, target, manifests, {ids["foo"]: ["foo-1.0.dist-info"]})
+
+    # foo/ and the dist-info are one rename each; bin/ is shared, so bin/foo is unlinked
+    assert counts == {ids["foo"]: 4}
+    assert files(target) == ["bar/__init__.py", "bin/bar"]
+    assert trashed(target) == ["RECORD", "__init__.py", "sub/mod.py"]
+
+
+def test_shared_files_are_kept(db: Database, target: Path) -> None:
+    ids = install(db, target, {
+        "nsa": ["ns/a/__init__.py", "ns/__init__.py"],
+        "nsb": ["ns/b/__init__.py", "ns/__init__.py"],
+    })
+    manifests = {ids["nsa"]: db.get_package_files(ids["nsa"])}
+    counts = remove_manifests(db, target, manifests, {})
+
+    # ns/ is still referenced: only ns/a goes, and ns/__init__.py stays for nsb
+    assert counts == {ids["nsa"]: 1}
+    assert files(target) == ["ns/__init__.py", "ns/b/__init__.py"]
+    assert trashed(target) == ["__init__.py"]
+
+
+def test_shared_file_goes_with_its_last_owner(db: Database, target: Path) -> None:
+    ids = install(db, target, {
+        "nsa": ["ns/a/__init__.py", "ns/__init__.py"],
+        "nsb": ["ns/b/__init__.py", "ns/__init__.py"],
+    })
+    manifests = {pkg_id: db.get_package_files(pkg_id) for pkg_id in ids.values()}
+    remove_manifests(db, target, manifests, {})
+    assert files(target) == []
+    assert not (target / "ns").exists()
+
+
+def test_without_trash_dirs_files_are_unlinked(db: Database, target: Path) -> None:
+    ids = install(db, target, {"foo": ["foo/__init__.py", "foo/sub/mod.py", "empty/x.py"]})
+    (target / "foo" / "sub" / "stray.pyc").write_text("not in any manifest")
+    manifests = {ids["foo"]: db.get_package_files(ids["foo"])}
+    counts = remove_manifests(db, target, manifests, {}, trash_dirs=False)
+
+    assert counts == {ids["foo"]: 3}
+    assert trashed(target) == []
+    # Emptied directories are removed; one still holding an unlisted file stays
+    assert not (target / "empty").exists()
+    assert files(target) == ["foo/sub/stray.pyc"]
+
+
+def test_stale_dist_infos_are_removed_too(db: Database, target: Path) -> None:
+    ids = install(db, target, {"foo": ["foo/__init__.py", "foo-2.0.dist-info/RECORD"]})
+    (target / "foo-1.0.dist-info").mkdir()
+    (target / "foo-1.0.dist-info" / "RECORD").write_text("")
+    manifests = {ids["foo"]: db.get_package_files(ids["foo"])}
+    remove_manifests(db, target, manifests, {ids["foo"]: ["foo-2.0.dist-info", "foo-1.0.dist-info"]})
+    assert files(target) == []
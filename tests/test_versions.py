@@ -0,0 +1,132 @@
+"""PEP 440 versions and specifiers, PEP 508 requirements and markers."""
+
+from __future__ import annotations
+
+import pytest
+
+from py_trkpac.versions import (
+    InvalidMarker, InvalidSpecifier, InvalidVersion, SpecifierSet, Version,
+    compare_versions, evaluate_marker, parse_requirement, parse_version,
+)
+
+ENV = {
+    "implementation_name": "cpython",
+    "implementation_version": "3.12.1",
+    "os_name": "posix",
+    "platform_machine": "x86_64",
+    "platform_release": "6.1.0",
+    "platform_system": "Linux",
+    "platform_version": "#1 SMP",
+    "python_full_version": "3.12.1",
+    "platform_python_implementation": "CPython",
+    "python_version": "3.12",
+    "sys_platform": "linux",
+}
+
+
+@pytest.mark.parametrize("text, normalized", [
+    ("1.0", "1.0"),
+    ("v1.0", "1.0"),
+    ("1.0.0-alpha.1", "1.0.0a1"),
+    ("1.0c2", "1.0rc2"),
+    ("1.0-1", "1.0.post1"),
+    ("1.0.dev", "1.0.dev0"),
+    ("2!1.0+Ubuntu.1", "2!1.0+ubuntu.1"),
+])
+def test_version_normalization(text: str, normalized: str) -> None:
+    assert str(Version(text)) == normalized
+
+
+def test_version_ordering() -> None:
+    ordered = [
+        "1.0.dev0", "1.0a1.dev0", "1.0a1", "1.0b2", "1.0rc1", "1.0",
+        "1.0+local", "1.0.post1.dev0", "1.0.post1", "1.1", "1!0.1",
+    ]
+    versions = [Version(v) for v in ordered]
+    assert sorted(reversed(versions)) == versions
+    assert Version("1.0") == Version("1.0.0")
+    assert hash(Version("1.0")) == hash(Version("1.0.0"))
+
+
+def test_invalid_versions() -> None:
+    with pytest.raises(InvalidVersion):
+        Version("not a version")
+    assert parse_version("1.0-beta-gamma") is None
+    # Non-PEP 440 strings still compare, as strings
+    assert compare_versions("abc", "abd") == -1
+    assert compare_versions("1.10", "1.9") == 1
+
+
+@pytest.mark.parametrize("spec, version, expected", [
+    (">=2.31", "2.31.0", True),
+    (">=2.31", "2.30.9", False),
+    ("==1.4.*", "1.4.7", True),
+    ("==1.4.*", "1.5", False),
+    ("!=1.4.*", "1.5", True),
+    ("~=1.4.2", "1.4.9", True),
+    ("~=1.4.2", "1.5.0", False),
+    ("~=1.4", "1.9", True),
+    ("<3.0", "3.0rc1", False),
+    ("<3.0rc2", "3.0rc1", True),
+    (">1.0", "1.0.post1", False),
+    (">1.0.post1", "1.0.post2", True),
+    ("==1.0", "1.0+local", True),
+    ("==1.0+local", "1.0", False),
+    ("===1.0", "1.0", True),
+    ("===1.0", "1.0.0", False),
+    (">=1.0,<2.0", "1.5", True),
+    (">=1.0,<2.0", "2.0", False),
+])
+def test_specifiers(spec: str, version: str, expected: bool) -> None:
+    assert SpecifierSet(spec).contains(version) is expected
+
+
+def test_invalid_specifiers() -> None:
+    for spec in (">=1.*", "=>1.0", "==", "~=banana"):
+        with pytest.raises(InvalidSpecifier):
+            SpecifierSet(spec)
+
+
+def test_parse_requirement() -> None:
+    req = parse_requirement("Requests[socks, security] >=2.31,<3 ; python_version < '3.14'")
+    assert req.name == "Requests"
+    assert req.extras == ["socks", "security"]
+    assert req.specifier.contains("2.32") and not req.specifier.contains("3.0")
+    assert req.marker == "python_version < '3.14'"
+
+    legacy = parse_requirement("foo (>=1.0)")
+    assert legacy.specifier.contains("1.2")
+    assert parse_requirement("foo @ https://example.invalid/foo.whl") is None
+    assert parse_requirement("./some/path") is None
+    assert parse_requirement("foo >=banana") is None
+
+
+@pytest.mark.parametrize("marker, expected", [
+    ("python_version >= '3.8'", True),
+    ("python_version < '3.10'", False),  # compared as versions, not strings
+    ("sys_platform == 'win32' or os_name == 'posix'", True),
+    ("sys_platform == 'linux' and (platform_machine == 'arm64' or platform_machine == 'x86_64')", True),
+    ("'linux' in sys_platform", True),
+    ("platform_system not in 'Windows Darwin'", True),
+    ("python_full_version == '3.12.*'", True),
+    ("extra == 'socks'", False),
+])
+def test_markers(marker: str, expected: bool) -> None:
+    assert evaluate_marker(marker, ENV) is expected
+
+
+def test_marker_extras_are_normalized() -> None:
+    assert evaluate_marker("extra == 'Socks_Proxy'", ENV, extras=["socks-proxy"])
+    assert evaluate_marker("extra == 'a' or extra == 'b'", ENV, extras=["c", "b"])
+    assert not evaluate_marker("extra == 'a'", ENV, extras=["b"])
+
+
+@pytest.mark.parametrize("marker", [
+    "python_version >=",
+    "(python_version > '3'",
+    "unknown_variable == '1'",
+    "os_name < 'posix'",
+])
+def test_invalid_markers(marker: str) -> None:
+    with pytest.raises(InvalidMarker):
+        evaluate_marker(marker, ENV)
@@ -0,0 +1,136 @@
+"""In-process wheel installs (wheel.install_wheels)."""
+
+from __future__ import annotations
+
+import base64
+import csv
+import hashlib
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from py_trkpac.wheel import WheelError, install_wheels, parse_wheel_filename, read_wheel
+
+
+def _hash(data: bytes) -> str:
+    return "sha256=" + base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=").decode()
+
+
+def build_wheel(
+    directory: Path,
+    name: str = "demo",
+    version: str = "1.0",
+    files: dict[str, bytes] | None = None,
+    entry_points: str = "",
+    record_overrides: dict[str, str | None] | None = None,
+    unrecorded: dict[str, bytes] | None = None,
+) -> Path:
+    """Write a wheel; record_overrides replaces RECORD hashes (None: listed without one)."""
+    dist_info = f"{name}-{version}.dist-info"
+    members = dict(files if files is not None else {
+        f"{name}/__init__.py": b"VALUE = 1\n",
+        f"{name}/data.txt": b"payload\n",
+    })
+    members[f"{dist_info}/METADATA"] = (
+        f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n".encode()
+    )
+    members[f"{dist_info}/WHEEL"] = b"Wheel-Version: 1.0\nRoot-Is-Purelib: true\nTag: py3-none-any\n"
+    if entry_points:
+        members[f"{dist_info}/entry_points.txt"] = entry_points.encode()
+
+    overrides = record_overrides or {}
+    rows = []
+    for member, data in members.items():
+        file_hash = overrides.get(member, _hash(data))
+        rows.append(f"{member},{file_hash or ''},{len(data)}\n")
+    rows.append(f"{dist_info}/RECORD,,\n")
+
+    path = directory / f"{name}-{version}-py3-none-any.whl"
+    with zipfile.ZipFile(path, "w") as zf:
+        for member, data in {**members, **(unrecorded or {})}.items():
+            zf.writestr(member, data)
+        zf.writestr(f"{dist_info}/RECORD", "".join(rows))
+    return path
+
+
+@pytest.fixture
+def target(tmp_path: Path) -> Path:
+    path = tmp_path / "target"
+    path.mkdir()
+    return path
+
+
+def _contents(target: Path) -> dict[str, bytes]:
+    return {
+        p.relative_to(target).as_posix(): p.read_bytes()
+        for p in target.rglob("*") if p.is_file()
+    }
+
+
+def test_parse_wheel_filename() -> None:
+    assert parse_wheel_filename("six-1.17.0-py2.py3-none-any.whl") == (
+        "six", "1.17.0", frozenset({"py2-none-any", "py3-none-any"})
+    )
+    assert parse_wheel_filename("pkg-1.0-1-cp312-cp312-linux_x86_64.whl")[1] == "1.0"
+    assert parse_wheel_filename("not-a-wheel.tar.gz") is None
+
+
+def test_install_writes_files_record_and_scripts(tmp_path: Path, target: Path) -> None:
+    wheel = read_wheel(build_wheel(
+        tmp_path,
+        files={
+            "demo/__init__.py": b"def main():\n    return 0\n",
+            "demo-1.0.data/scripts/tool": b"#!python\nprint('hi')\n",
+        },
+        entry_points="[console_scripts]\ndemo-cli = demo:main\n",
+    ))
+    [meta] = install_wheels(target, [wheel], {"demo"})
+
+    assert meta["name"] == "demo" and meta["version"] == "1.0" and meta["requested"]
+    assert (target / "demo/__init__.py").read_bytes() == b"def main():\n    return 0\n"
+    assert (target / "demo-1.0.dist-info/INSTALLER").read_text() == "py-trkpac\n"
+    assert (target / "demo-1.0.dist-info/REQUESTED").exists()
+    assert not (target / "demo-1.0.data").exists()
+
+    shebang = f"#!{sys.executable}\n".encode()
+    assert (target / "bin/tool").read_bytes() == shebang + b"print('hi')\n"
+    assert (target / "bin/demo-cli").read_bytes().startswith(shebang)
+    assert (target / "bin/demo-cli").stat().st_mode & 0o111
+
+    with open(target / "demo-1.0.dist-info/RECORD", newline="") as f:
+        record = {row[0]: row[1] for row in csv.reader(f)}
+    assert record == {path: file_hash or "" for path, file_hash, _ in meta["record"]}
+    assert record["bin/tool"] == _hash((target / "bin/tool").read_bytes())
+    assert any(p.startswith("demo/__pycache__/") and p.endswith(".pyc") for p in record)
+    # Nothing left over from unpacking
+    assert sorted(p.name for p in target.iterdir()) == ["bin", "demo", "demo-1.0.dist-info"]
+
+
+@pytest.mark.parametrize("overrides, unrecorded, message", [
+    ({"demo/data.txt": _hash(b"something else")}, None, "does not match RECORD"),
+    ({"demo/data.txt": None}, None, "not hashed in RECORD"),
+    (None, {"demo/extra.py": b"import os\n"}, "not hashed in RECORD"),
+])
+def test_unverified_members_leave_target_untouched(
+    tmp_path: Path, target: Path, overrides, unrecorded, message: str
+) -> None:
+    good = read_wheel(build_wheel(tmp_path, name="good"))
+    old = read_wheel(build_wheel(tmp_path, version="0.9"))
+    install_wheels(target, [old], {"demo"})
+    before = _contents(target)
+
+    bad = read_wheel(build_wheel(tmp_path, record_overrides=overrides, unrecorded=unrecorded))
+    with pytest.raises(WheelError, match=message):
+        install_wheels(target, [good, bad], {"good", "demo"})
+    assert _contents(target) == before
+    assert sorted(p.name for p in target.iterdir()) == ["demo", "demo-0.9.dist-info"]
+
+
+def test_member_outside_target_is_rejected(tmp_path: Path, target: Path) -> None:
+    wheel = read_wheel(build_wheel(tmp_path, files={"../escape.py": b"x = 1\n"}))
+    with pytest.raises(WheelError, match="outside the target"):
+        install_wheels(target, [wheel], set())
+    assert list(target.iterdir()) == []
+    assert not (target.parent / "escape.py").exists()